@@ -12,6 +12,7 @@ struct data_packet_format tx_data_packet;
 
 int tx_sequence = 0, rx_sequence;
 int fd_socket;
+int latch_copies = LATCH_COPIES;
 
 int prepare_id (struct data_packet_format *id_packet, char *id)
 {
@@ -65,7 +66,7 @@ int send_latch (void)
 	tx_data_packet.code[0] = -1;
 	tx_data_packet.code[1] = 1;
 	tx_data_packet.n = 2;
-	for(i = 0; i < 5; i++) send(fd_socket, &tx_data_packet, SIZE_DATA_PACKET, 0);
+	for(i = 0; i < latch_copies; i++) send(fd_socket, &tx_data_packet, SIZE_DATA_PACKET, 0);
 	tx_data_packet.n = 0;
 	return 0;
 }
@@ -78,7 +79,7 @@ int send_unlatch (void)
 	tx_data_packet.code[0] = -1;
 	tx_data_packet.code[1] = 2;
 	tx_data_packet.n = 2;
-	for(i = 0; i < 5; i++) send(fd_socket, &tx_data_packet, SIZE_DATA_PACKET, 0);
+	for(i = 0; i < latch_copies; i++) send(fd_socket, &tx_data_packet, SIZE_DATA_PACKET, 0);
 	tx_data_packet.n = 0;
 	return 0;
 }
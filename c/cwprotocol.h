@@ -40,6 +40,9 @@ struct data_packet_format{
 // Define the packets used
 #define DEFAULT_CHANNEL 103
 
+// Copies sent of each latch/unlatch packet (default for latch_copies)
+#define LATCH_COPIES 5
+
 /* Define functions provided by cwprotocol */ 
 int prepare_id (struct data_packet_format *id_packet, char *id);
 int prepare_tx (struct data_packet_format *tx_packet, char *id);
@@ -55,6 +58,7 @@ extern struct data_packet_format rx_data_packet;
 extern struct data_packet_format tx_data_packet;
 
 extern int tx_sequence, rx_sequence;
+extern int latch_copies;
 
 extern int fd_socket;
 
@@ -0,0 +1,99 @@
+"""
+bench_batchio.py
+
+Compares the simple (one system call per packet) and the batched
+(`recvmmsg`/`sendmmsg`) UDP paths of `batchio.py` over the loopback interface.
+
+    python3 bench_batchio.py -o batchio.json
+
+Receive: the socket buffer is filled with DAT packets, then drained; the time
+per packet is recorded. Fan-out: one DAT packet is sent to a number of stations; the time per
+station is recorded.
+"""
+
+import socket
+import time
+
+from benchutil import Suite, argumentParser, finish, run
+from pykob import batchio, packet
+
+QUEUED = 2000                 # packets queued before each receive round
+RCVBUF = 4 * 1024 * 1024
+FANOUTS = (10, 100, 500)
+ROUNDS = 5
+
+def udpSocket(rcvbuf=RCVBUF):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    s.bind(('127.0.0.1', 0))
+    return s
+
+def drain(sock):
+    sock.setblocking(False)
+    try:
+        while True:
+            sock.recv(packet.SIZE_DATA_PACKET)
+    except BlockingIOError:
+        pass
+    sock.setblocking(True)
+
+def benchRecv(suite, wanted, data):
+    rx = udpSocket()
+    tx = udpSocket()
+    addr = rx.getsockname()
+    for name, io in (("recv_simple", batchio.SimpleIO(rx)), ("recv_batched", batchio.openBatchIO(rx))):
+        if not wanted(name):
+            continue
+        times = []
+        for r in range(ROUNDS):
+            drain(rx)
+            for i in range(QUEUED):
+                tx.sendto(data, addr)
+            received = 0
+            t = time.perf_counter()
+            while True:
+                got = io.recv(block=False)
+                if not got:
+                    break
+                received += len(got)
+            times.append((time.perf_counter() - t) / max(received, 1))
+        times.sort()
+        suite.record(name, times[0], times[len(times) // 2], QUEUED,
+                {"io": type(io).__name__, "packets": received})
+    rx.close()
+    tx.close()
+
+def benchFanout(suite, wanted, data):
+    tx = udpSocket()
+    for n in FANOUTS:
+        stations = [udpSocket(256 * 1024) for i in range(n)]
+        addresses = [s.getsockname() for s in stations]
+        for name, io in (("fanout_simple", batchio.SimpleIO(tx)), ("fanout_batched", batchio.openBatchIO(tx))):
+            name = "{}[{}]".format(name, n)
+            if not wanted(name):
+                continue
+            times = []
+            for r in range(ROUNDS * 10):
+                t = time.perf_counter()
+                io.fanout(data, addresses)
+                times.append((time.perf_counter() - t) / n)
+                for s in stations:
+                    drain(s)
+            times.sort()
+            suite.record(name, times[0], times[len(times) // 2], n,
+                    {"io": type(io).__name__, "stations": n})
+        for s in stations:
+            s.close()
+    tx.close()
+
+def main():
+    args = argumentParser("Benchmark simple vs batched UDP packet I/O.").parse_args()
+    wanted = lambda name: args.filter in name
+    data = packet.packData("W1AW", 1, (-200, 50, -50, 150))
+    suite = Suite("batchio")
+    benchRecv(suite, wanted, data)
+    benchFanout(suite, wanted, data)
+    return finish(suite, args)
+
+if __name__ == "__main__":
+    run(main)
@@ -0,0 +1,68 @@
+"""
+bench_keyer.py
+
+Measures the timing error of `KeyerThread`: how late each mark edge of the
+keyer is actuated relative to its scheduled time, with and without CPU load
+from other processes.
+
+    python3 bench_keyer.py -o keyer.json
+    python3 bench_keyer.py --seconds 5 --load 2
+
+The paddles are scripted: the dit paddle is held, then both are squeezed, for
+`--seconds`. The best and median lateness (seconds) are recorded, and the
+90th and 99th percentiles and maximum are kept in the parameters. The loaded
+run is repeated with a real-time (SCHED_FIFO) keyer thread where permitted.
+"""
+
+import multiprocessing
+import time
+
+from benchutil import Suite, argumentParser, finish, run
+from pykob import keyer
+
+WPM = 30
+
+def burn(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+def measure(seconds, load, realtime=False):
+    lateness = []
+    k = keyer.IambicKeyer(WPM, start=time.monotonic())
+    def keyOut(closed):
+        lateness.append(time.monotonic() - (k.markEnd - k.element * k.dotLen / 1000.0 if closed else k.markEnd))
+    k.keyOut = keyOut
+    burners = [multiprocessing.Process(target=burn, args=(seconds + 1,)) for i in range(load)]
+    for p in burners:
+        p.start()
+    half = seconds / 2
+    source = keyer.ScriptedPaddles([keyer.PaddleEvent(0.0, True, False),
+            keyer.PaddleEvent(half, True, True), keyer.PaddleEvent(seconds, False, False)])
+    t = keyer.KeyerThread(k, source, lambda code: None, realtime)
+    t.start()
+    time.sleep(seconds + 0.5)
+    t.stop()
+    for p in burners:
+        p.join()
+    return sorted(lateness)
+
+def main():
+    parser = argumentParser("Benchmark the keyer's timing error under CPU load.")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--load", type=int, default=2, help="CPU-bound processes for the loaded run.")
+    args = parser.parse_args()
+    suite = Suite("keyer")
+    for load, realtime in ((0, False), (args.load, False), (args.load, True)):
+        name = "keyer_lateness[load={}{}]".format(load, "-realtime" if realtime else "")
+        if args.filter not in name:
+            continue
+        lateness = measure(args.seconds, load, realtime)
+        n = len(lateness)
+        suite.record(name, lateness[0], lateness[n // 2], n,
+                {"wpm": WPM, "load": load, "realtime": realtime, "edges": n,
+                 "p90": lateness[int(n * 0.9)], "p99": lateness[int(n * 0.99)], "max": lateness[-1]})
+    return finish(suite, args)
+
+if __name__ == "__main__":
+    run(main)
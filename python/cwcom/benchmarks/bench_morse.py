@@ -0,0 +1,202 @@
+"""
+bench_morse.py
+
+Benchmarks for the encode/decode hot paths and the packet codec.
+
+    python3 bench_morse.py -o results.json
+    python3 bench_morse.py --compare results.json --threshold 0.1
+    python3 bench_morse.py --recording wire103.txt -k decode
+
+Covers `Sender.encode` per character and per bulletin, `Reader.decode`,
+`decodeChar`, `lookupChar` and `updateDWPM` over synthetic streams (and a
+recorded stream if given), decoding with a per-character callback vs a
+`TextBatcher` delivering words, constructing a Sender vs changing its speed
+(`setSpeed`, a cached `timing` lookup), constructing a Sender and a Reader
+from the module variables of `config` vs from a `config.snapshot()`, the
+import time of `morse` and `config`, and packing and unpacking of DAT packets.
+The encode and decode benchmarks are swept over code speed, code type and
+spacing mode. The Readers decoding streams have no flusher (`flushTimer` off),
+so the numbers are not dominated by starting a Timer per packet.
+"""
+
+import subprocess
+import sys
+
+from benchutil import Suite, argumentParser, finish, run
+from pykob import config, morse, packet, recording
+
+BULLETIN = ("QST DE W1AW QST QST QST DE W1AW HR BULLETIN NR 1 "
+            "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG 1234567890 AR")
+
+WPMS = (5, 15, 25, 35)
+CODETYPES = (config.CodeType.american, config.CodeType.international)
+SPACINGS = (config.Spacing.none, config.Spacing.char, config.Spacing.word)
+CWPM = 18  # character speed for the Farnsworth sweeps
+
+def nothing(char, spacing):
+    pass
+
+def encodeText(sender, text):
+    return [sender.encode(c) for c in text]
+
+def benchEncode(suite, wanted):
+    for codeType in CODETYPES:
+        chars = [c for c in morse.encodeTable[0 if codeType == config.CodeType.american else 1]]
+        for wpm in WPMS:
+            for spacing in SPACINGS:
+                params = {"wpm": wpm, "cwpm": CWPM, "codeType": codeType.name, "spacing": spacing.name}
+                suffix = "[{}-{}-{}]".format(codeType.name, wpm, spacing.name)
+                sender = morse.Sender(wpm, CWPM, codeType, spacing)
+                name = "encode_char" + suffix
+                if wanted(name):
+                    encode = sender.encode
+                    suite.add(name, lambda: [encode(c) for c in chars], len(chars), params)
+                name = "encode_bulletin" + suffix
+                if wanted(name):
+                    suite.add(name, lambda: encodeText(sender, BULLETIN), 1, params)
+
+def benchDecode(suite, wanted, name, stream, params, wpm, codeType):
+    if not wanted(name):
+        return
+    reader = morse.Reader(wpm, 0, codeType, nothing, flushTimer=False)
+    decode = reader.decode
+    def fn():
+        for codeSeq in stream:
+            decode(codeSeq)
+    suite.add(name, fn, len(stream), params)
+    reader.flush()
+
+def benchReader(suite, wanted, recorded):
+    for codeType in CODETYPES:
+        for wpm in WPMS:
+            for spacing in SPACINGS:
+                params = {"wpm": wpm, "cwpm": CWPM, "codeType": codeType.name, "spacing": spacing.name}
+                suffix = "[{}-{}-{}]".format(codeType.name, wpm, spacing.name)
+                stream = encodeText(morse.Sender(wpm, CWPM, codeType, spacing), BULLETIN)
+                stream = [s for s in stream if s]
+                benchDecode(suite, wanted, "decode_packet" + suffix, stream, params, wpm, codeType)
+                name = "updateDWPM" + suffix
+                if wanted(name):
+                    reader = morse.Reader(wpm, 0, codeType, nothing)
+                    update = reader.updateDWPM
+                    suite.add(name, lambda: [update(s) for s in stream], len(stream), params)
+        name = "decodeChar[{}]".format(codeType.name)
+        if wanted(name):
+            reader = morse.Reader(20, 0, codeType, nothing)
+            def fn():
+                reader.codeBuf[reader.nChars] = '.-'
+                reader.markBuf[reader.nChars] = reader.dotLen * 3
+                reader.decodeChar(5 * reader.dotLen)
+            suite.add(name, fn, 1, {"codeType": codeType.name})
+        name = "lookupChar[{}]".format(codeType.name)
+        if wanted(name):
+            reader = morse.Reader(20, 0, codeType, nothing)
+            codes = list(morse.decodeTable[0 if codeType == config.CodeType.american else 1])
+            codes.append('.-.-.-.-')  # not in the table
+            lookup = reader.lookupChar
+            suite.add(name, lambda: [lookup(c) for c in codes], len(codes), {"codeType": codeType.name})
+    if recorded:
+        stream = [r.code for r in recorded]
+        params = {"packets": len(stream), "recorded": True}
+        for codeType in CODETYPES:
+            benchDecode(suite, wanted, "decode_recorded[{}]".format(codeType.name),
+                    stream, params, 20, codeType)
+
+def benchDelivery(suite, wanted):
+    stream = [s for s in encodeText(morse.Sender(20, CWPM), BULLETIN) if s]
+    words = []
+    def perChar(char, spacing):
+        if spacing >= morse.WORDSPACING and words:
+            words.append(' ')
+        words.append(char)
+    for name, callback in (("deliver_chars", perChar), ("deliver_words", morse.TextBatcher(words.append))):
+        if not wanted(name):
+            continue
+        reader = morse.Reader(20, 0, config.CodeType.american, callback, flushTimer=False)  # flushed below
+        decode = reader.decode
+        def fn():
+            for codeSeq in stream:
+                decode(codeSeq)
+            reader.flush()
+            words.clear()
+        suite.add(name, fn, len(stream), {"packets": len(stream)})
+
+def benchSpeedChange(suite, wanted):
+    speeds = [(wpm, CWPM) for wpm in WPMS]
+    for codeType in CODETYPES:
+        params = {"codeType": codeType.name, "speeds": len(speeds)}
+        name = "sender_construct[{}]".format(codeType.name)
+        if wanted(name):
+            suite.add(name, lambda: [morse.Sender(w, c, codeType) for w, c in speeds], len(speeds), params)
+        name = "sender_setSpeed[{}]".format(codeType.name)
+        if wanted(name):
+            sender = morse.Sender(20, 0, codeType)
+            suite.add(name, lambda: [sender.setSpeed(w, c) for w, c in speeds], len(speeds), params)
+
+def benchConfig(suite, wanted):
+    name = "config_snapshot"
+    if wanted(name):
+        suite.add(name, config.snapshot, 1)
+    name = "sender_from_globals"
+    if wanted(name):
+        suite.add(name, lambda: morse.Sender(config.text_speed, config.min_char_speed,
+                config.code_type, config.spacing), 1)
+    name = "sender_from_snapshot"
+    if wanted(name):
+        suite.add(name, lambda: morse.Sender.fromConfig(config.snapshot()), 1)
+    name = "reader_from_globals"
+    if wanted(name):
+        suite.add(name, lambda: morse.Reader(config.text_speed, config.min_char_speed,
+                config.code_type, nothing), 1)
+    name = "reader_from_snapshot"
+    if wanted(name):
+        suite.add(name, lambda: morse.Reader.fromConfig(config.snapshot(), nothing), 1)
+
+def benchPacket(suite, wanted):
+    code = morse.Sender(20).encode('V')
+    full = tuple(range(-25, 26))
+    for label, seq in (("short", code), ("full", full)):
+        params = {"elements": len(seq)}
+        name = "packet_pack[{}]".format(label)
+        if wanted(name):
+            suite.add(name, lambda: packet.packData("W1AW", 1, seq), 1, params)
+        name = "packet_unpack[{}]".format(label)
+        if wanted(name):
+            buf = packet.packData("W1AW", 1, seq)
+            suite.add(name, lambda: packet.unpackData(buf), 1, params)
+    name = "packet_pack_into"
+    if wanted(name):
+        buf = bytearray(packet.SIZE_DATA_PACKET)
+        suite.add(name, lambda: packet.packDataInto(buf, 0, "W1AW", 1, code), 1, {"elements": len(code)})
+
+def benchImport(suite, wanted, rounds=5):
+    for module in ("config", "morse"):
+        name = "import_{}".format(module)
+        if not wanted(name):
+            continue
+        script = ("import time; t = time.perf_counter(); import pykob.{}; "
+                  "print(time.perf_counter() - t)").format(module)
+        times = [float(subprocess.check_output([sys.executable, "-c", script]))
+                 for i in range(rounds)]
+        times.sort()
+        suite.record(name, times[0], times[len(times) // 2])
+
+def main():
+    parser = argumentParser("Benchmark the CWCom encode/decode hot paths.")
+    parser.add_argument("--recording", metavar="file",
+            help="A recorded code stream (see `recording.py`) to decode as well.")
+    args = parser.parse_args()
+    wanted = lambda name: args.filter in name
+    recorded = list(recording.readRecording(args.recording)) if args.recording else None
+    suite = Suite("morse")
+    benchImport(suite, wanted)
+    benchEncode(suite, wanted)
+    benchReader(suite, wanted, recorded)
+    benchDelivery(suite, wanted)
+    benchSpeedChange(suite, wanted)
+    benchConfig(suite, wanted)
+    benchPacket(suite, wanted)
+    return finish(suite, args)
+
+if __name__ == "__main__":
+    run(main)
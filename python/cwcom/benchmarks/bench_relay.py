@@ -0,0 +1,113 @@
+"""
+bench_relay.py
+
+Measures how the sharded relay (`relay.py`) scales with the number of worker
+processes, driven by a local load generator.
+
+    python3 bench_relay.py --workers 1,2,4 --wires 64 --seconds 5 -o relay.json
+    python3 bench_relay.py --transport pipe,ring --workers 2
+
+Each wire has one sending and one listening station. Generator processes send
+DAT packets on all wires as fast as they can; a listener process counts the
+packets the relay delivers. The result is the time per delivered packet, for each
+dispatcher-to-worker transport given with --transport.
+"""
+
+import multiprocessing
+import socket
+import threading
+import time
+
+from benchutil import Suite, argumentParser, finish, run
+from pykob import morse, packet, relay
+
+def generate(address, wires, seconds, ready):
+    code = morse.Sender(25).encode('V')
+    stations = []
+    for wire in wires:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(('127.0.0.1', 0))
+        s.sendto(packet.packCommand(packet.CON, wire), address)
+        stations.append(s)
+    ready.wait()
+    end = time.monotonic() + seconds
+    sequence = 0
+    while time.monotonic() < end:
+        sequence += 1
+        data = packet.packData("LOAD", sequence, code)
+        for s in stations:
+            s.sendto(data, address)
+
+def listen(address, wires, seconds, ready, result):
+    sockets = []
+    for wire in wires:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024 * 1024)
+        s.bind(('127.0.0.1', 0))
+        s.sendto(packet.packCommand(packet.CON, wire), address)
+        s.setblocking(False)
+        sockets.append(s)
+    ready.wait()
+    received = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for s in sockets:
+            try:
+                while True:
+                    s.recv(packet.SIZE_DATA_PACKET)
+                    received += 1
+            except BlockingIOError:
+                pass
+    result.value = received
+
+TRANSPORTS = {"pipe": relay.PipeTransport, "ring": relay.RingTransport}
+
+def measure(workers, wires, generators, seconds, transport=relay.PipeTransport):
+    r = relay.ShardedRelay('127.0.0.1', 0, workers, transport=transport)
+    r.start()
+    server = threading.Thread(target=r.serve, args=(seconds + 3,), daemon=True)
+    server.start()
+    ready = multiprocessing.Event()
+    result = multiprocessing.Value('q', 0)
+    wireList = list(range(1, wires + 1))
+    listener = multiprocessing.Process(target=listen, args=(r.address, wireList, seconds + 0.5, ready, result))
+    listener.start()
+    gens = [multiprocessing.Process(target=generate, args=(r.address, wireList[i::generators], seconds, ready))
+            for i in range(generators)]
+    for g in gens:
+        g.start()
+    time.sleep(1.0)  # let every station connect
+    ready.set()
+    for g in gens:
+        g.join()
+    listener.join()
+    r.running = False
+    server.join()
+    r.stop()
+    return result.value
+
+def main():
+    parser = argumentParser("Benchmark relay throughput against the number of workers.")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts.")
+    parser.add_argument("--wires", type=int, default=64)
+    parser.add_argument("--generators", type=int, default=2, help="Load generator processes.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--transport", default="pipe", help="Comma-separated transports (pipe, ring).")
+    args = parser.parse_args()
+    suite = Suite("relay")
+    for transport in args.transport.split(','):
+        for n in (int(w) for w in args.workers.split(',')):
+            name = "relay_delivered[{}]".format(n)
+            if transport != "pipe":
+                name = "relay_delivered_{}[{}]".format(transport, n)
+            if args.filter not in name:
+                continue
+            delivered = measure(n, args.wires, args.generators, args.seconds, TRANSPORTS[transport])
+            perPacket = args.seconds / delivered if delivered else float('inf')
+            suite.record(name, perPacket, perPacket, delivered,
+                    {"workers": n, "wires": args.wires, "transport": transport,
+                     "packetsPerSecond": delivered / args.seconds})
+    return finish(suite, args)
+
+if __name__ == "__main__":
+    run(main)
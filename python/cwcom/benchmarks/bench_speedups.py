@@ -0,0 +1,159 @@
+"""
+bench_speedups.py
+
+Checks that the compiled core of `morse.py` (`src/_speedups.c`, built with
+`build_speedups.py`) behaves exactly as the Python code, then measures both.
+
+    python3 ../build_speedups.py
+    python3 bench_speedups.py -o speedups.json
+    python3 bench_speedups.py --recording wire103.txt
+
+The check decodes the same streams with the compiled core and with the Python
+code (`morse.useSpeedups`) and compares every callback (character and spacing)
+and the Reader's state after every packet; the streams are random element
+sequences (latches, zeros and extreme lengths included), clean code, code
+sent with the fists of `fist.py` (if numpy is installed) and the recording
+given. `Sender.encode` is compared for every character of every code table.
+Any difference is printed and the benchmark fails.
+"""
+
+import random
+
+from benchutil import Suite, argumentParser, finish, run
+from pykob import codetable, config, morse, recording
+
+TEXT = ("QST DE W1AW QST QST QST DE W1AW HR BULLETIN NR 1 "
+        "THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG 1234567890 AR")
+WPMS = (5, 20, 35)
+STATE = ("codeBuf", "spaceBuf", "markBuf", "nChars", "latched", "mark", "space",
+         "d_wpm", "d_dotLen", "d_truDot")
+
+class Reader(morse.Reader):
+    def __init__(self, wpm, codeType):
+        self.output = []
+        morse.Reader.__init__(self, wpm, 0, codeType, self.collect, flushTimer=False)
+
+    def collect(self, char, spacing):
+        self.output.append((char, spacing))
+
+def state(reader):
+    """The Reader's state and the output since the last call."""
+    output = reader.output
+    reader.output = []
+    return tuple(getattr(reader, name) for name in STATE) + (output,)
+
+def decodeAll(stream, wpm, codeType, compiled):
+    """Return the Reader's output and state after each packet of `stream`."""
+    morse.useSpeedups(compiled)
+    reader = Reader(wpm, codeType)
+    states = []
+    for codeSeq in stream:
+        reader.decode(codeSeq)
+        states.append(repr(state(reader)))
+    reader.flush()
+    states.append(repr(state(reader)))
+    return states
+
+def randomStream(rnd, packets):
+    stream = []
+    for i in range(packets):
+        n = rnd.randint(0, 51)
+        seq = []
+        for j in range(n):
+            r = rnd.random()
+            if r < 0.05:
+                seq.append(rnd.choice((1, 2, 0)))
+            elif r < 0.1:
+                seq.append(rnd.choice((-1, 1)) * rnd.randint(3000, 100000))
+            else:
+                seq.append((-1) ** j * rnd.randint(3, 600))
+        stream.append(tuple(seq))
+    return stream
+
+def streams(recorded):
+    rnd = random.Random(0)
+    yield "random", randomStream(rnd, 2000), 20, config.CodeType.american
+    yield "random", randomStream(rnd, 2000), 20, config.CodeType.international
+    for codeType in (config.CodeType.american, config.CodeType.international):
+        for wpm in WPMS:
+            sender = morse.Sender(wpm, 0, codeType)
+            yield "clean", [c for c in (sender.encode(ch) for ch in TEXT) if c], wpm, codeType
+    try:
+        from pykob import fist
+    except ImportError:
+        fist = None  # numpy is not installed
+    if fist is not None:
+        for name in ("BUG", "STRAIGHT_KEY", "HAM_FIST"):
+            for codeType in (config.CodeType.american, config.CodeType.international):
+                generator = fist.TrafficGenerator(20, 0, codeType, fist=getattr(fist, name), seed=1)
+                yield name.lower(), list(generator.stream(generator.generate(TEXT, 5))), 20, codeType
+    if recorded:
+        for codeType in (config.CodeType.american, config.CodeType.international):
+            yield "recorded", [r.code for r in recorded], 20, codeType
+
+def check(recorded):
+    """Return the number of differences between the compiled core and the Python code."""
+    differences = 0
+    for name, stream, wpm, codeType in streams(recorded):
+        python = decodeAll(stream, wpm, codeType, False)
+        compiled = decodeAll(stream, wpm, codeType, True)
+        for i, (a, b) in enumerate(zip(python, compiled)):
+            if a != b:
+                print("decode {} {} {} wpm: packet {} differs:\n  python   {}\n  compiled {}".format(
+                        name, codeType.name, wpm, i, a[:300], b[:300]))
+                differences += 1
+                break
+    for table in codetable.registry.tables:
+        for wpm in WPMS:
+            codes = {}
+            for compiled in (False, True):
+                morse.useSpeedups(compiled)
+                sender = morse.Sender(wpm, 18, table.name)
+                codes[compiled] = [sender.encode(c) for c in list(table.encode) + list(TEXT)]
+            if codes[False] != codes[True]:
+                print("encode {} {} wpm differs".format(table.name, wpm))
+                differences += 1
+    morse.useSpeedups(True)
+    return differences
+
+def benchmark(suite, wanted):
+    for codeType in (config.CodeType.american, config.CodeType.international):
+        sender = morse.Sender(20, 0, codeType)
+        stream = [c for c in (sender.encode(ch) for ch in TEXT) if c]
+        for label, compiled in (("python", False), ("compiled", True)):
+            params = {"codeType": codeType.name, "core": label}
+            name = "decode_packet_{}[{}]".format(label, codeType.name)
+            if wanted(name):
+                morse.useSpeedups(compiled)
+                reader = Reader(20, codeType)
+                decode = reader.decode
+                def fn():
+                    for codeSeq in stream:
+                        decode(codeSeq)
+                    reader.output.clear()
+                suite.add(name, fn, len(stream), params)
+            name = "encode_char_{}[{}]".format(label, codeType.name)
+            if wanted(name):
+                morse.useSpeedups(compiled)
+                encode = morse.Sender(20, 0, codeType).encode
+                suite.add(name, lambda: [encode(c) for c in TEXT], len(TEXT), params)
+    morse.useSpeedups(True)
+
+def main():
+    parser = argumentParser("Check and benchmark the compiled Reader/Sender core.")
+    parser.add_argument("--recording", metavar="file", help="A recorded code stream to check as well.")
+    args = parser.parse_args()
+    if not morse.useSpeedups(True):
+        print("The compiled core is not built (run build_speedups.py).")
+        return 1
+    recorded = list(recording.readRecording(args.recording)) if args.recording else None
+    differences = check(recorded)
+    if differences:
+        print("{} difference(s) between the compiled core and the Python code.".format(differences))
+        return 1
+    suite = Suite("speedups")
+    benchmark(suite, lambda name: args.filter in name)
+    return finish(suite, args)
+
+if __name__ == "__main__":
+    run(main)
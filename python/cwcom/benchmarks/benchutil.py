@@ -0,0 +1,115 @@
+"""
+benchutil.py
+
+Timing, result files and regression checks shared by the benchmark scripts.
+
+Each benchmark is timed with `timeit` in several rounds; the best and the median
+time per operation are kept. Results are saved as JSON:
+
+    {"meta": {...}, "results": {"name": {"params": {...}, "ops": n,
+                                         "best": s, "median": s}}}
+
+and a later run can be compared with a saved one to flag regressions.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+def measure(fn, ops=1, rounds=5):
+    """
+    Time `fn` and return (best, median) seconds per operation.
+
+    `fn` performs `ops` operations per call. The number of calls per round is
+    chosen by `timeit` so a round lasts at least 0.2 seconds.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = [t / (number * ops) for t in timer.repeat(repeat=rounds, number=number)]
+    return min(times), statistics.median(times)
+
+class Suite:
+    """A named collection of benchmark results."""
+
+    def __init__(self, name):
+        self.name = name
+        self.results = {}
+
+    def add(self, name, fn, ops=1, params=None, rounds=5):
+        best, median = measure(fn, ops, rounds)
+        self.record(name, best, median, ops, params)
+        return best, median
+
+    def record(self, name, best, median, ops=1, params=None):
+        self.results[name] = {"params": params or {}, "ops": ops,
+                "best": best, "median": median}
+        print("{:<56} {:>12.3f} us {:>12.3f} us".format(name, best * 1e6, median * 1e6), flush=True)
+
+    def toJSON(self):
+        return {
+            "meta": {
+                "suite": self.name,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+            },
+            "results": self.results,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.toJSON(), f, indent=2, sort_keys=True)
+
+def compare(current, baseline, threshold):
+    """
+    Compare two result dictionaries (as saved by `Suite.save`).
+
+    Return a list of (name, baseline median, current median, ratio) for every
+    benchmark whose median slowed down by more than `threshold` (0.1 = 10%).
+    """
+    regressions = []
+    for name, r in sorted(current["results"].items()):
+        b = baseline["results"].get(name)
+        if not b or b["median"] <= 0:
+            continue
+        ratio = r["median"] / b["median"]
+        if ratio > 1.0 + threshold:
+            regressions.append((name, b["median"], r["median"], ratio))
+    return regressions
+
+def argumentParser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("-o", "--output", metavar="file",
+            help="Save the results as JSON to this file.")
+    parser.add_argument("--compare", metavar="file",
+            help="Compare against results saved by an earlier run.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+            help="Slow-down (fraction of the baseline median) reported as a regression.")
+    parser.add_argument("-k", "--filter", default="",
+            help="Only run benchmarks whose name contains this string.")
+    return parser
+
+def finish(suite, args):
+    """Save and compare the results as requested on the command line. Return the exit status."""
+    if args.output:
+        suite.save(args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(suite.toJSON(), baseline, args.threshold)
+        for name, b, c, ratio in regressions:
+            print("REGRESSION {}: {:.3f} us -> {:.3f} us ({:+.0%})".format(
+                    name, b * 1e6, c * 1e6, ratio - 1.0))
+        if regressions:
+            return 1
+        print("No regressions above {:.0%}.".format(args.threshold))
+    return 0
+
+def run(main):
+    sys.exit(main())
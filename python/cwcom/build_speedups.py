@@ -0,0 +1,26 @@
+"""
+build_speedups.py
+
+Builds the optional compiled core of `morse.py` (`src/_speedups.c`) next to
+its source, for the Python that runs this script:
+
+    python3 build_speedups.py
+
+`morse.py` uses the compiled core when it can be imported and its own Python
+code otherwise; the results are the same (see `benchmarks/bench_speedups.py`,
+which checks that before it measures). Needs a C compiler and setuptools.
+"""
+
+import os
+import sys
+import tempfile
+
+from setuptools import Extension, setup
+
+here = os.path.dirname(os.path.abspath(__file__))
+os.chdir(here)
+with tempfile.TemporaryDirectory() as temp:
+    setup(name="cwcom-speedups",
+          script_args=["build_ext", "--inplace", "--build-temp", temp] + sys.argv[1:],
+          package_dir={"pykob": "src"},
+          ext_modules=[Extension("pykob._speedups", [os.path.join("src", "_speedups.c")])])
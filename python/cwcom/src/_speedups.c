@@ -0,0 +1,422 @@
+/*
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+*/
+
+/*
+ * _speedups.c
+ *
+ * Optional compiled versions of the hot loops of `morse.py`:
+ *
+ *   decodeElements(reader, codeSeq)  - the element loop of `Reader.decode`
+ *   updateDWPM(reader, codeSeq)      - `Reader.updateDWPM`
+ *   encodeCode(elements, space, dotLen) - the element loop of `Sender.encode`
+ *
+ * They read and write the same Reader attributes, in the same order, as the
+ * Python code, and call `reader.decodeChar` as a method, so subclasses and
+ * callbacks see no difference. A code sequence holding anything but ints of
+ * 64 bits or less is left to the Python code (NotImplemented is returned).
+ *
+ * Build with `python3 build_speedups.py` (see there); `morse.py` uses the
+ * module when it can be imported.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+static PyObject *s_latched, *s_mark, *s_space, *s_nChars, *s_codeBuf, *s_markBuf;
+static PyObject *s_truDot, *s_dotLen, *s_params, *s_minDashLen, *s_minMorseSpace;
+static PyObject *s_alpha, *s_d_dotLen, *s_d_truDot, *s_d_wpm, *s_decodeChar;
+static PyObject *s_dot, *s_dash;
+
+/* Read a numeric attribute as a double. */
+static int
+get_double(PyObject *obj, PyObject *name, double *value)
+{
+	PyObject *v = PyObject_GetAttr(obj, name);
+	if (v == NULL)
+		return -1;
+	*value = PyFloat_AsDouble(v);
+	Py_DECREF(v);
+	return (*value == -1.0 && PyErr_Occurred()) ? -1 : 0;
+}
+
+static int
+get_longlong(PyObject *obj, PyObject *name, long long *value)
+{
+	PyObject *v = PyObject_GetAttr(obj, name);
+	if (v == NULL)
+		return -1;
+	*value = PyLong_AsLongLong(v);
+	Py_DECREF(v);
+	return (*value == -1 && PyErr_Occurred()) ? -1 : 0;
+}
+
+static int
+set_longlong(PyObject *obj, PyObject *name, long long value)
+{
+	PyObject *v = PyLong_FromLongLong(value);
+	int result;
+	if (v == NULL)
+		return -1;
+	result = PyObject_SetAttr(obj, name, v);
+	Py_DECREF(v);
+	return result;
+}
+
+/*
+ * Copy the elements of `seq` to a new array of long long. Return NULL with
+ * no exception set if an element is not an int that fits.
+ */
+static long long *
+elements_of(PyObject *seq, Py_ssize_t *count)
+{
+	PyObject *fast = PySequence_Fast(seq, "code sequence must be a sequence");
+	PyObject **items;
+	long long *elements;
+	Py_ssize_t i, n;
+	if (fast == NULL)
+		return NULL;
+	n = PySequence_Fast_GET_SIZE(fast);
+	items = PySequence_Fast_ITEMS(fast);
+	elements = PyMem_Malloc((n ? n : 1) * sizeof(long long));
+	if (elements == NULL) {
+		Py_DECREF(fast);
+		PyErr_NoMemory();
+		return NULL;
+	}
+	for (i = 0; i < n; i++) {
+		int overflow;
+		if (!PyLong_Check(items[i]))
+			break;
+		elements[i] = PyLong_AsLongLongAndOverflow(items[i], &overflow);
+		if (overflow || elements[i] < -(LLONG_MAX / 2) || elements[i] > LLONG_MAX / 2)
+			break;
+	}
+	Py_DECREF(fast);
+	if (i < n) {
+		PyMem_Free(elements);
+		return NULL;
+	}
+	*count = n;
+	return elements;
+}
+
+/* codeBuf[nChars] += symbol; markBuf[nChars] = mark */
+static int
+end_mark(PyObject *reader, PyObject *symbol, long long mark)
+{
+	PyObject *codeBuf = NULL, *markBuf = NULL, *code = NULL, *joined = NULL, *m = NULL;
+	long long nChars;
+	int result = -1;
+	if (get_longlong(reader, s_nChars, &nChars) < 0)
+		return -1;
+	if ((codeBuf = PyObject_GetAttr(reader, s_codeBuf)) == NULL)
+		goto done;
+	if ((code = PySequence_GetItem(codeBuf, (Py_ssize_t)nChars)) == NULL)
+		goto done;
+	if ((joined = PyNumber_InPlaceAdd(code, symbol)) == NULL)
+		goto done;
+	if (PySequence_SetItem(codeBuf, (Py_ssize_t)nChars, joined) < 0)
+		goto done;
+	if ((markBuf = PyObject_GetAttr(reader, s_markBuf)) == NULL)
+		goto done;
+	if ((m = PyLong_FromLongLong(mark)) == NULL)
+		goto done;
+	result = PySequence_SetItem(markBuf, (Py_ssize_t)nChars, m);
+done:
+	Py_XDECREF(codeBuf);
+	Py_XDECREF(code);
+	Py_XDECREF(joined);
+	Py_XDECREF(markBuf);
+	Py_XDECREF(m);
+	return result;
+}
+
+/* Write the loop's copies of latched, mark and space back to the reader. */
+static int
+put_state(PyObject *reader, int latched, long long mark, long long space)
+{
+	if (PyObject_SetAttr(reader, s_latched, latched ? Py_True : Py_False) < 0)
+		return -1;
+	if (set_longlong(reader, s_mark, mark) < 0)
+		return -1;
+	return set_longlong(reader, s_space, space);
+}
+
+static int
+get_state(PyObject *reader, int *latched, long long *mark, long long *space, double *truDot, double *dotLen)
+{
+	PyObject *v = PyObject_GetAttr(reader, s_latched);
+	if (v == NULL)
+		return -1;
+	*latched = PyObject_IsTrue(v);
+	Py_DECREF(v);
+	if (*latched < 0)
+		return -1;
+	if (get_longlong(reader, s_mark, mark) < 0 || get_longlong(reader, s_space, space) < 0)
+		return -1;
+	if (get_double(reader, s_truDot, truDot) < 0)
+		return -1;
+	return get_double(reader, s_dotLen, dotLen);
+}
+
+/*
+ * The element loop of `Reader.decode`. Between calls of `decodeChar` no
+ * Python code runs, so latched, mark, space, truDot and dotLen are kept in
+ * locals; they are written back before, and read again after, each call.
+ */
+static PyObject *
+decodeElements(PyObject *module, PyObject *args)
+{
+	PyObject *reader, *seq, *params = NULL, *r, *arg;
+	long long *elements, mark, space;
+	double minDashLen, minMorseSpace, truDot, dotLen;
+	Py_ssize_t n, i;
+	int latched;
+
+	if (!PyArg_ParseTuple(args, "OO:decodeElements", &reader, &seq))
+		return NULL;
+	elements = elements_of(seq, &n);
+	if (elements == NULL) {
+		if (PyErr_Occurred())
+			return NULL;
+		Py_RETURN_NOTIMPLEMENTED;
+	}
+	if ((params = PyObject_GetAttr(reader, s_params)) == NULL)
+		goto error;
+	if (get_double(params, s_minDashLen, &minDashLen) < 0 ||
+			get_double(params, s_minMorseSpace, &minMorseSpace) < 0)
+		goto error;
+	if (get_state(reader, &latched, &mark, &space, &truDot, &dotLen) < 0) {
+		if (PyErr_ExceptionMatches(PyExc_TypeError)) {  /* e.g. a float mark */
+			PyErr_Clear();
+			PyMem_Free(elements);
+			Py_DECREF(params);
+			Py_RETURN_NOTIMPLEMENTED;
+		}
+		goto error;
+	}
+
+	for (i = 0; i < n; i++) {
+		long long c = elements[i];
+		int start = 0;  /* start of a mark after a space */
+		if (c < 0) {  /* start or continuation of space, or continuation of mark (if latched) */
+			c = -c;
+			if (latched) {
+				mark += c;
+			} else if (space > 0) {  /* continuation of space */
+				space += c;
+			} else {  /* end of mark */
+				if (end_mark(reader, (double)mark > minDashLen * truDot ? s_dash : s_dot, mark) < 0)
+					goto error;
+				mark = 0;
+				space = c;
+			}
+		} else if (c == 1) {  /* start (or continuation) of extended mark */
+			latched = 1;
+			start = space > 0;
+		} else if (c == 2) {  /* end of mark (or continuation of space) */
+			latched = 0;
+		} else if (c > 2) {  /* mark */
+			latched = 0;
+			if (space > 0)
+				start = 1;
+			else if (mark > 0)  /* continuation of mark */
+				mark += c;
+		}
+		if (start) {
+			if ((double)space > minMorseSpace * dotLen) {  /* possible Morse or word space */
+				if (put_state(reader, latched, mark, space) < 0)
+					goto error;
+				if ((arg = PyLong_FromLongLong(space)) == NULL)
+					goto error;
+				r = PyObject_CallMethodObjArgs(reader, s_decodeChar, arg, NULL);
+				Py_DECREF(arg);
+				if (r == NULL)
+					goto error;
+				Py_DECREF(r);
+				if (get_state(reader, &latched, &mark, &space, &truDot, &dotLen) < 0)
+					goto error;
+			}
+			mark = c == 1 ? 0 : c;
+			space = 0;
+		}
+	}
+	PyMem_Free(elements);
+	Py_DECREF(params);
+	if (put_state(reader, latched, mark, space) < 0)
+		return NULL;
+	Py_RETURN_NONE;
+error:
+	PyMem_Free(elements);
+	Py_XDECREF(params);
+	return NULL;
+}
+
+static PyObject *
+updateDWPM(PyObject *module, PyObject *args)
+{
+	PyObject *reader, *seq, *params;
+	long long *elements, d_dotLen, d_truDot;
+	double alpha;
+	Py_ssize_t n, i;
+	int changed = 0;
+
+	if (!PyArg_ParseTuple(args, "OO:updateDWPM", &reader, &seq))
+		return NULL;
+	elements = elements_of(seq, &n);
+	if (elements == NULL) {
+		if (PyErr_Occurred())
+			return NULL;
+		Py_RETURN_NOTIMPLEMENTED;
+	}
+	if ((params = PyObject_GetAttr(reader, s_params)) == NULL) {
+		PyMem_Free(elements);
+		return NULL;
+	}
+	i = get_double(params, s_alpha, &alpha);
+	Py_DECREF(params);
+	if (i < 0 || get_longlong(reader, s_d_dotLen, &d_dotLen) < 0 ||
+			get_longlong(reader, s_d_truDot, &d_truDot) < 0) {
+		PyMem_Free(elements);
+		if (PyErr_ExceptionMatches(PyExc_TypeError)) {  /* e.g. a float d_dotLen */
+			PyErr_Clear();
+			Py_RETURN_NOTIMPLEMENTED;
+		}
+		return NULL;
+	}
+	for (i = 1; i < n - 2; i += 2) {
+		long long minDotLen = (long long)(0.5 * (double)d_dotLen);
+		long long maxDotLen = (long long)(1.5 * (double)d_dotLen);
+		if (elements[i] > minDotLen && elements[i] < maxDotLen &&
+				elements[i] - elements[i + 1] < 2 * maxDotLen &&
+				elements[i + 2] < maxDotLen) {
+			double dotLen = (double)(elements[i] - elements[i + 1]) / 2;
+			d_truDot = (long long)(alpha * (double)elements[i] + (1 - alpha) * (double)d_truDot);
+			d_dotLen = (long long)(alpha * dotLen + (1 - alpha) * (double)d_dotLen);
+			if (d_dotLen == 0) {  /* as the Python code: both set, then 1200. / 0 raises */
+				PyMem_Free(elements);
+				if (set_longlong(reader, s_d_truDot, d_truDot) == 0)
+					set_longlong(reader, s_d_dotLen, d_dotLen);
+				PyErr_SetString(PyExc_ZeroDivisionError, "float division by zero");
+				return NULL;
+			}
+			changed = 1;
+		}
+	}
+	PyMem_Free(elements);
+	if (changed) {
+		PyObject *wpm;
+		if (set_longlong(reader, s_d_truDot, d_truDot) < 0 || set_longlong(reader, s_d_dotLen, d_dotLen) < 0)
+			return NULL;
+		if ((wpm = PyFloat_FromDouble(1200. / (double)d_dotLen)) == NULL)
+			return NULL;
+		i = PyObject_SetAttr(reader, s_d_wpm, wpm);
+		Py_DECREF(wpm);
+		if (i < 0)
+			return NULL;
+	}
+	Py_RETURN_NONE;
+}
+
+static PyObject *
+encodeCode(PyObject *module, PyObject *args)
+{
+	PyObject *elements, *code, *v;
+	long long space, dotLen, mark;
+	Py_ssize_t n, i, count = 0;
+	int kind;
+	const void *data;
+
+	if (!PyArg_ParseTuple(args, "ULL:encodeCode", &elements, &space, &dotLen))
+		return NULL;
+	n = PyUnicode_GET_LENGTH(elements);
+	kind = PyUnicode_KIND(elements);
+	data = PyUnicode_DATA(elements);
+	for (i = 0; i < n; i++) {
+		Py_UCS4 e = PyUnicode_READ(kind, data, i);
+		if (e != ' ')
+			count += (e == '.' || e == '-' || e == '=' || e == '#') ? 2 : 1;
+	}
+	if ((code = PyTuple_New(count)) == NULL)
+		return NULL;
+	count = 0;
+	for (i = 0; i < n; i++) {
+		Py_UCS4 e = PyUnicode_READ(kind, data, i);
+		if (e == ' ') {
+			space = 3 * dotLen;
+			continue;
+		}
+		if ((v = PyLong_FromLongLong(-space)) == NULL)
+			goto error;
+		PyTuple_SET_ITEM(code, count++, v);
+		if (e == '.' || e == '-' || e == '=' || e == '#') {
+			mark = e == '.' ? dotLen : e == '-' ? 3 * dotLen : e == '=' ? 6 * dotLen : 9 * dotLen;
+			if ((v = PyLong_FromLongLong(mark)) == NULL)
+				goto error;
+			PyTuple_SET_ITEM(code, count++, v);
+		}
+		space = dotLen;
+	}
+	return code;
+error:
+	Py_DECREF(code);
+	return NULL;
+}
+
+static PyMethodDef methods[] = {
+	{"decodeElements", decodeElements, METH_VARARGS, "The element loop of Reader.decode."},
+	{"updateDWPM", updateDWPM, METH_VARARGS, "Reader.updateDWPM."},
+	{"encodeCode", encodeCode, METH_VARARGS, "The element loop of Sender.encode."},
+	{NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef module = {
+	PyModuleDef_HEAD_INIT, "_speedups", "Compiled hot loops of morse.py.", -1, methods
+};
+
+#define INTERN(var, name) if ((var = PyUnicode_InternFromString(name)) == NULL) return NULL
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+	INTERN(s_latched, "latched");
+	INTERN(s_mark, "mark");
+	INTERN(s_space, "space");
+	INTERN(s_nChars, "nChars");
+	INTERN(s_codeBuf, "codeBuf");
+	INTERN(s_markBuf, "markBuf");
+	INTERN(s_truDot, "truDot");
+	INTERN(s_dotLen, "dotLen");
+	INTERN(s_params, "params");
+	INTERN(s_minDashLen, "minDashLen");
+	INTERN(s_minMorseSpace, "minMorseSpace");
+	INTERN(s_alpha, "alpha");
+	INTERN(s_d_dotLen, "d_dotLen");
+	INTERN(s_d_truDot, "d_truDot");
+	INTERN(s_d_wpm, "d_wpm");
+	INTERN(s_decodeChar, "decodeChar");
+	INTERN(s_dot, ".");
+	INTERN(s_dash, "-");
+	return PyModule_Create(&module);
+}
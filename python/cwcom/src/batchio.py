@@ -0,0 +1,343 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+batchio.py
+
+Batched UDP packet I/O for relays.
+
+`MMsgIO` uses the Linux `recvmmsg`/`sendmmsg` system calls (through ctypes)
+with preallocated buffers, so a batch of received packets, or one packet fanned
+out to many stations, costs a single system call. `SimpleIO` has the same
+interface built on `recvfrom`/`sendto` and is used everywhere else.
+`openBatchIO` picks the best one available.
+
+Received packets are returned as memoryviews into the preallocated buffers;
+they are valid until the next call to `recv`.
+
+Addresses may name hosts, as for `sendto`: `MMsgIO` resolves a name once,
+when it first sends to the address. The sockaddrs of up to ADDRESSES
+addresses are kept in each direction; the cache is cleared when it is full. A packet that cannot be sent to one
+address (e.g. a name that does not resolve, or a full socket buffer) is
+dropped and counted in `errors`; the packets to the other addresses still go
+out, with either backend.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import socket
+import struct
+import sys
+
+from pykob.packet import SIZE_DATA_PACKET
+
+BATCH = 64           # packets per receive batch
+MAXFANOUT = 1024     # messages per sendmmsg call (UIO_MAXIOV)
+MSG_DONTWAIT = 0x40  # Linux
+ADDRESSES = 4096     # sockaddrs cached per direction
+
+class SimpleIO:
+    """One `recvfrom`/`sendto` system call per packet."""
+
+    def __init__(self, sock, batch=BATCH, size=SIZE_DATA_PACKET):
+        self.sock = sock
+        self.batch = batch
+        self.buffers = [bytearray(size) for i in range(batch)]
+        self.views = [memoryview(b) for b in self.buffers]
+        self.errors = 0  # packets that could not be sent
+
+    def recv(self, block=True):
+        """
+        Return a list of (memoryview, address) for up to `batch` packets. If
+        `block` is True wait for the first one; return the packets that are
+        already queued after that.
+        """
+        result = []
+        flags = 0 if block else MSG_DONTWAIT
+        for view in self.views:
+            try:
+                n, addr = self.sock.recvfrom_into(view, 0, flags)
+            except (BlockingIOError, InterruptedError):
+                break
+            result.append((view[:n], addr))
+            flags = MSG_DONTWAIT
+        return result
+
+    def send(self, packets):
+        """Send a list of (data, address) tuples."""
+        for data, addr in packets:
+            try:
+                self.sock.sendto(data, addr)
+            except OSError:
+                self.errors += 1
+
+    def fanout(self, data, addresses, skip=None):
+        """Send one packet to every address but `skip` (e.g. its sender)."""
+        for addr in addresses:
+            if addr == skip:
+                continue
+            try:
+                self.sock.sendto(data, addr)
+            except OSError:
+                self.errors += 1
+
+if sys.platform.startswith('linux'):
+    class _iovec(ctypes.Structure):
+        _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+    class _msghdr(ctypes.Structure):
+        _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                    ("msg_iov", ctypes.POINTER(_iovec)), ("msg_iovlen", ctypes.c_size_t),
+                    ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                    ("msg_flags", ctypes.c_int)]
+
+    class _mmsghdr(ctypes.Structure):
+        _fields_ = [("msg_hdr", _msghdr), ("msg_len", ctypes.c_uint)]
+
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _recvmmsg = _libc.recvmmsg
+        _recvmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint,
+                ctypes.c_int, ctypes.c_void_p]
+        _sendmmsg = _libc.sendmmsg
+        _sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    except (OSError, AttributeError):
+        _libc = None
+else:
+    _libc = None
+
+SOCKADDR_SIZE = 128  # sizeof(struct sockaddr_storage)
+_sockaddrIn = struct.Struct("=H")  # family (native order), then network-order fields
+
+def _encodeAddress(addr, buf):
+    """Write `addr` as a sockaddr into `buf`; return its length."""
+    host, port = addr[0], addr[1]
+    if ':' in host:
+        flowinfo = addr[2] if len(addr) > 2 else 0
+        scope = addr[3] if len(addr) > 3 else 0
+        raw = _sockaddrIn.pack(socket.AF_INET6) + struct.pack("!HI", port, flowinfo) + \
+                socket.inet_pton(socket.AF_INET6, host) + struct.pack("=I", scope)
+    else:
+        raw = _sockaddrIn.pack(socket.AF_INET) + struct.pack("!H", port) + \
+                socket.inet_aton(host) + bytes(8)
+    ctypes.memmove(buf, raw, len(raw))
+    return len(raw)
+
+def _isNumeric(host):
+    try:
+        socket.inet_pton(socket.AF_INET6 if ':' in host else socket.AF_INET, host)
+        return True
+    except OSError:
+        return False
+
+def _decodeAddress(raw):
+    family = _sockaddrIn.unpack_from(raw)[0]
+    if family == socket.AF_INET6:
+        port, flowinfo = struct.unpack_from("!HI", raw, 2)
+        scope = struct.unpack_from("=I", raw, 24)[0]
+        return (socket.inet_ntop(socket.AF_INET6, raw[8:24]), port, flowinfo, scope)
+    return (socket.inet_ntoa(raw[4:8]), struct.unpack_from("!H", raw, 2)[0])
+
+class _Messages:
+    """A preallocated `struct mmsghdr` vector with one sockaddr slot per message."""
+
+    def __init__(self, n):
+        self.n = n
+        self.msgs = (_mmsghdr * n)()
+        self.iov = (_iovec * n)()
+        self.names = (ctypes.c_char * (SOCKADDR_SIZE * n))()
+        names = ctypes.addressof(self.names)
+        for i in range(n):
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = names + i * SOCKADDR_SIZE
+            hdr.msg_namelen = SOCKADDR_SIZE
+            hdr.msg_iov = ctypes.pointer(self.iov[i])
+            hdr.msg_iovlen = 1
+
+    def setAddresses(self, sockaddrs):
+        names = ctypes.addressof(self.names)
+        for i, raw in enumerate(sockaddrs):
+            ctypes.memmove(names + i * SOCKADDR_SIZE, raw, len(raw))
+            self.msgs[i].msg_hdr.msg_namelen = len(raw)
+
+    def shareIov(self, iov):
+        """Point every message at the same iovec (for fan-out of one packet)."""
+        p = ctypes.pointer(iov)
+        for i in range(self.n):
+            self.msgs[i].msg_hdr.msg_iov = p
+
+class MMsgIO(SimpleIO):
+    """Batched `recvmmsg`/`sendmmsg` (Linux)."""
+
+    def __init__(self, sock, batch=BATCH, size=SIZE_DATA_PACKET):
+        if _libc is None:
+            raise OSError("recvmmsg/sendmmsg are not available on this platform.")
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.batch = batch
+        self.size = size
+        self.errors = 0  # packets that could not be sent
+        # Receive side: one buffer slot per message. The headers are restored
+        # from `rxTemplate` before each call (the kernel overwrites the lengths).
+        self.rx = _Messages(batch)
+        self.rxData = (ctypes.c_char * (size * batch))()
+        base = ctypes.addressof(self.rxData)
+        for i in range(batch):
+            self.rx.iov[i].iov_base = base + i * size
+            self.rx.iov[i].iov_len = size
+        self.rxTemplate = bytes(self.rx.msgs)
+        self.rxView = memoryview(self.rxData).cast('B')
+        self.rxNameView = memoryview(self.rx.names).cast('B')
+        stride = ctypes.sizeof(_mmsghdr) // 4
+        lenIndex = _mmsghdr.msg_len.offset // 4
+        nameLenIndex = _msghdr.msg_namelen.offset // 4
+        self.rxLengths = [(i * stride + lenIndex, i * stride + nameLenIndex) for i in range(batch)]
+        self.rxHeaders = memoryview(self.rx.msgs).cast('B').cast('I')
+        self.addresses = {}     # received sockaddr (bytes) -> address tuple
+        # Send side
+        self.sockaddrs = {}     # address tuple -> sockaddr (bytes)
+        self.fanIov = _iovec()  # the one iovec shared by all fan-out messages
+        self.fanKey = None      # the addresses the fan-out messages are set up for
+        self.fan = []           # _Messages for the fan-out, MAXFANOUT per vector
+        self.fanAt = {}         # address -> index of its message in the fan-out
+        self.fanUnresolved = 0  # addresses of the fan-out whose host name does not resolve
+        self.tx = None          # _Messages for `send`
+
+    def recv(self, block=True):
+        ctypes.memmove(self.rx.msgs, self.rxTemplate, len(self.rxTemplate))
+        # MSG_WAITFORONE: block for the first message only
+        flags = 0x10000 if block else MSG_DONTWAIT
+        n = _recvmmsg(self.fd, ctypes.addressof(self.rx.msgs), self.batch, flags, None)
+        if n < 0:
+            e = ctypes.get_errno()
+            if e in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(e, "recvmmsg: " + errno.errorcode.get(e, str(e)))
+        headers = self.rxHeaders
+        names = self.rxNameView
+        addresses = self.addresses
+        result = []
+        for i in range(n):
+            lenIndex, nameLenIndex = self.rxLengths[i]
+            start = i * SOCKADDR_SIZE
+            raw = bytes(names[start:start + headers[nameLenIndex]])
+            addr = addresses.get(raw)
+            if addr is None:
+                if len(addresses) >= ADDRESSES:
+                    addresses.clear()
+                addr = addresses[raw] = _decodeAddress(raw)
+            start = i * self.size
+            result.append((self.rxView[start:start + headers[lenIndex]], addr))
+        return result
+
+    def _sockaddr(self, addr):
+        """Return the sockaddr of `addr`, or None if its host name does not resolve."""
+        raw = self.sockaddrs.get(addr)
+        if raw is None:
+            numeric = addr
+            if not _isNumeric(addr[0]):
+                try:
+                    numeric = socket.getaddrinfo(addr[0], addr[1], self.sock.family, socket.SOCK_DGRAM)[0][4]
+                except OSError:
+                    return None
+            if len(self.sockaddrs) >= ADDRESSES:
+                self.sockaddrs.clear()
+            buf = ctypes.create_string_buffer(SOCKADDR_SIZE)
+            n = _encodeAddress(numeric, buf)
+            raw = self.sockaddrs[addr] = buf.raw[:n]
+        return raw
+
+    def _sendmmsg(self, messages, count, sent=0):
+        base = ctypes.addressof(messages.msgs)
+        while sent < count:
+            n = _sendmmsg(self.fd, base + sent * ctypes.sizeof(_mmsghdr), count - sent, 0)
+            if n < 0:
+                e = ctypes.get_errno()
+                if e == errno.EINTR:
+                    continue
+                self.errors += 1  # message `sent` failed: skip it, as `SimpleIO` does
+                n = 1
+            sent += n
+
+    def send(self, packets):
+        resolved = [(data, self._sockaddr(addr)) for data, addr in packets]
+        packets = [(data, raw) for data, raw in resolved if raw is not None]
+        self.errors += len(resolved) - len(packets)
+        buffers = [ctypes.create_string_buffer(bytes(data), len(data)) for data, raw in packets]
+        for start in range(0, len(packets), MAXFANOUT):
+            chunk = packets[start:start + MAXFANOUT]
+            if self.tx is None or self.tx.n < len(chunk):
+                self.tx = _Messages(min(len(packets), MAXFANOUT))
+            self.tx.setAddresses([raw for data, raw in chunk])
+            for i, b in enumerate(buffers[start:start + MAXFANOUT]):
+                self.tx.iov[i].iov_base = ctypes.addressof(b)
+                self.tx.iov[i].iov_len = len(b)
+            self._sendmmsg(self.tx, len(chunk))
+
+    def fanout(self, data, addresses, skip=None):
+        """
+        Send one packet to every address but `skip` (e.g. its sender). The
+        message headers are kept for the last list of addresses, so repeated
+        fan-out to the members of a wire, whichever of them sent the packet,
+        only sets the data pointer before the system calls.
+        """
+        if not addresses:
+            return
+        key = tuple(addresses)
+        if key != self.fanKey:
+            resolved = []
+            self.fanAt = {}
+            for addr in key:
+                raw = self._sockaddr(addr)
+                if raw is not None:
+                    self.fanAt[addr] = len(resolved)
+                    resolved.append(raw)
+            self.fanUnresolved = len(key) - len(resolved)
+            self.fan = []
+            for start in range(0, len(resolved), MAXFANOUT):
+                chunk = resolved[start:start + MAXFANOUT]
+                messages = _Messages(len(chunk))
+                messages.setAddresses(chunk)
+                messages.shareIov(self.fanIov)
+                self.fan.append(messages)
+            self.fanKey = key
+        self.errors += self.fanUnresolved
+        buf = ctypes.create_string_buffer(bytes(data), len(data))
+        self.fanIov.iov_base = ctypes.addressof(buf)
+        self.fanIov.iov_len = len(data)
+        skipped = self.fanAt.get(skip, -1)
+        for chunk, messages in enumerate(self.fan):
+            i = skipped - chunk * MAXFANOUT
+            if 0 <= i < messages.n:
+                self._sendmmsg(messages, i)
+                self._sendmmsg(messages, messages.n, i + 1)
+            else:
+                self._sendmmsg(messages, messages.n)
+
+def openBatchIO(sock, batch=BATCH, size=SIZE_DATA_PACKET):
+    """Return an `MMsgIO` for `sock` if the platform supports it, otherwise a `SimpleIO`."""
+    if _libc is not None:
+        return MMsgIO(sock, batch, size)
+    return SimpleIO(sock, batch, size)
@@ -0,0 +1,143 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+circuit.py
+
+Models the shared state of a closed-circuit wire.
+
+On a real telegraph wire the circuit is closed only while every key on it is
+closed. With the closed-circuit extension of the CWCom protocol a station
+signals that it has closed its key with a +1 code element and that it has
+opened it with (-n, +2), where n is how long the key was closed. A station
+whose key is open is sending.
+
+A `Circuit` follows these transitions for one wire, looking only at the last
+two code elements of each packet, and publishes the changes to listeners:
+
+    OPEN    a station now holds the wire: it opened its key on a closed circuit,
+            or its key was open when the holder closed
+    CLOSE   a station closed its key (the circuit may still be held by another)
+    BREAK   a station opened its key after a long closure (n > BREAKLENGTH)
+            while another station held the wire
+    RELEASE the holder closed its key, or was idle too long, and the wire is free
+
+A broken station is still open, but on a real wire nobody would hear it: the
+circuit is open at the breaker's key. `allow` tells the relay not to forward
+its code until it closes its key, as closed-circuit wires behave. Stations
+that never latch (CWCom clients) are released after IDLETIMEOUT seconds
+without code.
+"""
+
+OPEN    = "open"
+CLOSE   = "close"
+BREAK   = "break"
+RELEASE = "release"
+
+BREAKLENGTH = 3000  # ms closed before a (-n, +2) that makes it a break rather than a long dash
+IDLETIMEOUT = 5.0   # seconds without code before an open station is taken to have closed
+
+class Circuit:
+    """
+    The circuit of one wire. `listener(wire, event, station, other)` is
+    called for each change; `other` is the broken station for BREAK.
+    """
+
+    def __init__(self, wire, listener=None):
+        self.wire      = wire
+        self.listeners = [listener] if listener else []
+        self.open      = {}    # station -> time of its last code, in the order the keys were opened
+        self.holder    = None  # the station whose code is heard
+        self.broken    = set() # open stations that have been broken
+
+    @property
+    def closed(self):
+        return not self.open
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def _publish(self, event, station, other=None):
+        for listener in self.listeners:
+            listener(self.wire, event, station, other)
+
+    def update(self, station, code, now):
+        """
+        Follow the code elements of one packet from `station` (only the last
+        two are looked at). Return True if the packet should be heard on the
+        wire (forwarded).
+        """
+        if not code:
+            return True  # an ID packet
+        last = code[-1]
+        if last == 1:
+            self.close(station)
+            return True
+        if last == 2 and len(code) >= 2 and code[-2] < -BREAKLENGTH:
+            self._opened(station, now, True)
+            return True
+        if station not in self.open:
+            self._opened(station, now, False)
+        else:
+            self.open[station] = now
+        return station not in self.broken
+
+    def allow(self, station):
+        """Return True if code from `station` is heard on the wire."""
+        return station not in self.broken
+
+    def _opened(self, station, now, longClosure):
+        if station in self.open:
+            self.open[station] = now
+            return
+        self.open[station] = now
+        holder = self.holder
+        if holder is None:
+            self.holder = station
+            self._publish(OPEN, station)
+        elif longClosure:
+            self.broken.add(holder)
+            self.holder = station
+            self._publish(BREAK, station, holder)
+
+    def close(self, station):
+        """The key of `station` is closed (latched), or the station left."""
+        if self.open.pop(station, None) is None:
+            return
+        self.broken.discard(station)
+        self._publish(CLOSE, station)
+        if station == self.holder:
+            self.holder = None
+            for other in reversed(self.open):  # the most recently opened key still open
+                if other not in self.broken:
+                    self.holder = other
+                    self._publish(OPEN, other)
+                    break
+            if self.holder is None:
+                self._publish(RELEASE, station)
+
+    def expire(self, now, timeout=IDLETIMEOUT):
+        """Close the keys of stations that have sent no code for `timeout` seconds."""
+        for station in [s for s, t in self.open.items() if now - t > timeout]:
+            self.close(station)
@@ -0,0 +1,275 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+cli.py
+
+The `cwcom` command line, run as a module of the `pykob` package:
+
+    python3 -m pykob.cli decode [-t wpm] [-T code-type] [--detect] [-j N] [recording ...]
+    python3 -m pykob.cli encode [-t wpm] [-c wpm] [-T code-type] [-s spacing] [-S station] [text-file ...]
+    python3 -m pykob.cli replay [-t wpm] [-T code-type] [-x speed] [--to host[:port] [-w wire]] [--detect] [recording ...]
+
+`decode` reads recordings (see `recording.py`; '-' or no file reads standard
+input) and writes the decoded text of each station, one line at a time, as
+`station<TAB>text`. `encode` reads text and writes the recording of it being
+sent. `replay` plays recordings back at their recorded timing (or `--speed`
+times faster), decoding them as `decode` does or sending them to a server (see
+`replay.py`). All of them stream their input through generators, so memory use
+does not grow with the size of the input.
+
+With `--jobs N` the stations are spread over N worker processes (by a hash of
+the station id), each decoding its own stations; the lines of different
+stations may then come out in a different order, those of one station never
+do.
+
+    python3 -m pykob.cli decode -t 25 -j 4 wire103.txt
+"""
+
+import argparse
+import codecs
+import multiprocessing
+import sys
+import threading
+import zlib
+
+from pykob import codetable, config, morse, packet, recording, relay, replay
+
+LINELENGTH = 72    # characters of decoded text per output line
+CHUNK      = 256   # records handed to a worker at a time
+QUEUEDEPTH = 16    # chunks queued for each worker
+
+def readLines(paths):
+    """Generate the lines of the files `paths` ('-' is standard input)."""
+    for path in paths or ['-']:
+        if path == '-':
+            yield from sys.stdin
+        else:
+            with codecs.open(path, encoding='utf-8') as f:
+                yield from f
+
+class RecordingError(Exception):
+    """A malformed line of a recording; the message is `path:line: problem`."""
+
+def readRecords(paths):
+    for path in paths or ['-']:
+        for n, line in enumerate(readLines([path]), 1):
+            try:
+                r = recording.parseLine(line)
+            except ValueError as ex:
+                raise RecordingError("{}:{}: {}".format("<stdin>" if path == '-' else path, n, ex)) from None
+            if r is not None:
+                yield r
+
+def decodeStream(records, wpm=20, codeType=config.CodeType.american, detect=False,
+        width=LINELENGTH):
+    """
+    Decode `Record`s (of any number of stations) and generate (station, text)
+    for each line of decoded text. This is a replay in virtual time (see
+    `replay.ReaderTarget`).
+    """
+    out = []  # lines completed by the last packet
+
+    def collector(station):
+        return morse.TextBatcher(lambda line: out.append((station, line)), width)
+
+    target = replay.ReaderTarget(collector, wpm, codeType, detect)
+    for r in records:
+        target.deliver(r)
+        if out:
+            yield from out
+            out.clear()
+    target.close()
+    yield from out
+
+def shardOf(station, jobs):
+    return zlib.crc32(station.encode('utf-8')) % jobs
+
+def _decodeWorker(inbox, outbox, wpm, codeType, detect):
+    def records():
+        while True:
+            chunk = inbox.get()
+            if chunk is None:
+                return
+            yield from chunk
+    for line in decodeStream(records(), wpm, codeType, detect):
+        outbox.put(line)
+    outbox.put(None)
+
+def _feed(records, inboxes, errors):
+    chunks = [[] for i in inboxes]
+    try:
+        for r in records:
+            shard = shardOf(r.station, len(inboxes))
+            chunk = chunks[shard]
+            chunk.append(r)
+            if len(chunk) >= CHUNK:
+                inboxes[shard].put(chunk)
+                chunks[shard] = []
+        for inbox, chunk in zip(inboxes, chunks):
+            if chunk:
+                inbox.put(chunk)
+    except Exception as ex:
+        errors.append(ex)  # raised again by `decodeParallel`
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)  # always, or the workers would wait forever
+
+def decodeParallel(records, jobs, wpm=20, codeType=config.CodeType.american, detect=False):
+    """`decodeStream` with the stations spread over `jobs` worker processes."""
+    inboxes = [multiprocessing.Queue(QUEUEDEPTH) for i in range(jobs)]
+    outbox = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_decodeWorker, name="Decode-Worker-{}".format(i),
+            args=(inbox, outbox, wpm, codeType, detect), daemon=True)
+            for i, inbox in enumerate(inboxes)]
+    for w in workers:
+        w.start()
+    errors = []
+    feeder = threading.Thread(target=_feed, args=(records, inboxes, errors), name="Decode-Feeder",
+            daemon=True)
+    feeder.start()
+    running = jobs
+    while running:
+        line = outbox.get()
+        if line is None:
+            running -= 1
+        else:
+            yield line
+    feeder.join()
+    for w in workers:
+        w.join()
+    if errors:
+        raise errors[0]
+
+def encodeStream(lines, wpm=20, cwpm=0, codeType=config.CodeType.american,
+        spacing=config.Spacing.char, station=''):
+    """Generate the `Record` of each packet of the text `lines` sent at `wpm`."""
+    sender = morse.Sender(wpm, cwpm, codeType, spacing)
+    t = 0.0
+    for line in lines:
+        for c in line.rstrip('\r\n') + ' ':
+            code = sender.encode(c)
+            if code:
+                t += sum(abs(e) for e in code if abs(e) > 2) / 1000.0
+                yield recording.Record(t, station, code)
+
+def codeTable(name):
+    """The code table named by a --type value (e.g. 'A', 'INTERNATIONAL', 'american+punctuation')."""
+    name = name.lower()
+    name = {"a": "american", "i": "international"}.get(name, name)
+    if name not in codetable.registry.names:
+        raise argparse.ArgumentTypeError("'{}' is not a code table ({}).".format(
+                name, ", ".join(codetable.registry.names)))
+    return name
+
+def decode(args):
+    records = readRecords(args.files)
+    codeType = codeTable(args.code_type)
+    if args.jobs > 1:
+        lines = decodeParallel(records, args.jobs, args.text_speed, codeType, args.detect)
+    else:
+        lines = decodeStream(records, args.text_speed, codeType, args.detect)
+    for station, text in lines:
+        print("{}\t{}".format(station, text) if station else text)
+
+def encode(args):
+    try:
+        spacing = config.Spacing[args.spacing.lower()]
+    except KeyError:
+        raise argparse.ArgumentTypeError("'{}' is not a spacing (NONE|CHAR|WORD).".format(args.spacing))
+    station = args.station or ''
+    for r in encodeStream(readLines(args.files), args.text_speed, args.min_char_speed,
+            codeTable(args.code_type), spacing, station):
+        print(recording.formatRecord(*r))
+
+def address(s):
+    """A --to value: host[:port] (IPv6 addresses in brackets)."""
+    host, sep, port = s.rpartition(':')
+    if not sep or host.endswith(':'):
+        host, port = s, relay.PORT
+    try:
+        return (host.strip('[]') or '127.0.0.1', int(port))
+    except ValueError:
+        raise argparse.ArgumentTypeError("'{}' is not host[:port].".format(s))
+
+def replayRecordings(args):
+    records = replay.merge(*(readRecords([path]) for path in args.files or ['-']))
+    replayer = replay.Replayer(records, args.speed or None)
+    if args.to:
+        target = replay.UDPTarget(args.to, args.wire)
+    else:
+        def show(station):
+            return morse.TextBatcher(lambda line: print("{}\t{}".format(station, line) if station else line,
+                    flush=True), LINELENGTH)
+        target = replay.ReaderTarget(show, args.text_speed, codeTable(args.code_type), args.detect)
+    try:
+        replayer.run(target)
+    except KeyboardInterrupt:
+        pass
+    h = replayer.lateness
+    if h.count:
+        print("{} packets, mean lateness {:.3f} ms".format(replayer.replayed, 1000 * h.sum / h.count),
+                file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cwcom", description="Decode and encode Morse code timing streams.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    p = commands.add_parser("decode", help="Decode recordings to text.",
+            parents=[config.text_speed_override, config.code_type_override])
+    p.add_argument("files", nargs='*', help="Recordings to decode ('-' for standard input).")
+    p.add_argument("--detect", action='store_true',
+            help="Detect American or International code for each station.")
+    p.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes.")
+    p.set_defaults(run=decode)
+    p = commands.add_parser("encode", help="Encode text to a recording.",
+            parents=[config.text_speed_override, config.min_char_speed_override,
+                     config.code_type_override, config.spacing_override, config.station_override])
+    p.add_argument("files", nargs='*', help="Text files to encode ('-' for standard input).")
+    p.set_defaults(run=encode)
+    p = commands.add_parser("replay", help="Replay recordings in (scaled) real time.",
+            parents=[config.text_speed_override, config.code_type_override])
+    p.add_argument("files", nargs='*', help="Recordings to replay, merged in time order ('-' for standard input).")
+    p.add_argument("-x", "--speed", type=float, default=1.0,
+            help="Replay speed, as a multiple of the recorded timing (0: as fast as possible).")
+    p.add_argument("--to", type=address, metavar="host[:port]",
+            help="Send the packets to this server instead of decoding them.")
+    p.add_argument("-w", "--wire", type=int, default=packet.DEFAULT_CHANNEL, help="Wire to send on.")
+    p.add_argument("--detect", action='store_true',
+            help="Detect American or International code for each station.")
+    p.set_defaults(run=replayRecordings)
+    args = parser.parse_args(argv)
+    try:
+        args.run(args)
+    except argparse.ArgumentTypeError as ex:
+        parser.error(str(ex))
+    except RecordingError as ex:
+        print("{}: {}".format(parser.prog, ex), file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        sys.stderr.close()  # e.g. piped into `head`
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+codedetect.py
+
+Detects whether a station sends American or International Morse and switches
+its Reader to the matching code table.
+
+A `CodeDetector` hooks the `lookupChar` of a `Reader`, so it sees each
+character exactly as the Reader splits it, whether the Reader is decoding a
+packet or being flushed (also by its flusher thread), with no pass of its own
+over the code. One lookup in the merged index of `codetable.registry` gives
+the Reader its character and the evidence for every candidate table, which
+is kept for the last WINDOW characters:
+
+  - whether the character is recognized by each candidate table (the parts
+    of a spaced character are looked up separately as well, as a table
+    without spaced characters would read them);
+  - Morse spaces (two parts that an American table reads as one spaced
+    character) and long dashes (L, between MINLLEN and MAXDASHLEN dots),
+    which only American code has.
+
+Each table is charged one miss per character it does not recognize and, if
+it is an International table, one per Morse space or long dash. Once
+MINCHARS characters have been seen, the Reader is switched to the table with
+the fewest misses if it has MARGIN fewer than the current one.
+
+The detector has the Reader's `decode` and `flush`, so it can be used in
+place of the Reader.
+"""
+
+from collections import deque
+
+from pykob import codetable, config
+
+WINDOW   = 40  # characters of evidence kept
+MINCHARS = 12  # characters seen before the first switch
+MARGIN   = 4   # misses by which another table must beat the current one
+
+class CodeDetector:
+    def __init__(self, reader, tables=(codetable.AMERICAN, codetable.INTERNATIONAL),
+            window=WINDOW, minChars=MINCHARS, margin=MARGIN):
+        self.reader    = reader
+        self.tables    = [codetable.registry.table(t) for t in tables]
+        self.minChars  = minChars
+        self.margin    = margin
+        self.evidence  = deque(maxlen=window)  # (recognized by each candidate, American features)
+        self.misses    = [0] * len(self.tables)  # over `evidence`, by candidate
+        self.spaced    = 0      # Morse spaces the Reader did not take, charged to its next character
+        self.switches  = 0      # times the Reader's table was changed
+        self.international = [t.codeType == config.CodeType.international for t in self.tables]
+        self.americanIds = [t.id for i, t in enumerate(self.tables) if not self.international[i]]
+        reader.lookupChar = self.lookupChar
+
+    @property
+    def table(self):
+        """The table the Reader decodes with."""
+        return self.reader.table
+
+    def decode(self, codeSeq):
+        self.reader.decode(codeSeq)
+
+    def flush(self):
+        self.reader.flush()
+
+    def lookupChar(self, code):
+        """
+        The Reader's `lookupChar`: return the character of `code` in the
+        Reader's table and record the evidence of the character.
+        """
+        reader = self.reader
+        chars = codetable.registry.lookupAll(code)
+        s = chars[reader.tableId]
+        if not code:  # e.g. before the first character
+            return s
+        if ' ' in code:  # two parts that may be one spaced character
+            if any(chars[id] for id in self.americanIds):
+                if s and s != '&':  # the Reader takes them as one character
+                    self.endChar(code, chars, 1)
+                else:  # the Reader will read the parts
+                    self.spaced += 1
+            return s
+        american = self.spaced
+        self.spaced = 0
+        p = reader.params
+        if code == '-' and p.minLLen * reader.dotLen < reader.markBuf[0] < p.maxDashLen * reader.dotLen:
+            american += 1  # a long dash
+        self.endChar(code, chars, american)
+        return s
+
+    def endChar(self, code, chars, american):
+        if ' ' in code:
+            parts = [codetable.registry.lookupAll(part) for part in code.split(' ')]
+            recognized = tuple(bool(chars[t.id]) or all(c[t.id] for c in parts) for t in self.tables)
+        else:
+            recognized = tuple(bool(chars[t.id]) for t in self.tables)
+        evidence = self.evidence
+        if len(evidence) == evidence.maxlen:
+            self._count(evidence[0], -1)
+        entry = (recognized, american)
+        evidence.append(entry)
+        self._count(entry, 1)
+        if len(evidence) >= self.minChars:
+            self.choose()
+
+    def _count(self, entry, sign):
+        recognized, american = entry
+        for i in range(len(self.tables)):
+            miss = (not recognized[i]) + (american if self.international[i] else 0)
+            self.misses[i] += sign * miss
+
+    def choose(self):
+        """Switch the Reader to the candidate with the fewest misses, if it is MARGIN better."""
+        best = min(range(len(self.tables)), key=self.misses.__getitem__)
+        table = self.tables[best]
+        current = self.reader.table.id
+        for i, t in enumerate(self.tables):
+            if t.id == current:
+                if self.misses[i] - self.misses[best] < self.margin:
+                    return
+                break
+        if table.id != current:
+            self.reader.setCodeTable(table)
+            self.switches += 1
@@ -0,0 +1,181 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+codetable.py
+
+The registry of Morse code tables.
+
+A code table maps characters to their code, written with '.' (dot), '-'
+(dash), '=' (long dash), '#' (extra long dash) and ' ' (Morse space). The
+tables in `data/` are loaded at import: "american" and "international" (the
+tables of `config.CodeType`) and "american+punctuation". More tables, e.g. a
+user's own, can be loaded with `registry.load`.
+
+Each table has an integer id (its index in the registry) and the `CodeType`
+whose timing and decoding rules it follows. The decode direction of all the
+tables is merged into one index: code -> a tuple with the character of the
+code in each table ('' if the table has none), so decoding with any table,
+or with all of them at once (`lookupAll`, `score`), is a single dictionary
+lookup.
+"""
+
+import codecs
+from collections import namedtuple
+from pathlib import Path
+
+from pykob import config
+
+data_folder = Path(__file__).parent / "data"
+
+AMERICAN              = 0  # table ids of the tables in `data/`
+INTERNATIONAL         = 1
+AMERICAN_PUNCTUATION  = 2
+
+CodeTable = namedtuple("CodeTable", "id name codeType encode decode")
+
+class DecodeIndex(dict):
+    """The merged decode index: code -> character in each table, by id."""
+
+    def __init__(self, items=(), count=0):
+        super().__init__(items)
+        self.none = ('',) * count  # the entry of an unknown code
+
+class Registry:
+    """
+    The tables are only ever added or replaced, and the index is rebuilt
+    aside and published in one assignment before a new table is, so a Reader
+    decoding on another thread always sees a complete index that covers
+    every table id it can hold. Read the index through `lookup`,
+    `lookupAll` or `score` (or `registry.index` each time): a reference kept
+    to an index is not updated.
+    """
+
+    def __init__(self):
+        self.tables       = []  # by id
+        self.names        = {}  # name -> CodeTable
+        self.encodeTables = []  # by id: character -> code
+        self.decodeTables = []  # by id: code -> character
+        self.index        = DecodeIndex()
+
+    @property
+    def none(self):
+        """The index entry of an unknown code."""
+        return self.index.none
+
+    def add(self, name, pairs, codeType=config.CodeType.american):
+        """Register a table of (character, code) pairs and return it; a table
+        with the same name is replaced."""
+        encode = {}
+        decode = {}
+        for char, code in pairs:
+            encode[char] = code
+            decode[code] = char
+        old = self.names.get(name)
+        id = old.id if old is not None else len(self.tables)
+        table = CodeTable(id, name, config.CodeType(codeType), encode, decode)
+        tables = list(self.tables)
+        if old is not None:
+            tables[id] = table
+        else:
+            tables.append(table)
+        self.index = self._reindex(tables)  # before the table id is published
+        if old is not None:
+            self.tables[id] = table
+            self.encodeTables[id] = encode
+            self.decodeTables[id] = decode
+        else:
+            self.tables.append(table)
+            self.encodeTables.append(encode)
+            self.decodeTables.append(decode)
+        self.names[name] = table
+        return table
+
+    def load(self, path, name=None, codeType=config.CodeType.american):
+        """Register the table in file `path` (a title line, then a character, a
+        tab and its code on each line) as `name` (default: the file name without
+        'codetable-')."""
+        path = Path(path)
+        if name is None:
+            name = path.stem[len("codetable-"):] if path.stem.startswith("codetable-") else path.stem
+        with codecs.open(str(path), encoding='utf-8') as f:
+            f.readline()  # ignore first line
+            pairs = []
+            for s in f:
+                a, t, c = s.rstrip().partition('\t')
+                pairs.append((a, c))
+        return self.add(name, pairs, codeType)
+
+    def _reindex(self, tables):
+        """Return a new index of `tables`."""
+        count = len(tables)
+        codes = {}
+        for table in tables:
+            for code, char in table.decode.items():
+                codes.setdefault(code, [''] * count)[table.id] = char
+        return DecodeIndex(((code, tuple(chars)) for code, chars in codes.items()), count)
+
+    def table(self, codeType):
+        """Return the table for a `config.CodeType`, a table id or name, or a CodeTable."""
+        if isinstance(codeType, CodeTable):
+            return codeType
+        if isinstance(codeType, config.CodeType):  # before int: CodeType is an IntEnum
+            return self.tables[AMERICAN if codeType == config.CodeType.american else INTERNATIONAL]
+        if isinstance(codeType, str):
+            try:
+                return self.names[codeType]
+            except KeyError:
+                raise ValueError("Unknown code table '{}'.".format(codeType)) from None
+        return self.tables[codeType]
+
+    def lookup(self, code, id):
+        """Return the character of `code` in table `id`, or '' if it has none."""
+        index = self.index
+        return index.get(code, index.none)[id]
+
+    def lookupAll(self, code):
+        """Return the characters of `code` in every table, by id."""
+        index = self.index
+        return index.get(code, index.none)
+
+    def score(self, codes, ids=None):
+        """
+        Return how many of the characters `codes` each table recognizes (a list
+        by id, or in the order of `ids`), in one pass over the codes.
+        """
+        ids = range(len(self.tables)) if ids is None else ids
+        counts = [0] * len(ids)
+        index = self.index
+        none = index.none
+        for code in codes:
+            chars = index.get(code, none)
+            for i, id in enumerate(ids):
+                if chars[id]:
+                    counts[i] += 1
+        return counts
+
+registry = Registry()
+registry.load(data_folder / "codetable-american.txt", codeType=config.CodeType.american)
+registry.load(data_folder / "codetable-international.txt", codeType=config.CodeType.international)
+registry.load(data_folder / "codetable-american+punctuation.txt", codeType=config.CodeType.american)
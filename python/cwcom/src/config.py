@@ -52,8 +52,12 @@ import platform
 import pykob
 import socket
 import sys
+import threading
+import time
+from collections import namedtuple
 from distutils.util import strtobool
 from enum import Enum, IntEnum, unique
+from functools import wraps
 from pykob import log
 
 @unique
@@ -97,6 +101,9 @@ __STATION_KEY = "STATION"
 __TEXT_SPEED_KEY = "TEXT_SPEED"
 __WIRE_KEY = "WIRE"
 
+# Seconds between checks of the configuration files for changes (see `snapshot`)
+RELOAD_CHECK_INTERVAL = 1.0
+
 
 # Paths and Configurations
 app_config_dir = None
@@ -168,6 +175,90 @@ def noneOrValueFromStr(s):
     r = None if not s or not s.strip() or s.upper() == 'NONE' else s
     return r
 
+class ConfigSnapshot(namedtuple("ConfigSnapshot", (
+        "serial_port", "gpio", "auto_connect", "code_type", "interface_type",
+        "invert_key_input", "local", "min_char_speed", "remote", "server_url",
+        "sound", "sounder", "sounder_power_save", "spacing", "station", "wire",
+        "text_speed"))):
+    """An immutable copy of the configuration values (see `snapshot`).
+
+    The fields have the names and values of the module variables.
+    """
+    __slots__ = ()
+
+__snapshot = None                 # current ConfigSnapshot (None when it must be rebuilt)
+__snapshot_lock = threading.RLock()  # held to build, store or invalidate the snapshot
+__file_times = None               # modification times of the config files when last read
+__last_check = 0.0                # time.monotonic() of the last check of the files
+__unsaved = False                 # True when a `set_*` function has changed a value not saved yet
+
+def _config_file_times():
+    times = []
+    for path in (user_config_file_path, app_config_file_path):
+        try:
+            times.append(os.stat(path).st_mtime_ns)
+        except (OSError, TypeError):
+            times.append(None)
+    return tuple(times)
+
+def _changes_config(setter):
+    """Decorator for the `set_*` functions: the next `snapshot` reflects the new value."""
+    @wraps(setter)
+    def set_value(*args, **kwargs):
+        global __snapshot
+        global __unsaved
+        result = setter(*args, **kwargs)
+        with __snapshot_lock:  # after any snapshot being built from the old value is stored
+            __snapshot = None
+            __unsaved = True
+        return result
+    return set_value
+
+def snapshot():
+    """Return the current configuration as a `ConfigSnapshot`.
+
+    The snapshot is built once and shared; it is replaced (never modified) when
+    a `set_*` function changes a value, or when the configuration files have
+    been changed on disk, which is checked at most every
+    RELOAD_CHECK_INTERVAL seconds and re-reads them with `read_config`.
+    The files are not re-read while values set with the `set_*` functions
+    have not been saved (`save_config`), so such values are never lost; if
+    the files cannot be read (the error is logged by `read_config`) the
+    previous snapshot is kept until they change again.
+
+    Code that needs several values (e.g. to create a `morse.Sender`) should
+    take one snapshot and read them from it, rather than read the module
+    variables, which `read_config` rewrites one at a time. A snapshot is not
+    faster than reading the variables (it costs one call); it is consistent.
+
+    A snapshot is built and stored under the lock that the `set_*`
+    functions take to invalidate it after changing a value, so a snapshot
+    built from the old value is always invalidated after it is stored.
+    """
+    global __snapshot
+    global __file_times
+    global __last_check
+    current = __snapshot
+    if current is not None and time.monotonic() - __last_check < RELOAD_CHECK_INTERVAL:
+        return current
+    with __snapshot_lock:
+        now = time.monotonic()
+        if __snapshot is not None and now - __last_check < RELOAD_CHECK_INTERVAL:
+            return __snapshot
+        __last_check = now
+        times = _config_file_times()
+        if times != __file_times and not __unsaved:
+            previous = __snapshot
+            try:
+                read_config()
+            except (OSError, KeyError, ValueError, configparser.Error):
+                __file_times = times  # not retried until the files change again
+                __snapshot = previous
+        if __snapshot is None:
+            values = globals()
+            __snapshot = ConfigSnapshot(*(values[name] for name in ConfigSnapshot._fields))
+        return __snapshot
+
 def create_config_files_if_needed():
     global app_config_dir
     global app_config_file_path
@@ -190,6 +281,7 @@ def create_config_files_if_needed():
         f = open(app_config_file_path, 'w')
         f.close()
 
+@_changes_config
 def set_auto_connect(s):
     """Sets the Auto Connect to wire enable state
 
@@ -215,6 +307,7 @@ def set_auto_connect(s):
         log.err("Auto Connect value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_code_type(s):
     """Sets the Code Type (for American or International)
 
@@ -238,6 +331,7 @@ def set_code_type(s):
     user_config.set(__CONFIG_SECTION, __CODE_TYPE_KEY, code_type.name.upper())
 
 
+@_changes_config
 def set_interface_type(s):
     """Sets the Interface Type (for Key-Sounder, Loop or Keyer)
 
@@ -264,6 +358,7 @@ def set_interface_type(s):
     user_config.set(__CONFIG_SECTION, __INTERFACE_TYPE_KEY, interface_type.name.upper())
 
 
+@_changes_config
 def set_invert_key_input(b):
     """
     Enable/disable key input signal (DSR) invert.
@@ -286,6 +381,7 @@ def set_invert_key_input(b):
         log.err("INVERT KEY INPUT value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_local(l):
     """Enable/disable local copy
 
@@ -307,6 +403,7 @@ def set_local(l):
         log.err("LOCAL value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_remote(r):
     """Enable/disable remote send
 
@@ -328,6 +425,7 @@ def set_remote(r):
         log.err("REMOTE value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_min_char_speed(s):
     """Sets the minimum character speed in words per minute
 
@@ -353,6 +451,7 @@ def set_min_char_speed(s):
         log.err("CHARS value '{}' is not a valid integer value. Not setting CWPM value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_serial_port(p):
     """Sets the name/path of the serial/tty port to use for a
     key+sounder/loop interface
@@ -367,6 +466,7 @@ def set_serial_port(p):
     serial_port = noneOrValueFromStr(p)
     app_config.set(__CONFIG_SECTION, __SERIAL_PORT_KEY, serial_port)
 
+@_changes_config
 def set_gpio(s):
     """Sets the key/sounder interface to Raspberry Pi GPIO
 
@@ -389,6 +489,7 @@ def set_gpio(s):
         log.err("GPIO value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_server_url(s):
     """Sets the KOB Server URL to connect to for wires
 
@@ -404,6 +505,7 @@ def set_server_url(s):
         server_url = None
     user_config.set(__CONFIG_SECTION, __SERVER_URL_KEY, server_url)
 
+@_changes_config
 def set_sound(s):
     """Sets the Sound/Audio enable state
 
@@ -425,6 +527,7 @@ def set_sound(s):
         log.err("SOUND value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_sounder(s):
     """Sets the Sounder enable state
 
@@ -447,6 +550,7 @@ def set_sounder(s):
         log.err("SOUNDER value '{}' is not a valid boolean value. Not setting value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_sounder_power_save(s):
     """Sets the time (in seconds) to delay before de-energizing the sounder to save power
 
@@ -468,6 +572,7 @@ def set_sounder_power_save(s):
         log.err("Idle time '{}' is not a valid integer value. Not setting SounderPowerSave value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_spacing(s):
     """Sets the Spacing (for Farnsworth timing) to None (disabled) `Spacing.none`,
     Character `Spacing.char` or Word `Spacing.word`
@@ -499,6 +604,7 @@ def set_spacing(s):
     user_config.set(__CONFIG_SECTION, __SPACING_KEY, spacing.name.upper())
 
 
+@_changes_config
 def set_station(s):
     """Sets the Station ID to use when connecting to a wire
 
@@ -512,6 +618,7 @@ def set_station(s):
     station = noneOrValueFromStr(s)
     user_config.set(__CONFIG_SECTION, __STATION_KEY, station)
 
+@_changes_config
 def set_wire(w: str):
     """Sets the wire to connect to
 
@@ -530,6 +637,7 @@ def set_wire(w: str):
         log.err("Wire number value '{}' is not a valid integer value.".format(ex.args[0]))
         raise
 
+@_changes_config
 def set_text_speed(s):
     """Sets the Text (code) speed in words per minute
 
@@ -603,11 +711,17 @@ def save_config():
     system/machine config files.
     """
 
+    global __file_times
+    global __unsaved
+
     create_config_files_if_needed()
     with open(user_config_file_path, 'w') as configfile:
         user_config.write(configfile, space_around_delimiters=False)
     with open(app_config_file_path, 'w') as configfile:
         app_config.write(configfile, space_around_delimiters=False)
+    with __snapshot_lock:
+        __file_times = _config_file_times()  # the files now hold the current values
+        __unsaved = False
 
 def read_config():
     """Read the configuration values from the user and machine config files.
@@ -647,6 +761,9 @@ def read_config():
     global station
     global wire
     global text_speed
+    global __snapshot
+    global __file_times
+    global __unsaved
 
     # Get the system data
     try:
@@ -712,6 +829,7 @@ def read_config():
     user_config = configparser.ConfigParser(defaults=user_config_defaults, allow_no_value=True, default_section=__CONFIG_SECTION)
     app_config = configparser.ConfigParser(defaults=app_config_defaults, allow_no_value=True, default_section=__CONFIG_SECTION)
 
+    __file_times = _config_file_times()
     user_config.read(user_config_file_path)
     app_config.read(app_config_file_path)
 
@@ -815,6 +933,9 @@ def read_config():
     except ValueError as ex:
         log.err("{} option value '{}' is not a valid value. INI file key: {}.".format(__option, ex.args[0], __key))
         raise
+    with __snapshot_lock:
+        __snapshot = None
+        __unsaved = False
 
 # ### Mainline
 read_config()
@@ -0,0 +1,190 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+fist.py
+
+Generates synthetic code traffic with realistic operator timing ("fists") for
+load and accuracy testing of decoders.
+
+The text is encoded once with `morse.Sender`, which gives perfect machine
+timing including Farnsworth spacing. The resulting packets are laid out in a
+NumPy array (one row of up to SIZE_CODE elements per packet) and the fist's
+timing errors are applied to the whole array at once, so large volumes of
+traffic can be produced quickly. NumPy is required only for `generate`.
+"""
+
+import random
+from collections import namedtuple
+
+from pykob import config, morse
+from pykob.packet import SIZE_CODE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MINBREAK = 3000  # a (-n, +2) packet with n above this is a break (see README)
+
+"""
+Traffic returned by `TrafficGenerator.generate`:
+    codes - int32 array (packets x SIZE_CODE), unused elements are 0
+    lengths - int32 array with the number of code elements in each packet
+    chars - the ground-truth text of each packet (see `TrafficGenerator.encode`)
+    text - the ground-truth text, with '_' for a circuit closure
+"""
+Traffic = namedtuple("Traffic", "codes lengths chars text")
+
+class Fist:
+    """
+    Timing model of an operator.
+
+    Scales are applied to the perfect element lengths; jitters are the standard
+    deviation of a Gaussian error relative to the element length.
+    """
+
+    def __init__(self, dotScale=1.0, dashScale=1.0, dotJitter=0.0, dashJitter=0.0,
+            elementSpaceJitter=0.0, spaceJitter=0.0, breakRate=0.0):
+        self.dotScale           = dotScale            # dot length relative to Sender's
+        self.dashScale          = dashScale           # dash length relative to Sender's
+        self.dotJitter          = dotJitter           # dot length error
+        self.dashJitter         = dashJitter          # dash length error
+        self.elementSpaceJitter = elementSpaceJitter  # error of spaces inside a character
+        self.spaceJitter        = spaceJitter         # error of character and word spaces
+        self.breakRate          = breakRate           # chance of a latch/unlatch closure after a word
+
+MACHINE      = Fist()
+BUG          = Fist(dotScale=0.95, dashScale=1.1, dotJitter=0.02, dashJitter=0.1,
+                    elementSpaceJitter=0.05, spaceJitter=0.15)  # regular dots, heavy dashes
+STRAIGHT_KEY = Fist(dotJitter=0.12, dashJitter=0.1, elementSpaceJitter=0.15,
+                    spaceJitter=0.2)
+HAM_FIST     = Fist(dotScale=1.2, dashScale=0.85, dotJitter=0.2, dashJitter=0.2,
+                    elementSpaceJitter=0.25, spaceJitter=0.3)
+
+class TrafficGenerator:
+    """
+    Generate code packets for `text` as sent by an operator with the given fist.
+    """
+
+    def __init__(self, wpm=20, cwpm=0, codeType=config.CodeType.american,
+            spacing=config.Spacing.char, fist=MACHINE, seed=None):
+        self.wpm      = wpm
+        self.cwpm     = cwpm
+        self.codeType = codeType
+        self.spacing  = spacing
+        self.fist     = fist
+        self.random   = random.Random(seed)
+        self.seed     = seed
+
+    def encode(self, text):
+        """
+        Return (packets, chars): the perfectly timed packets for `text` and the
+        text each one carries, with a leading ' ' for a packet that starts a
+        new word. Characters that produce no code (spaces) are folded into the
+        space before the next packet, as `Sender` does.
+        """
+        sender = morse.Sender(self.wpm, self.cwpm, self.codeType, self.spacing)
+        packets = []
+        chars = []
+        gap = ''  # ' ' if a word space precedes the next packet
+        for c in text:
+            if c == ' ':
+                if packets and self.fist.breakRate and \
+                        self.random.random() < self.fist.breakRate:
+                    closure = self.random.randint(MINBREAK + 1, 2 * MINBREAK)
+                    packets.append((-sender.wordSpace, +1))
+                    packets.append((-closure, +2))
+                    chars.append(' _')
+                    chars.append('')
+                    sender.space = sender.charSpace  # as after '~': the space below makes it a word space
+                gap = ' ' if packets else ''
+                sender.encode(c)
+                continue
+            code = sender.encode(c)
+            while len(code) > SIZE_CODE:  # never happens with the shipped tables
+                packets.append(code[:SIZE_CODE])
+                chars.append('')
+                code = code[SIZE_CODE:]
+            if code:
+                packets.append(code)
+                chars.append(gap + c.upper())
+                gap = ''
+        return packets, chars
+
+    def generate(self, text, repeat=1):
+        """
+        Return `Traffic` for `text` sent `repeat` times.
+
+        The perfect timing is computed once; each repetition gets its own
+        random timing errors.
+        """
+        if np is None:
+            raise ImportError("NumPy is required to generate traffic arrays (pip install numpy).")
+        packets, chars = self.encode(text)
+        n = len(packets)
+        template = np.zeros((n, SIZE_CODE), dtype=np.int32)
+        lengths = np.empty(n, dtype=np.int32)
+        for i, p in enumerate(packets):
+            template[i, :len(p)] = p
+            lengths[i] = len(p)
+        codes = np.tile(template, (repeat, 1))
+        lengths = np.tile(lengths, repeat)
+        self.applyFist(codes[:, :max(lengths.max(initial=0), 2)])  # skip the unused columns
+        return Traffic(codes, lengths, chars * repeat, ' '.join([''.join(chars)] * repeat))
+
+    def applyFist(self, codes):
+        """Apply the fist's timing errors to a perfectly timed code array in place."""
+        f = self.fist
+        rng = np.random.default_rng(self.random.getrandbits(64))
+        dotLen = morse.timing(self.wpm, self.cwpm, self.codeType, self.spacing).dotLen
+        marks = codes > 2  # +1 and +2 are latch/unlatch, not marks
+        dashes = codes >= 2 * dotLen
+        dots = marks & ~dashes
+        spaces = codes < 0
+        leading = np.zeros_like(spaces)
+        leading[:, 0] = spaces[:, 0]
+        inner = spaces & ~leading
+        closures = np.zeros_like(spaces)
+        closures[:, 0] = (codes[:, 1] == 2)  # the length of the closure is kept
+        leading &= ~closures
+        scale = np.ones(codes.shape)
+        for mask, factor, jitter in ((dots, f.dotScale, f.dotJitter),
+                (dashes, f.dashScale, f.dashJitter),
+                (inner, 1.0, f.elementSpaceJitter),
+                (leading, 1.0, f.spaceJitter)):
+            if jitter:
+                scale[mask] = factor * (1.0 + rng.normal(0.0, jitter, int(mask.sum())))
+            elif factor != 1.0:
+                scale[mask] = factor
+        result = np.rint(codes * scale)
+        result[marks] = np.maximum(result[marks], 3)
+        result[spaces] = np.minimum(result[spaces], -1)
+        codes[...] = result.astype(np.int32)
+        return codes
+
+    def stream(self, traffic):
+        """Generate the packets of `traffic` as tuples, ready for `Reader.decode`."""
+        for row, n in zip(traffic.codes, traffic.lengths):
+            yield tuple(row[:n].tolist())
@@ -0,0 +1,295 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+keyer.py
+
+An iambic electronic keyer.
+
+`IambicKeyer` turns paddle states into code sequences in the format of
+`Sender.encode`: one sequence per character, (-space, mark, -space, mark,
+...), with dots of `dotLen` ms and dashes of three dots taken from the same
+timing profile as a Sender (`morse.timing`). Squeezing both paddles sends
+alternating dots and dashes; pressing the other paddle while an element is
+being sent is remembered (dot/dash memory) and sends that element next. In
+mode B the element remembered from a squeeze is still sent when both paddles
+are released during the element; in mode A it is dropped.
+
+A character ends when the paddles are idle for a character space (three dots
+after the last mark); the next character starts no earlier than the Sender's
+character space, which includes the Farnsworth stretch. The closed-circuit
+latch (+1/+2) is left to the caller, as with `Sender`.
+
+Like `keyinput.KeyEncoder`, the keyer takes the time as an argument (`paddles`,
+`poll`, `deadline`). `KeyerThread` drives it in real time: it sleeps until
+shortly before each deadline and then spins, so elements start within a
+fraction of a millisecond of their scheduled times. `keyPaddles` runs it over
+recorded paddle events.
+"""
+
+import os
+import time
+from collections import namedtuple
+from threading import Thread
+
+from pykob import config, morse, packet
+
+MODE_A = 'A'
+MODE_B = 'B'
+
+DOT  = 1  # element lengths, in dots
+DASH = 3
+
+SPIN     = 0.002  # seconds before a deadline to stop sleeping and spin
+IDLEWAIT = 0.1    # longest wait for a paddle change when nothing is due (sec)
+POLL     = 0.001  # interval between reads of polled paddles (sec)
+PRIORITY = 10     # SCHED_FIFO priority of a real-time KeyerThread
+
+PaddleEvent = namedtuple("PaddleEvent", "time dit dah")
+
+class IambicKeyer:
+    def __init__(self, wpm, cwpm=0, codeType=config.CodeType.american,
+            spacing=config.Spacing.char, mode=MODE_B, start=0.0, keyOut=None):
+        timing = morse.timing(wpm, cwpm, codeType, spacing)
+        self.dotLen    = timing.dotLen     # ms
+        self.charSpace = timing.charSpace  # ms, including the Farnsworth stretch
+        self.mode      = mode
+        self.keyOut    = keyOut   # optional function called with True/False at each mark edge
+        self.dit       = False    # paddle states
+        self.dah       = False
+        self.element   = None     # DOT or DASH being sent
+        self.last      = None     # last element sent
+        self.memory    = None     # element remembered while sending
+        self.keyed     = False    # True while the mark of the element is on
+        self.markEnd   = start    # time the last mark ended (or ends)
+        self.end       = None     # time the current element and its space end
+        self.charEnd   = None     # time the pending code becomes a complete character
+        self.pending   = None     # (element, time) waiting for the character space
+        self.code      = ()       # elements of the character being sent
+
+    def paddles(self, t, dit, dah):
+        """Set the paddle states at time `t`; return the code sequences completed."""
+        out = self.poll(t)
+        self.dit, self.dah = dit, dah
+        if self.element is not None:
+            if self.element == DOT and dah:
+                self.memory = DASH
+            elif self.element == DASH and dit:
+                self.memory = DOT
+        elif self.pending is None and (dit or dah):
+            element = DOT if dit else DASH
+            start = t
+            if self.charEnd is None:  # a new character: keep the character space
+                start = max(t, self.markEnd + self.charSpace / 1000.0)
+            if start > t:
+                self.pending = (element, start)
+            else:
+                out += self._start(element, t)
+        return out
+
+    def poll(self, t):
+        """Run the keyer up to time `t`; return the code sequences completed."""
+        out = []
+        while True:
+            d = self.deadline()
+            if d is None or d > t:
+                return out
+            out += self._step(d)
+
+    def deadline(self):
+        """Return the time of the next scheduled change (or None)."""
+        if self.element is not None:
+            return self.markEnd if self.keyed else self.end
+        if self.pending is not None:
+            return self.pending[1]
+        return self.charEnd
+
+    def _step(self, now):
+        if self.element is not None:
+            if self.keyed:
+                self.keyed = False
+                if self.keyOut:
+                    self.keyOut(False)
+                return []
+            self.last = self.element
+            self.element = None
+            element = self._next()
+            if element is not None:
+                return self._start(element, now)
+            self.charEnd = self.markEnd + 3 * self.dotLen / 1000.0
+            return []
+        if self.pending is not None:
+            element, start = self.pending
+            self.pending = None
+            return self._start(element, start)
+        code, self.code, self.charEnd = self.code, (), None
+        return [code] if code else []
+
+    def _next(self):
+        dit, dah = self.dit, self.dah
+        memory, self.memory = self.memory, None
+        if dit and dah:
+            return DASH if self.last == DOT else DOT
+        if memory is not None and (self.mode == MODE_B or dit or dah):
+            return memory
+        if dit:
+            return DOT
+        if dah:
+            return DASH
+        return None
+
+    def _start(self, element, t):
+        out = []
+        if len(self.code) >= packet.SIZE_CODE - 1:
+            out.append(self.code)
+            self.code = ()
+        space = int(round((t - self.markEnd) * 1000))
+        mark = element * self.dotLen
+        self.code += (-space, mark)
+        self.element = element
+        self.memory = None
+        if element == DOT and self.dah:
+            self.memory = DASH
+        elif element == DASH and self.dit:
+            self.memory = DOT
+        self.markEnd = t + mark / 1000.0
+        self.end = self.markEnd + self.dotLen / 1000.0
+        self.charEnd = None
+        self.keyed = True
+        if self.keyOut:
+            self.keyOut(True)
+        return out
+
+def keyPaddles(events, keyer):
+    """Return the code sequences for a list of `PaddleEvent`s, including the final character."""
+    out = []
+    for e in events:
+        out += keyer.paddles(e.time, e.dit, e.dah)
+    t = keyer.deadline()
+    while t is not None:
+        out += keyer.poll(t)
+        t = keyer.deadline()
+    return out
+
+class SerialPaddles:
+    """
+    Paddles on the DSR (dit) and CTS (dah) lines of a serial port (pyserial),
+    polled every POLL seconds. `port` is an open `serial.Serial` or the name
+    of a port.
+    """
+
+    def __init__(self, port=None, invert=None):
+        if port is None or isinstance(port, str):
+            import serial  # optional dependency
+            port = serial.Serial(port or config.serial_port)
+        self.port   = port
+        self.invert = config.invert_key_input if invert is None else invert
+        self.state  = self.read()
+
+    def read(self):
+        return (bool(self.port.dsr) != bool(self.invert), bool(self.port.cts) != bool(self.invert))
+
+    def wait(self, timeout):
+        """Return the next `PaddleEvent`, or None if nothing changed within `timeout` seconds."""
+        end = time.monotonic() + timeout
+        while True:
+            s = self.read()
+            t = time.monotonic()
+            if s != self.state:
+                self.state = s
+                return PaddleEvent(t, *s)
+            if t >= end:
+                return None
+            time.sleep(POLL)
+
+class ScriptedPaddles:
+    """Plays back `PaddleEvent`s (times relative to the first) in real time."""
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.next   = 0
+        self.offset = time.monotonic() - (self.events[0].time if self.events else 0.0)
+
+    def wait(self, timeout):
+        if self.next < len(self.events):
+            e = self.events[self.next]
+            delay = e.time + self.offset - time.monotonic()
+            if delay <= timeout:
+                if delay > 0:
+                    time.sleep(delay)
+                self.next += 1
+                return PaddleEvent(e.time + self.offset, e.dit, e.dah)
+        time.sleep(max(timeout, 0.0))
+        return None
+
+class KeyerThread:
+    """
+    Runs an `IambicKeyer` on a dedicated thread, reading paddles from
+    `source` and handing each code sequence to `send(code)`.
+
+    With `realtime` on, the thread asks for the SCHED_FIFO policy so other
+    processes cannot delay its edges; this needs the privilege to do so (e.g.
+    CAP_SYS_NICE on Linux) and is skipped quietly where it is not available.
+    """
+
+    def __init__(self, keyer, source, send, realtime=False):
+        self.keyer    = keyer
+        self.source   = source
+        self.send     = send
+        self.realtime = realtime
+        self.thread   = None
+        self.running  = False
+
+    def start(self):
+        self.running = True
+        self.thread = Thread(target=self.run, name="Keyer", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        if self.realtime:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(PRIORITY))
+            except (AttributeError, OSError):
+                pass
+        keyer = self.keyer
+        clock = time.monotonic
+        while self.running:
+            deadline = keyer.deadline()
+            now = clock()
+            if deadline is not None and deadline - now <= SPIN:
+                while clock() < deadline:  # spin for an accurate edge
+                    pass
+                out = keyer.poll(deadline)
+            else:
+                timeout = IDLEWAIT if deadline is None else min(IDLEWAIT, deadline - now - SPIN)
+                e = self.source.wait(timeout)
+                out = keyer.paddles(e.time, e.dit, e.dah) if e is not None else keyer.poll(clock())
+            for code in out:
+                self.send(code)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
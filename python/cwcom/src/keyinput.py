@@ -0,0 +1,283 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+keyinput.py
+
+Turns the state of a telegraph key into CWCom code sequences.
+
+A key source reports edges: the time (seconds) and whether the key is now
+closed. A `KeyEncoder` converts the edges into timing elements the way the
+KOB program does (see the README):
+
+- closing the key ends a space: (-space,) is added, in ms;
+- opening it ends a mark: (+mark,) is added;
+- a space longer than CODESPACE ends the character, and its code is sent;
+- a key held closed longer than CKTCLOSE latches the circuit: (+1,) is sent;
+- opening a latched key sends (-n, +2), n being how long it was closed.
+
+Edges closer than DEBOUNCE to the last accepted edge are contact bounce; the
+state the key settles in is taken when the debounce time is over.
+
+A `KeyReader` runs a source and an encoder on a dedicated thread and hands
+each code sequence to `send(code)`. Sources:
+
+    SerialKey   the DSR line of a serial port (the KOB interface; needs pyserial)
+    StreamKey   '1'/'0' bytes from a file descriptor, e.g. a pseudo-terminal
+    RecordedKey edges from a file (`readEdges`), played back in real time
+
+`encodeEdges` runs the encoder over recorded edges without a thread.
+"""
+
+import codecs
+import os
+import select
+import time
+from collections import namedtuple
+from threading import Thread
+
+from pykob import config, packet
+
+DEBOUNCE  = 0.015  # time to ignore transitions due to contact bounce (sec)
+CODESPACE = 0.120  # amount of space to signal end of code sequence (sec)
+CKTCLOSE  = 0.75   # length of mark to signal circuit closure (sec)
+IDLEWAIT  = 0.1    # longest wait for an edge when no timeout is pending (sec)
+POLL      = 0.001  # interval between reads of a polled input (sec)
+
+Edge = namedtuple("Edge", "time closed")
+
+class KeyEncoder:
+    def __init__(self, debounce=DEBOUNCE, codeSpace=CODESPACE, circuitClose=CKTCLOSE, start=0.0):
+        self.debounce     = debounce
+        self.codeSpace    = codeSpace
+        self.circuitClose = circuitClose
+        self.closed       = True   # debounced key state (an idle key is closed)
+        self.latched      = True   # True once the closed circuit has been signalled
+        self.lastTime     = start  # time of the last accepted edge
+        self.raw          = None   # Edge seen during the debounce time, to apply after it
+        self.code         = ()     # elements of the character being keyed
+
+    def edge(self, t, closed):
+        """Take a key edge at time `t`; return the code sequences completed."""
+        if t < self.lastTime + self.debounce:
+            self.raw = Edge(t, closed)  # settle when the debounce time is over
+            return []
+        self.raw = None
+        return self._accept(t, closed)
+
+    def poll(self, t):
+        """Apply the timeouts due at time `t`; return the code sequences completed."""
+        out = []
+        if self.raw is not None and t >= self.lastTime + self.debounce:
+            raw, self.raw = self.raw, None
+            out = self._accept(raw.time, raw.closed)
+        if not self.closed and self.code and t >= self.lastTime + self.codeSpace:
+            out.append(self.code)  # end of character
+            self.code = ()
+        elif self.closed and not self.latched and t >= self.lastTime + self.circuitClose:
+            out.append(self.code + (+1,))  # latch circuit closed
+            self.code = ()
+            self.latched = True
+        return out
+
+    def deadline(self):
+        """Return the time of the next timeout (or None)."""
+        if self.raw is not None:
+            return self.lastTime + self.debounce
+        if not self.closed and self.code:
+            return self.lastTime + self.codeSpace
+        if self.closed and not self.latched:
+            return self.lastTime + self.circuitClose
+        return None
+
+    def _accept(self, t, closed):
+        if closed == self.closed:
+            return []
+        dt = int((t - self.lastTime) * 1000)
+        self.lastTime = t
+        self.closed = closed
+        out = []
+        if closed:
+            self.code += (-dt,)
+        elif self.latched:
+            out.append(self.code + (-dt, +2))  # unlatch closed circuit
+            self.code = ()
+            self.latched = False
+        else:
+            self.code += (dt,)
+        if len(self.code) >= packet.SIZE_CODE - 1:
+            out.append(self.code)
+            self.code = ()
+        return out
+
+def encodeEdges(edges, encoder=None):
+    """Return the code sequences for a list of `Edge`s, including the final timeouts."""
+    encoder = encoder or KeyEncoder(start=edges[0].time if edges else 0.0)
+    out = []
+    for e in edges:
+        t = encoder.deadline()
+        while t is not None and t <= e.time:
+            out += encoder.poll(t)
+            t = encoder.deadline()
+        out += encoder.edge(e.time, e.closed)
+    t = encoder.deadline()
+    while t is not None:
+        out += encoder.poll(t)
+        t = encoder.deadline()
+    return out
+
+def readEdges(path):
+    """
+    Return the `Edge`s in file `path`: one `time<TAB>state` line per edge,
+    state 1 for closed and 0 for open. Lines starting with '#' are ignored.
+    """
+    edges = []
+    with codecs.open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            t, s = line.split()[:2]
+            edges.append(Edge(float(t), s.strip() == '1'))
+    return edges
+
+def writeEdges(path, edges):
+    with codecs.open(path, 'w', encoding='utf-8') as f:
+        for e in edges:
+            f.write("{:.6f}\t{}\n".format(e.time, 1 if e.closed else 0))
+
+class SerialKey:
+    """
+    The key on the DSR line of a serial port (pyserial), polled every POLL
+    seconds. `port` is an open `serial.Serial` or the name of a port.
+    """
+
+    def __init__(self, port=None, invert=None):
+        if port is None or isinstance(port, str):
+            import serial  # optional dependency
+            port = serial.Serial(port or config.serial_port)
+        self.port   = port
+        self.invert = config.invert_key_input if invert is None else invert
+        self.state  = self.read()
+
+    def read(self):
+        return bool(self.port.dsr) != bool(self.invert)
+
+    def wait(self, timeout):
+        """Return the next `Edge`, or None if the key did not change within `timeout` seconds."""
+        end = time.monotonic() + timeout
+        while True:
+            s = self.read()
+            t = time.monotonic()
+            if s != self.state:
+                self.state = s
+                return Edge(t, s)
+            if t >= end:
+                return None
+            time.sleep(POLL)
+
+    def close(self):
+        self.port.close()
+
+class StreamKey:
+    """
+    Key states as bytes from file descriptor `fd`: b'1' closed, b'0' open
+    (other bytes are ignored). Each byte is stamped with the time it is read.
+    """
+
+    def __init__(self, fd, invert=False):
+        self.fd      = fd
+        self.invert  = invert
+        self.pending = b''
+
+    def wait(self, timeout):
+        while not self.pending:
+            r, w, x = select.select([self.fd], [], [], max(timeout, 0))
+            if not r:
+                return None
+            data = os.read(self.fd, 256)
+            if not data:
+                return None
+            self.pending = bytes(b for b in data if b in b'01')
+        b, self.pending = self.pending[0], self.pending[1:]
+        return Edge(time.monotonic(), (b == ord('1')) != self.invert)
+
+    def close(self):
+        os.close(self.fd)
+
+class RecordedKey:
+    """Plays back `Edge`s (a list, or a file for `readEdges`) in real time."""
+
+    def __init__(self, edges):
+        self.edges  = readEdges(edges) if isinstance(edges, str) else list(edges)
+        self.next   = 0
+        self.offset = time.monotonic() - (self.edges[0].time if self.edges else 0.0)
+
+    def wait(self, timeout):
+        if self.next >= len(self.edges):
+            time.sleep(timeout)
+            return None
+        e = self.edges[self.next]
+        delay = e.time + self.offset - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return None
+        if delay > 0:
+            time.sleep(delay)
+        self.next += 1
+        return Edge(e.time + self.offset, e.closed)
+
+    def close(self):
+        pass
+
+class KeyReader:
+    """Reads a key source on a dedicated thread and sends its code sequences."""
+
+    def __init__(self, source, send, encoder=None):
+        self.source  = source
+        self.send    = send  # function called with each code sequence
+        self.encoder = encoder or KeyEncoder(start=time.monotonic())
+        self.thread  = None
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread = Thread(target=self.run, name="Key-Reader", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        encoder = self.encoder
+        while self.running:
+            deadline = encoder.deadline()
+            timeout = IDLEWAIT if deadline is None else min(IDLEWAIT, deadline - time.monotonic())
+            e = self.source.wait(max(timeout, 0.0))
+            out = encoder.edge(e.time, e.closed) if e is not None else []
+            out += encoder.poll(time.monotonic())
+            for code in out:
+                self.send(code)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,228 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+metrics.py
+
+Optional instrumentation of `Reader` and `Sender` objects.
+
+Instrumenting an object replaces its `decode`, `decodeChar`, `flush` (Reader)
+or `encode` (Sender) methods on that instance with timed wrappers, so objects
+that are not instrumented run the original code with no overhead at all:
+
+    m = metrics.Metrics()
+    reader = morse.Reader(callback=show)
+    metrics.instrumentReader(reader, m, wire=103, station="W1AW")
+    ...
+    print(m.prometheus())
+
+Calls are counted in latency histograms per wire and station; decoded and
+unrecognized ('[...]') characters are counted by wrapping the Reader callback.
+The number of live flusher threads is read when the metrics are exported.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+PREFIX = "cwcom_"
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+           0.0025, 0.005, 0.01, 0.025, 0.1)
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    """Counters and latency histograms keyed by name, wire and station."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, wire, station) -> value
+        self.histograms = {}  # (name, wire, station) -> Histogram
+
+    def inc(self, name, wire, station, n=1):
+        key = (name, wire, station)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, wire, station, seconds):
+        key = (name, wire, station)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.observe(seconds)
+
+    def timed(self, name, wire, station, fn):
+        """Return a wrapper of `fn` that records its run time in histogram `name`."""
+        observe = self.observe
+        clock = time.perf_counter
+        def wrapper(*args):
+            t = clock()
+            try:
+                return fn(*args)
+            finally:
+                observe(name, wire, station, clock() - t)
+        wrapper.__wrapped__ = fn
+        wrapper.instrumented = True  # installed by metrics (see `uninstrument`)
+        return wrapper
+
+    def snapshot(self):
+        """
+        Return the current values as a dictionary:
+            {"counters": {name: {(wire, station): value}},
+             "histograms": {name: {(wire, station): {"count", "sum", "buckets"}}},
+             "gauges": {name: value}}
+        """
+        with self.lock:
+            counters = {}
+            for (name, wire, station), v in self.counters.items():
+                counters.setdefault(name, {})[(wire, station)] = v
+            histograms = {}
+            for (name, wire, station), h in self.histograms.items():
+                histograms.setdefault(name, {})[(wire, station)] = {
+                        "count": h.count, "sum": h.sum,
+                        "buckets": dict(zip(h.bounds + (float('inf'),), h.counts))}
+        return {"counters": counters, "histograms": histograms,
+                "gauges": {"reader_flusher_threads": flusherThreads()}}
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+        for name, series in sorted(snap["counters"].items()):
+            lines.append("# TYPE {}{}_total counter".format(PREFIX, name))
+            for (wire, station), v in sorted(series.items(), key=str):
+                lines.append("{}{}_total{{{}}} {}".format(PREFIX, name, _labels(wire, station), v))
+        for name, series in sorted(snap["histograms"].items()):
+            metric = PREFIX + name + "_seconds"
+            lines.append("# TYPE {} histogram".format(metric))
+            for (wire, station), h in sorted(series.items(), key=str):
+                labels = _labels(wire, station)
+                cumulative = 0
+                for bound, n in h["buckets"].items():
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(metric, labels, le, cumulative))
+                lines.append("{}_sum{{{}}} {}".format(metric, labels, h["sum"]))
+                lines.append("{}_count{{{}}} {}".format(metric, labels, h["count"]))
+        for name, v in sorted(snap["gauges"].items()):
+            lines.append("# TYPE {}{} gauge".format(PREFIX, name))
+            lines.append("{}{} {}".format(PREFIX, name, v))
+        return '\n'.join(lines) + '\n'
+
+def _labels(wire, station):
+    station = str(station).replace('\\', '\\\\').replace('"', '\\"')
+    return 'wire="{}",station="{}"'.format(wire, station)
+
+def flusherThreads():
+    """Return the number of live Reader flusher threads."""
+    return sum(1 for t in threading.enumerate() if t.name == "Reader-Flusher")
+
+class CountingCallback:
+    """
+    Reader callback that counts the decoded and unrecognized characters and
+    passes them on. Any other attribute is the wrapped callback's, so the
+    callback protocols a Reader probes for (e.g. `flush`) still reach it.
+    """
+
+    def __init__(self, callback, metrics, wire, station):
+        self.__wrapped__ = callback
+        self.inc         = metrics.inc
+        self.wire        = wire
+        self.station     = station
+
+    def __call__(self, char, spacing):
+        if char[0] == '[':
+            self.inc("reader_unrecognized", self.wire, self.station)
+        else:
+            self.inc("reader_characters", self.wire, self.station)
+        self.__wrapped__(char, spacing)
+
+    def __getattr__(self, name):
+        if name == "__wrapped__":  # not set yet (e.g. while unpickling)
+            raise AttributeError(name)
+        return getattr(self.__wrapped__, name)
+
+def instrumentReader(reader, metrics, wire=0, station=''):
+    """Record `decode`, `decodeChar` and `flush` timing and the decoded characters of `reader`."""
+    reader.decode = metrics.timed("reader_decode", wire, station, reader.decode)
+    reader.decodeChar = metrics.timed("reader_decodechar", wire, station, reader.decodeChar)
+    reader.flush = metrics.timed("reader_flush", wire, station, reader.flush)
+    reader.callback = CountingCallback(reader.callback, metrics, wire, station)
+    return reader
+
+def instrumentSender(sender, metrics, wire=0, station=''):
+    """Record the `encode` timing of `sender`."""
+    sender.encode = metrics.timed("sender_encode", wire, station, sender.encode)
+    return sender
+
+def uninstrument(obj):
+    """
+    Remove the instrumentation from a Reader or Sender. Only the wrappers
+    installed by `instrumentReader` and `instrumentSender` are removed.
+    """
+    for name in ("decode", "decodeChar", "flush", "encode"):
+        fn = obj.__dict__.get(name)
+        if getattr(fn, "instrumented", False):
+            del obj.__dict__[name]
+            if getattr(obj, name) != fn.__wrapped__:  # it wrapped an attribute of the instance
+                setattr(obj, name, fn.__wrapped__)
+    callback = getattr(obj, "callback", None)
+    if isinstance(callback, CountingCallback):
+        obj.callback = callback.__wrapped__
+
+def serve(metrics, port=9108, host=''):
+    """
+    Serve `metrics.prometheus()` over HTTP on `port` from a daemon thread.
+    Return the server (call `shutdown()` to stop it).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="Metrics-Server", daemon=True)
+    thread.start()
+    return server
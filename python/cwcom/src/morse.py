@@ -29,10 +29,26 @@ Provides classes for sending and reading American and International Morse code.
 """
 
 import sys
-import codecs
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
 from threading import Timer
-from pykob import config, log
+from pykob import codetable, config, log
+
+try:
+    from pykob import _speedups  # optional compiled core (see build_speedups.py)
+except ImportError:
+    _speedups = None
+_compiled = _speedups
+
+def useSpeedups(on=True):
+    """
+    Use the compiled core of the Reader and Sender loops, if it has been built
+    (the default), or the Python code. Return whether the compiled core is used.
+    """
+    global _speedups
+    _speedups = _compiled if on else None
+    return _speedups is not None
 
 DOTSPERWORD = 45     # dot units per word, including all spaces
                      #   (MORSE is 43, PARIS is 47)
@@ -46,52 +62,69 @@ Code sender class
 root_folder = Path(__file__).parent
 data_folder = root_folder / "data"
 
-# read code tables
-encodeTable = [{}, {}]  # one dictionary each for American and International
+# code tables, by table id (`codetable.AMERICAN`, `codetable.INTERNATIONAL`, ...)
+encodeTable = codetable.registry.encodeTables  # character -> code
 
-def readEncodeTable(codeType, filename):
-    fn = data_folder / filename
-    # print("Load encode table: ", fn)
-    f = codecs.open(fn, encoding='utf-8')
-    cti = 0 if codeType == config.CodeType.american else 1
-    f.readline()  # ignore first line
-    for s in f:
-        a, t, c = s.rstrip().partition('\t')
-        encodeTable[cti][a] = c  # dictionary key is character
-    f.close()
+"""
+Timing profile of a code speed: the dot length and the spaces between
+characters and words (ms), including the Farnsworth stretch. Profiles are
+cached, so Senders and Readers changing speed only look one up.
+"""
+Timing = namedtuple("Timing", "dotLen charSpace wordSpace")
 
-readEncodeTable(config.CodeType.american, 'codetable-american.txt')
-readEncodeTable(config.code_type.international, 'codetable-international.txt')
+@lru_cache(maxsize=1024)
+def timing(wpm, cwpm=0, codeType=config.CodeType.american, spacing=config.Spacing.char):
+    if spacing == config.Spacing.none:
+        cwpm = wpm  # send characters at overall code speed
+    else:
+        cwpm = max(wpm, cwpm)  # send at Farnsworth speed
+    dotLen    = int(1200 / cwpm)  # dot length (ms)
+    charSpace = 3 * dotLen  # space between characters (ms)
+    wordSpace = 7 * dotLen  # space between words (ms)
+    if codetable.registry.table(codeType).codeType == config.CodeType.american:
+        charSpace += int((60000 / cwpm - dotLen * DOTSPERWORD) / 6)
+        wordSpace = 2 * charSpace
+    delta = 60000 / wpm - 60000 / cwpm  # amount to stretch each word
+    if spacing == config.Spacing.char:
+        charSpace += int(delta / 6)
+        wordSpace += int(delta / 3)
+    elif spacing == config.Spacing.word:
+        wordSpace += int(delta)
+    return Timing(dotLen, charSpace, wordSpace)
 
 class Sender:
+    """
+    `codeType` is a `config.CodeType` or the name (or id) of a table in
+    `codetable.registry`.
+    """
+
     def __init__(self, wpm, cwpm=0, codeType=config.CodeType.american, spacing=config.Spacing.char):
-        self.codeType = codeType
-        if spacing == config.Spacing.none:
-            cwpm = wpm  # send characters at overall code speed
-        else:
-            cwpm = max(wpm, cwpm)  # send at Farnsworth speed
-        self.dotLen    = int(1200 / cwpm)  # dot length (ms)
-        self.charSpace = 3 * self.dotLen  # space between characters (ms)
-        self.wordSpace = 7 * self.dotLen  # space between words (ms)
-        if codeType == config.CodeType.american:
-            self.charSpace += int((60000 / cwpm - self.dotLen *
-                    DOTSPERWORD) / 6)
-            self.wordSpace = 2 * self.charSpace
-        delta = 60000 / wpm - 60000 / cwpm  # amount to stretch each word
-        if spacing == config.Spacing.char:
-            self.charSpace += int(delta / 6)
-            self.wordSpace += int(delta / 3)
-        elif spacing == config.Spacing.word:
-            self.wordSpace += int(delta)
+        self.table    = codetable.registry.table(codeType)
+        self.codeType = self.table.codeType
+        self.spacing  = spacing
+        self.setSpeed(wpm, cwpm)
         self.space = self.wordSpace  # delay before next code element (ms)
-        
+
+    @classmethod
+    def fromConfig(cls, cfg=None):
+        """A Sender with the speeds, code type and spacing of a `config.ConfigSnapshot` (default: the current one)."""
+        cfg = cfg or config.snapshot()
+        return cls(cfg.text_speed, cfg.min_char_speed, cfg.code_type, cfg.spacing)
+
+    def setSpeed(self, wpm, cwpm=0):
+        """Change the code speed; the space pending before the next element is kept."""
+        self.timing    = timing(wpm, cwpm, self.codeType, self.spacing)
+        self.dotLen    = self.timing.dotLen     # dot length (ms)
+        self.charSpace = self.timing.charSpace  # space between characters (ms)
+        self.wordSpace = self.timing.wordSpace  # space between words (ms)
+
     def encode(self, char, printChar=False):
         c = char.upper()
         if (printChar):
             print(c, end="", flush=True)
         code = ()
-        cti = 0 if self.codeType == config.CodeType.american else 1
-        if not c in encodeTable[cti]:
+        table = self.table.encode
+        if not c in table:
             if c == '-' or c == '\'' or c == 'curly apostrophe':  # Linux
                         # doesn't recognize the UTF-8 encoding of this file
                 self.space += int((self.wordSpace - self.charSpace) / 2)
@@ -106,23 +139,30 @@ class Sender:
             else:
                 self.space += self.wordSpace - self.charSpace
         else:
-            for e in encodeTable[cti][c]:
-                if e == ' ':
-                    self.space = 3 * self.dotLen
-                else:
-                    code += (-self.space,)
-                    if e == '.':
-                        code += (self.dotLen,)
-                    elif e == '-':
-                        code += (3 * self.dotLen,)
-                    elif e == '=':
-                        code += (6 * self.dotLen,)
-                    elif e == '#':
-                        code += (9 * self.dotLen,)
-                    self.space = self.dotLen
+            encodeCode = _speedups.encodeCode if _speedups is not None else _encodeCode
+            code = encodeCode(table[c], self.space, self.dotLen)
             self.space = self.charSpace
         return code
 
+def _encodeCode(elements, space, dotLen):
+    """The code elements of a character from its table entry, after `space` ms."""
+    code = ()
+    for e in elements:
+        if e == ' ':
+            space = 3 * dotLen
+        else:
+            code += (-space,)
+            if e == '.':
+                code += (dotLen,)
+            elif e == '-':
+                code += (3 * dotLen,)
+            elif e == '=':
+                code += (6 * dotLen,)
+            elif e == '#':
+                code += (9 * dotLen,)
+            space = dotLen
+    return code
+
 
 """
 Code reader class
@@ -131,6 +171,9 @@ Callback function is called whenever a character is decoded:
     def callback(char, spacing)
         char - decoded character
         spacing - spacing adjustment in space widths (can be negative)
+
+If the callback has a `flush` method (e.g. a `TextBatcher`), the Reader calls
+it from its own `flush`, i.e. when the code stops.
 """
 
 MINDASHLEN      = 1.5  # dot vs dash threshold (in dots)
@@ -141,19 +184,20 @@ MINCHARSPACE    = 2.7  # intrasymbol space vs character space (in dots)
 MINLLEN         = 5.0  # minimum length of L character (in dots)
 MORSERATIO      = 0.95 # length of Morse space relative to surrounding spaces
 ALPHA           = 0.5  # weight given to wpm update values (for smoothing)
+WORDSPACING     = 0.75 # callback spacing (in space widths) that separates words
+
+"""
+Decoding thresholds used by a Reader. The defaults are the module constants
+above; pass a modified copy (e.g. `DEFAULT_PARAMS._replace(minDashLen=1.7)`)
+to tune a Reader for a particular fist.
+"""
+ReaderParams = namedtuple("ReaderParams", "minDashLen maxDashLen minMorseSpace "
+        "maxMorseSpace minCharSpace minLLen morseRatio alpha",
+        defaults=(MINDASHLEN, MAXDASHLEN, MINMORSESPACE, MAXMORSESPACE,
+                  MINCHARSPACE, MINLLEN, MORSERATIO, ALPHA))
+DEFAULT_PARAMS = ReaderParams()
 
-# read code tables
-decodeTable = [{}, {}]  # one dictionary each for American and International
-def readDecodeTable(codeType, filename):
-    fn = data_folder / filename
-    f = codecs.open(fn, encoding='utf-8')
-    f.readline()  # ignore first line
-    for s in f:
-        a, t, c = s.rstrip().partition('\t')
-        decodeTable[codeType][c] = a  # dictionary key is code
-    f.close()
-readDecodeTable(0, 'codetable-american.txt') # American code table is at 0 index
-readDecodeTable(1, 'codetable-international.txt') # International code table is at 1 index
+decodeTable = codetable.registry.decodeTables  # code -> character, by table id
 
 class Reader:
     """
@@ -162,18 +206,28 @@ class Reader:
     halves of a single spaced character. The two characters are kept in a buffer which (clumsily)
     is represented as three lists: codeBuf, spaceBuf, and markBuf (see details in the
     `__init__` definition below).
+
+    `codeType` is a `config.CodeType` or the name (or id) of a table in
+    `codetable.registry`; `setCodeTable` switches tables. With `flushTimer` off
+    no flusher thread is started and `flush` must be called by the owner when
+    the code stops (e.g. when decoding a recording or from a relay's sweep).
     """
     
-    def __init__(self, wpm=20, cwpm=0, codeType=config.CodeType.american, callback=None):
-        self.codeType  = codeType     # American or International
+    def __init__(self, wpm=20, cwpm=0, codeType=config.CodeType.american, callback=None,
+            params=DEFAULT_PARAMS, flushTimer=True):
+        self.table     = codetable.registry.table(codeType)  # code table to decode with
+        self.codeType  = self.table.codeType  # American or International (decoding rules)
+        self.tableId   = self.table.id
+        self.params    = params       # decoding thresholds (ReaderParams)
         self.wpm       = max(wpm, cwpm)  # configured code speed
-        self.dotLen    = int(1200.0 / self.wpm)  # nominal dot length (ms)
+        self.dotLen    = timing(self.wpm).dotLen  # nominal dot length (ms)
         self.truDot    = self.dotLen  # actual length of typical dot (ms)
         self.codeBuf   = ['', '']     # code elements for two characters
         self.spaceBuf  = [0, 0]       # space before each character
         self.markBuf   = [0, 0]       # length of last dot or dash in character
         self.nChars    = 0            # number of complete characters in buffer
         self.callback  = callback     # function to call when character decoded
+        self.flushTimer = flushTimer  # start a flusher after each packet
         self.flusher   = None         # holds Timer (thread) to call flush if no code received
         self.latched   = False        # True if cicuit has been latched closed by a +1 code element
         self.mark      = 0            # accumulates the length of a mark as positive code elements are received
@@ -183,12 +237,25 @@ class Reader:
         self.d_dotLen = self.dotLen
         self.d_truDot = self.truDot
 
+    @classmethod
+    def fromConfig(cls, cfg=None, callback=None, params=DEFAULT_PARAMS, flushTimer=True):
+        """A Reader with the speeds and code type of a `config.ConfigSnapshot` (default: the current one)."""
+        cfg = cfg or config.snapshot()
+        return cls(cfg.text_speed, cfg.min_char_speed, cfg.code_type, callback, params, flushTimer)
+
     def decode(self, codeSeq):
         # Code received - cancel an existing 'flusher'
         if self.flusher:
             self.flusher.cancel()
             self.flusher = None
         self.updateDWPM(codeSeq)  # Update the 'detected' WPM
+        if _speedups is None or _speedups.decodeElements(self, codeSeq) is NotImplemented:
+            self.decodeElements(codeSeq)
+        if self.flushTimer:
+            self.startFlusher()
+
+    def decodeElements(self, codeSeq):
+        p = self.params
         nextSpace = 0  # space before next dot or dash
         i = 0
         for i in range(0, len(codeSeq)):
@@ -200,7 +267,7 @@ class Reader:
                 elif self.space > 0:  # continuation of space
                     self.space += c
                 else:  # end of mark
-                    if self.mark > MINDASHLEN * self.truDot:
+                    if self.mark > p.minDashLen * self.truDot:
                         self.codeBuf[self.nChars] += '-'  # dash
                     else:
                         self.codeBuf[self.nChars] += '.'  # dot
@@ -210,7 +277,7 @@ class Reader:
             elif c == 1:  # start (or continuation) of extended mark
                 self.latched = True
                 if self.space > 0:  # start of mark
-                    if self.space > MINMORSESPACE * self.dotLen:  # possible Morse or word space
+                    if self.space > p.minMorseSpace * self.dotLen:  # possible Morse or word space
                         self.decodeChar(self.space)
                     self.mark = 0
                     self.space = 0
@@ -221,22 +288,34 @@ class Reader:
             elif c > 2:  # mark
                 self.latched = False
                 if self.space > 0:  # start of new mark
-                    if self.space > MINMORSESPACE * self.dotLen:  # possible Morse or word space
+                    if self.space > p.minMorseSpace * self.dotLen:  # possible Morse or word space
                         self.decodeChar(self.space)
                     self.mark = c
                     self.space = 0
                 elif self.mark > 0:  # continuation of mark
                     self.mark += c
+
+    def startFlusher(self):
+        """Start a Timer (thread) that calls `flush` if no more code is received."""
         self.flusher = Timer(((20.0 * self.truDot) / 1000.0), self.flush)  # if idle call `flush`
         self.flusher.setName("Reader-Flusher")
         self.flusher.start()
 
+    def setCodeTable(self, codeType):
+        """Decode the following code with another table (see `codetable.registry`)."""
+        self.table    = codetable.registry.table(codeType)
+        self.codeType = self.table.codeType
+        self.tableId  = self.table.id
+
     def setWPM(self, wpm):
         self.wpm = wpm
-        self.dotLen = int(1200. / wpm)
+        self.dotLen = timing(wpm).dotLen
         self.truDot = self.dotLen
 
     def updateDWPM(self, codeSeq):
+        if _speedups is not None and _speedups.updateDWPM(self, codeSeq) is not NotImplemented:
+            return
+        alpha = self.params.alpha
         for i in range(1, len(codeSeq) - 2, 2):
             minDotLen = int(0.5 * self.d_dotLen)
             maxDotLen = int(1.5 * self.d_dotLen)
@@ -244,8 +323,8 @@ class Reader:
                     codeSeq[i] - codeSeq[i+1] < 2 * maxDotLen and \
                     codeSeq[i+2] < maxDotLen:
                 dotLen = (codeSeq[i] - codeSeq[i+1]) / 2
-                self.d_truDot = int(ALPHA * codeSeq[i] + (1 - ALPHA) * self.d_truDot)
-                self.d_dotLen = int(ALPHA * dotLen + (1 - ALPHA) * self.d_dotLen)
+                self.d_truDot = int(alpha * codeSeq[i] + (1 - alpha) * self.d_truDot)
+                self.d_dotLen = int(alpha * dotLen + (1 - alpha) * self.d_dotLen)
                 self.d_wpm = 1200. / self.d_dotLen
 
     def flush(self):
@@ -254,7 +333,7 @@ class Reader:
             self.flusher = None
         if self.mark > 0 or self.latched:
             spacing = self.spaceBuf[self.nChars]
-            if self.mark > MINDASHLEN * self.truDot:
+            if self.mark > self.params.minDashLen * self.truDot:
                 self.codeBuf[self.nChars] += '-'  # dash
             elif self.mark > 2:
                 self.codeBuf[self.nChars] += '.'  # dot
@@ -269,16 +348,20 @@ class Reader:
             self.nChars = 0
             if self.latched:
                 self.callback('_', float(spacing) / (3 * self.truDot) - 1)
+        flush = getattr(self.callback, "flush", None)
+        if flush is not None:
+            flush()
 
     def decodeChar(self, nextSpace):
+        p = self.params
         self.nChars += 1  # number of complete characters in buffer (1 or 2)
         sp1 = self.spaceBuf[0]  # space before 1st character
         sp2 = self.spaceBuf[1]  # space before 2nd character
         sp3 = nextSpace  # space before next character
         code = ''  # the dots and dashes
         s = ''  # the decoded character or pair of characters
-        if self.nChars == 2 and sp2 < MAXMORSESPACE * self.dotLen and \
-                MORSERATIO * sp1 > sp2 and sp2 < MORSERATIO * sp3:  # could be two halves of a spaced character
+        if self.nChars == 2 and sp2 < p.maxMorseSpace * self.dotLen and \
+                p.morseRatio * sp1 > sp2 and sp2 < p.morseRatio * sp3:  # could be two halves of a spaced character
             code = self.codeBuf[0] + ' ' + self.codeBuf[1]  # try combining the two halves
             s = self.lookupChar(code)
             if s != '' and s != '&':  # yes, it's a spaced character, clear the whole buffer
@@ -291,7 +374,7 @@ class Reader:
             else:  # it's not recognized as a spaced character,
                 code = ''
                 s = ''
-        if self.nChars == 2 and sp2 < MINCHARSPACE * self.dotLen:  # it's a single character, merge the two halves
+        if self.nChars == 2 and sp2 < p.minCharSpace * self.dotLen:  # it's a single character, merge the two halves
             self.codeBuf[0] += self.codeBuf[1]
             self.markBuf[0] = self.markBuf[1]
             self.codeBuf[1] = ''
@@ -301,9 +384,9 @@ class Reader:
         if self.nChars == 2:  # decode the first character, otherwise wait for the next one to arrive
             code = self.codeBuf[0]
             s = self.lookupChar(code)
-            if s == 'T' and self.markBuf[0] > MAXDASHLEN * self.dotLen:
+            if s == 'T' and self.markBuf[0] > p.maxDashLen * self.dotLen:
                 s = '_'
-            elif s == 'T' and self.markBuf[0] > MINLLEN * self.dotLen and \
+            elif s == 'T' and self.markBuf[0] > p.minLLen * self.dotLen and \
                     self.codeType == config.CodeType.american:
                 s = 'L'
             elif s == 'E':
@@ -326,14 +409,51 @@ class Reader:
             self.callback(s, float(sp1) / (3 * self.truDot) - 1)
 
     def lookupChar(self, code):
-        codeTableIndex = 0 if self.codeType == config.CodeType.american else 1
-        if code in decodeTable[codeTableIndex]:
-            return(decodeTable[codeTableIndex][code])
-        else:
-            return('')
+        return codetable.registry.lookup(code, self.tableId)
 
     def displayBuffers(self, text):
         """Display the code buffer and other information for troubleshooting"""
         log.debug("{}: nChars = {}".format(text, self.nChars))
         for i in range(2):
             print("{} '{}' {}".format(self.spaceBuf[i], self.codeBuf[i], self.markBuf[i]))
+
+class TextBatcher:
+    """
+    Reader callback that delivers the decoded text a word or a line at a time,
+    with the spacing resolved: `deliver(text)` is called once per word, or,
+    if `lineLength` is given, once per line of words separated by single
+    spaces and at most `lineLength` characters long (a longer word makes a
+    line of its own). The text in progress is delivered by `flush`, which the
+    Reader calls when the code stops.
+    """
+
+    def __init__(self, deliver, lineLength=None):
+        self.deliver    = deliver
+        self.lineLength = lineLength
+        self.word       = []  # characters of the word in progress
+        self.line       = ''  # words of the line in progress (lineLength only)
+
+    def __call__(self, char, spacing):
+        if spacing >= WORDSPACING and self.word:
+            self.endWord()
+        self.word.append(char)
+
+    def endWord(self):
+        word = ''.join(self.word)
+        self.word = []
+        if self.lineLength is None:
+            self.deliver(word)
+        elif not self.line:
+            self.line = word
+        elif len(self.line) + 1 + len(word) <= self.lineLength:
+            self.line += ' ' + word
+        else:
+            self.deliver(self.line)
+            self.line = word
+
+    def flush(self):
+        if self.word:
+            self.endWord()
+        if self.line:
+            self.deliver(self.line)
+            self.line = ''
@@ -0,0 +1,130 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+packet.py
+
+Packs and unpacks CWCom packets. The layouts match `struct command_packet_format`
+and `struct data_packet_format` in `c/cwprotocol.h` (little-endian, no padding).
+"""
+
+import struct
+from collections import namedtuple
+
+INTERFACE_VERSION = "irmc v0.3.3"
+
+DIS = 0x0002  # disconnect
+DAT = 0x0003  # code or id
+CON = 0x0004  # connect
+ACK = 0x0005  # acknowledge
+
+SIZE_COMMAND_PACKET      = 4
+SIZE_DATA_PACKET         = 496
+SIZE_DATA_PACKET_PAYLOAD = 492  # SIZE_DATA_PACKET - SIZE_COMMAND_PACKET
+SIZE_ID                  = 128
+SIZE_STATUS              = 128
+SIZE_CODE                = 51
+
+DEFAULT_CHANNEL = 103
+
+commandPacketFormat = struct.Struct("<HH")  # command, channel
+dataPacketFormat    = struct.Struct("<HH128s4sIIII51iI128s8s")  # command, length, id, a1,
+                                # sequence, a21, a22, a23, code, n, status, a4
+
+# Offsets of fields in a DAT packet, for reading them without unpacking the packet
+SEQUENCE_OFFSET = 136
+CODE_OFFSET     = 152
+COUNT_OFFSET    = 356  # n, the number of code elements
+
+_int = struct.Struct("<i")
+_pair = struct.Struct("<ii")
+
+# Magic numbers (a21, a22, a23) provided by Les Kerr
+ID_MAGIC   = (1, 755, 65535)
+CODE_MAGIC = (0, 755, 16777215)
+
+DataPacket = namedtuple("DataPacket", "id sequence code status")
+
+_zeros = (0,) * SIZE_CODE
+_a1 = bytes(4)
+_a4 = bytes(8)
+
+def _str(b):
+    return b.split(b'\0', 1)[0].decode('utf-8', 'replace')
+
+def packCommand(command, channel=0):
+    """Return a CON or DIS packet."""
+    return commandPacketFormat.pack(command, channel)
+
+def unpackCommand(buf, offset=0):
+    """Return (command, channel) from a command packet."""
+    return commandPacketFormat.unpack_from(buf, offset)
+
+def packData(id, sequence, code=(), status="?", magic=CODE_MAGIC):
+    """
+    Return a DAT packet carrying the code elements `code`.
+
+    Raises ValueError if there are more than SIZE_CODE elements.
+    """
+    n = len(code)
+    if n > SIZE_CODE:
+        raise ValueError("Code sequence has {} elements, the maximum is {}.".format(n, SIZE_CODE))
+    return dataPacketFormat.pack(DAT, SIZE_DATA_PACKET_PAYLOAD,
+            id.encode('utf-8'), _a1, sequence, magic[0], magic[1], magic[2],
+            *tuple(code), *_zeros[n:], n, status.encode('utf-8'), _a4)
+
+def packDataInto(buf, offset, id, sequence, code=(), status="?", magic=CODE_MAGIC):
+    """Pack a DAT packet into the writable buffer `buf` at `offset`."""
+    n = len(code)
+    if n > SIZE_CODE:
+        raise ValueError("Code sequence has {} elements, the maximum is {}.".format(n, SIZE_CODE))
+    dataPacketFormat.pack_into(buf, offset, DAT, SIZE_DATA_PACKET_PAYLOAD,
+            id.encode('utf-8'), _a1, sequence, magic[0], magic[1], magic[2],
+            *tuple(code), *_zeros[n:], n, status.encode('utf-8'), _a4)
+
+def packId(id, sequence, version=INTERFACE_VERSION):
+    """Return the DAT packet that identifies a station after connecting."""
+    return packData(id, sequence, (), version, ID_MAGIC)
+
+def unpackData(buf, offset=0):
+    """
+    Return a `DataPacket` from a DAT packet in `buf` (any bytes-like object).
+
+    Only the first `n` code elements are returned.
+    """
+    f = dataPacketFormat.unpack_from(buf, offset)
+    n = min(f[59], SIZE_CODE)
+    return DataPacket(_str(f[2]), f[4], f[8:8 + n], _str(f[60]))
+
+def codeTail(buf, offset=0):
+    """
+    Return the last two code elements of the DAT packet in `buf` (fewer if
+    the packet has fewer), without unpacking the rest of the packet.
+    """
+    n = min(_int.unpack_from(buf, offset + COUNT_OFFSET)[0], SIZE_CODE)
+    if n >= 2:
+        return _pair.unpack_from(buf, offset + CODE_OFFSET + 4 * (n - 2))
+    if n == 1:
+        return _int.unpack_from(buf, offset + CODE_OFFSET)
+    return ()
@@ -0,0 +1,94 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+recording.py
+
+Reads and writes recorded code streams.
+
+A recording is a text file with one packet per line:
+
+    time<TAB>station<TAB>code,code,...
+
+where `time` is the arrival time in seconds and `code` are the timing elements
+of the packet as in the README, e.g.
+
+    12.345	W1AW	-160,51,-47,47,-51,47
+
+The time and station columns are optional: a line holding only the code
+elements is read as time 0.0 and station ''. Blank lines and lines starting
+with '#' are ignored.
+
+A labeled recording also carries the text that was sent, in comment lines:
+
+    # text: QST DE W1AW
+"""
+
+import codecs
+from collections import namedtuple
+
+Record = namedtuple("Record", "time station code")
+
+LABEL_PREFIX = "# text:"
+
+def parseLine(line):
+    """Return the `Record` for one line of a recording, or None for a comment."""
+    line = line.rstrip('\r\n')
+    if not line.strip() or line.startswith('#'):
+        return None
+    fields = line.split('\t')
+    code = tuple(int(e) for e in fields[-1].split(',') if e.strip())
+    t = float(fields[0]) if len(fields) > 2 else 0.0
+    station = fields[-2] if len(fields) > 1 else ''
+    return Record(t, station, code)
+
+def readRecording(path):
+    """Generate the `Record`s of the recording in file `path`."""
+    with codecs.open(path, encoding='utf-8') as f:
+        for line in f:
+            r = parseLine(line)
+            if r is not None:
+                yield r
+
+def readLabel(path):
+    """Return the text of the '# text:' lines of a recording (or None if there are none)."""
+    lines = []
+    with codecs.open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(LABEL_PREFIX):
+                lines.append(line[len(LABEL_PREFIX):].strip())
+    return ' '.join(lines) if lines else None
+
+def formatRecord(t, station, code):
+    """Return the line (without newline) for one packet."""
+    return "{:.3f}\t{}\t{}".format(t, station, ','.join(str(e) for e in code))
+
+def writeRecording(path, records, label=None):
+    """Write `(time, station, code)` tuples to the file `path`, optionally labeled with the text sent."""
+    with codecs.open(path, 'w', encoding='utf-8') as f:
+        if label is not None:
+            f.write("{} {}\n".format(LABEL_PREFIX, label))
+        for r in records:
+            f.write(formatRecord(*r))
+            f.write('\n')
@@ -0,0 +1,357 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+relay.py
+
+A CWCom relay (server) with the wires partitioned across worker processes.
+
+Stations connect to a wire with a CON packet (repeated as a keep-alive),
+identify themselves with an ID packet, and send DAT packets which the relay
+forwards to every other station on the same wire.
+
+The dispatcher (the process that calls `serve`) owns the UDP socket. It reads
+packets in batches, looks up the wire of the sending station (learned from its
+CON packets) and hands the packets to the worker that owns the wire
+(`shardOf`). A worker keeps all the state of its wires: the stations (in a
+bounded `SessionRegistry`), their sequence trackers, which also drop repeated
+latch packets, optional `Reader`s, and does the fan-out itself on an inherited
+copy of the relay socket, so forwarded traffic still comes from the relay's
+address. The Readers start no flusher threads: the worker flushes a station's
+Reader once it has been idle for IDLEDOTS dots, or when it is evicted. Packets reach the workers through a pipe (`PipeTransport`) or a
+shared-memory ring (`RingTransport`); the ring needs x86 store ordering, and
+elsewhere the relay uses pipes even when it is asked for the ring.
+
+SO_REUSEPORT is not used to spread the load because the kernel balances on
+the sender's address, not on the wire, so every worker would see every wire.
+"""
+
+import multiprocessing
+import os
+import pickle
+import selectors
+import socket
+import struct
+import time
+
+from pykob import batchio, circuit, codedetect, morse, packet, ringbuffer, sequence, sessions
+
+PORT            = 7890  # default relay port
+STATIONTIMEOUT  = 60.0  # seconds without a CON or DAT packet before a station is dropped
+SWEEPINTERVAL   = 5.0   # seconds between sweeps for timed-out stations
+FLUSHINTERVAL   = 0.25  # seconds between checks for idle Readers to flush
+IDLEDOTS        = 20    # dots without code after which a station's Reader is flushed (as its flusher)
+
+_sequence = struct.Struct("<I")
+
+def shardOf(wire, shards):
+    """Return the worker (0..shards-1) that owns `wire`."""
+    return wire % shards
+
+class PipeTransport:
+    """Carries batches of (address, packet) from the dispatcher to one worker."""
+
+    def __init__(self):
+        self.reader, self.writer = multiprocessing.Pipe(duplex=False)
+
+    def attach(self):
+        """Called in the worker process before the first `get`."""
+        self.writer.close()  # so `get` sees EOF once the dispatcher closes its end
+
+    def put(self, batch):
+        batch = [(addr, bytes(data)) for addr, data in batch]
+        self.writer.send_bytes(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+
+    def get(self, timeout=None):
+        """
+        Return the next batch, [] if none arrived within `timeout` seconds, or
+        None when the dispatcher has closed the transport.
+        """
+        try:
+            if timeout is not None and not self.reader.poll(timeout):
+                return []
+            return pickle.loads(self.reader.recv_bytes())
+        except EOFError:
+            return None
+
+    def close(self):
+        self.writer.close()
+
+    def dispose(self):
+        self.reader.close()
+
+class RingTransport:
+    """
+    Carries packets from the dispatcher to one worker through a shared-memory
+    `RingBuffer`: each packet is copied once into the ring and the worker
+    reads it in place, with no pickling. Packets that find the ring full are
+    dropped (and counted), as the kernel would drop them from a full socket.
+    """
+
+    def __init__(self, capacity=4096):
+        self.ring = ringbuffer.RingBuffer(capacity=capacity)
+        self.dropped = 0
+
+    def attach(self):
+        pass
+
+    def put(self, batch):
+        n = self.ring.putMany(batch)
+        self.dropped += len(batch) - n
+
+    def get(self, timeout=None):
+        return self.ring.get(timeout)
+
+    def close(self):
+        self.ring.finish()
+
+    def dispose(self):
+        self.ring.close()
+
+class WireWorker:
+    """
+    The state and fan-out of the wires owned by one worker.
+
+    `decoder(wire, station)` (optional, picklable) returns a Reader callback;
+    when it is given, each station's code is also decoded.
+
+    With `closedCircuit` on, each wire's `Circuit` is followed and the code
+    of a station that has been broken is not forwarded (or decoded) until it
+    closes its key.
+
+    With `autoDetect` on, each station's Reader is switched between American
+    and International code by a `CodeDetector`.
+    """
+
+    def __init__(self, sock, decoder=None, wpm=20, closedCircuit=False, autoDetect=False):
+        self.io       = batchio.openBatchIO(sock)
+        self.decoder  = decoder
+        self.wpm      = wpm
+        self.autoDetect = autoDetect
+        self.stations = sessions.SessionRegistry(ttl=STATIONTIMEOUT, onEvict=self.evicted)  # by address
+        self.wires    = {}  # wire -> list of station addresses
+        self.circuits = {} if closedCircuit else None  # wire -> Circuit
+        self.unflushed = {}  # address -> (station, time of its last packet), decoded since a flush
+        self.lastSweep = time.monotonic()
+        self.lastFlush = self.lastSweep
+        self.forwarded = 0  # packets sent
+
+    def join(self, addr, wire, now):
+        station = self.stations.touch(addr, now)
+        if station is not None and station.wire == wire:
+            return
+        if station is not None:
+            self.leave(addr)
+        self.stations.add(addr, wire, now)
+        self.wires.setdefault(wire, []).append(addr)
+
+    def leave(self, addr):
+        station = self.stations.remove(addr)
+        if station is not None:
+            self.evicted(station)
+
+    def evicted(self, station):
+        self.unflushed.pop(station.key, None)  # flushed by the registry
+        members = self.wires[station.wire]
+        members.remove(station.key)
+        if not members:
+            del self.wires[station.wire]
+        if self.circuits is not None:
+            c = self.circuits.get(station.wire)
+            if c is not None:
+                c.close(station.key)
+                if not members:
+                    del self.circuits[station.wire]
+
+    def handle(self, addr, data, now):
+        if len(data) == packet.SIZE_COMMAND_PACKET:
+            command, wire = packet.unpackCommand(data)
+            if command == packet.CON:
+                self.join(addr, wire, now)
+            elif command == packet.DIS:
+                self.leave(addr)
+            return
+        if len(data) != packet.SIZE_DATA_PACKET:
+            return
+        station = self.stations.touch(addr, now)
+        if station is None:
+            return
+        tracker = station.sequence
+        if tracker is None:
+            tracker = station.sequence = sequence.SequenceTracker(station.reader)
+        if tracker.update(_sequence.unpack_from(data, packet.SEQUENCE_OFFSET)[0]) == sequence.DUPLICATE:
+            return  # e.g. a repeated latch/unlatch packet
+        if self.circuits is not None:
+            c = self.circuits.get(station.wire)
+            if c is None:
+                c = self.circuits[station.wire] = circuit.Circuit(station.wire)
+            if not c.update(addr, packet.codeTail(data), now):
+                return  # a broken station, not heard on the wire
+        members = self.wires[station.wire]
+        if len(members) > 1:
+            self.io.fanout(data, members, addr)
+            self.forwarded += len(members) - 1
+        if self.decoder is not None:
+            self.decode(station, data, now)
+
+    def decode(self, station, data, now):
+        p = packet.unpackData(data)
+        if not p.code:
+            self.stations.setId(station, p.id)
+            return
+        if station.reader is None:
+            reader = morse.Reader(self.wpm, callback=self.decoder(station.wire, p.id), flushTimer=False)
+            station.reader = codedetect.CodeDetector(reader) if self.autoDetect else reader
+            station.sequence.reader = station.reader  # flushed when packets are lost
+        station.reader.decode(p.code)
+        self.unflushed[station.key] = (station, now)
+
+    def lossStats(self):
+        """Return the `LossStats` of each station, by address."""
+        return {s.key: s.sequence.stats() for s in self.stations if s.sequence is not None}
+
+    def flushIdle(self, now):
+        """Flush the Readers of the stations idle for IDLEDOTS dots."""
+        for addr, (station, last) in list(self.unflushed.items()):
+            reader = station.reader.reader if self.autoDetect else station.reader
+            if now - last > IDLEDOTS * reader.truDot / 1000.0:
+                del self.unflushed[addr]
+                station.reader.flush()
+
+    def sweep(self, now):
+        if self.unflushed and now - self.lastFlush >= FLUSHINTERVAL:
+            self.lastFlush = now
+            self.flushIdle(now)
+        if now - self.lastSweep < SWEEPINTERVAL:
+            return
+        self.lastSweep = now
+        self.stations.expire(now)
+        if self.circuits is not None:
+            for c in self.circuits.values():
+                c.expire(now)
+
+def _work(sock, transport, decoder, wpm, closedCircuit, autoDetect):
+    transport.attach()
+    worker = WireWorker(sock, decoder, wpm, closedCircuit, autoDetect)
+    while True:
+        batch = transport.get(FLUSHINTERVAL if worker.unflushed else SWEEPINTERVAL)
+        if batch is None:
+            break
+        now = time.monotonic()
+        for addr, data in batch:
+            worker.handle(addr, data, now)
+        worker.sweep(now)
+
+class ShardedRelay:
+    """
+    A relay serving `port` with `workers` worker processes (default: one per
+    core). `transport` creates the dispatcher-to-worker channel;
+    `closedCircuit` turns on break handling and `autoDetect` the detection of
+    each station's code type in the workers (see `WireWorker`).
+    """
+
+    def __init__(self, host='', port=PORT, workers=None, decoder=None, wpm=20,
+            transport=PipeTransport, closedCircuit=False, autoDetect=False):
+        self.workers = workers or os.cpu_count() or 1
+        if transport is RingTransport and not ringbuffer.ORDERED:
+            transport = PipeTransport  # see `ringbuffer.ORDERED`
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.io = batchio.openBatchIO(self.sock)
+        self.transports = [transport() for i in range(self.workers)]
+        self.processes = [multiprocessing.Process(target=_work, name="Relay-Worker-{}".format(i),
+                args=(self.sock, t, decoder, wpm, closedCircuit, autoDetect), daemon=True)
+                for i, t in enumerate(self.transports)]
+        self.connected = sessions.SessionRegistry(ttl=STATIONTIMEOUT)  # by address, for the wire
+        self.lastSweep = time.monotonic()
+        self.running = False
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+        self.running = True
+
+    def dispatch(self, received):
+        """Route a batch of received (packet, address) tuples to the workers."""
+        batches = [[] for i in range(self.workers)]
+        now = time.monotonic()
+        for data, addr in received:
+            if len(data) == packet.SIZE_COMMAND_PACKET:
+                command, wire = packet.unpackCommand(data)
+                if command == packet.CON:
+                    old = self.connected.touch(addr, now)
+                    if old is None or old.wire != wire:
+                        if old is not None:
+                            batches[shardOf(old.wire, self.workers)].append(
+                                    (addr, packet.packCommand(packet.DIS)))
+                        self.connected.add(addr, wire, now)
+                elif command == packet.DIS:
+                    station = self.connected.remove(addr)
+                    if station is None:
+                        continue
+                    wire = station.wire
+                else:
+                    continue
+            else:
+                station = self.connected.touch(addr, now)
+                if station is None:
+                    continue  # not connected
+                wire = station.wire
+            batches[shardOf(wire, self.workers)].append((addr, data))
+        for transport, batch in zip(self.transports, batches):
+            if batch:
+                transport.put(batch)
+
+    def serve(self, duration=None):
+        """Relay packets until `stop` is called (or for `duration` seconds)."""
+        if not self.running:
+            self.start()
+        selector = selectors.DefaultSelector()
+        selector.register(self.sock, selectors.EVENT_READ)
+        end = None if duration is None else time.monotonic() + duration
+        while self.running and (end is None or time.monotonic() < end):
+            if not selector.select(1.0):
+                continue
+            received = self.io.recv(block=False)
+            if received:
+                self.dispatch(received)
+            now = time.monotonic()
+            if now - self.lastSweep >= SWEEPINTERVAL:
+                self.lastSweep = now
+                self.connected.expire(now)
+        selector.close()
+
+    def stop(self):
+        self.running = False
+        for t in self.transports:
+            t.close()
+        for p in self.processes:
+            p.join(1.0)
+            if p.is_alive():
+                p.terminate()
+        for t in self.transports:
+            t.dispose()
+        self.sock.close()
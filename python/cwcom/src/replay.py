@@ -0,0 +1,193 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+replay.py
+
+Replays recorded wire traffic (see `recording.py`), to reproduce what a wire
+carried, e.g. when chasing a decoding problem.
+
+    records = replay.merge(recording.readRecording("a.txt"), recording.readRecording("b.txt"))
+    replay.Replayer(records, speed=10).run(replay.UDPTarget(("127.0.0.1", 7890), wire=103))
+
+A `Replayer` hands each record to a target at its recorded time, relative to
+the first record, divided by `speed`: 1 keeps the original timing, 10 replays
+ten times faster, and None replays in virtual time, as fast as the target
+takes the records. In every mode `clock()` returns the recorded time of the
+record being replayed, so time-dependent consumers (e.g. a
+`TranscriptRecorder`, which takes a clock) see the original times.
+
+Records are read as they are replayed, so a day of traffic takes no more
+memory than a minute. The replayer sleeps until SPIN seconds before a record
+is due and then spins, as `KeyerThread` does; records that are already due
+are handed over without waiting. How late each record was handed over is kept
+in a histogram (`lateness`, in seconds).
+
+Targets:
+
+  - `UDPTarget` sends the packets to a server (e.g. a local `relay`), each
+    station from its own socket so the server can tell them apart. A station
+    connects (CON and ID packets) before its first packet, repeats CON every
+    KEEPALIVE seconds of recorded time and disconnects at the end.
+  - `ReaderTarget` decodes each station with its own Reader. Instead of a
+    flusher thread (which runs on real time), a station's Reader is flushed
+    when the recorded times show it has been idle for IDLEDOTS dots.
+"""
+
+import heapq
+import socket
+import time
+from operator import attrgetter
+
+from pykob import codedetect, config, morse, packet
+from pykob.metrics import Histogram
+
+SPIN      = 0.001  # seconds before a record is due to stop sleeping and spin
+KEEPALIVE = 10.0   # seconds (recorded time) between the CON packets of a station
+IDLEDOTS  = 20     # dots without code after which a station's Reader is flushed (as its flusher)
+
+def merge(*recordings):
+    """Merge the records of several recordings (each in time order) into one stream in time order."""
+    return heapq.merge(*recordings, key=attrgetter('time'))
+
+def sendingTime(code):
+    """Seconds a station spent sending `code`, not counting the space before it."""
+    if code and code[0] < 0:
+        code = code[1:]
+    return sum(abs(e) for e in code if abs(e) > 2) / 1000.0
+
+class Replayer:
+    def __init__(self, records, speed=1.0, clock=time.monotonic):
+        self.records  = records
+        self.speed    = speed   # None: virtual time
+        self.wall     = clock   # real time, for the scheduling
+        self.now      = 0.0     # recorded time of the record being replayed
+        self.replayed = 0       # records handed to the target
+        self.lateness = Histogram()
+        self.running  = False
+
+    def clock(self):
+        """The recorded time of the record being replayed."""
+        return self.now
+
+    def run(self, target):
+        """Replay the records into `target` (until they end or `stop` is called), then close it."""
+        self.running = True
+        speed = self.speed
+        wall = self.wall
+        first = None
+        try:
+            for r in self.records:
+                if not self.running:
+                    break
+                if first is None:
+                    first = r.time
+                    start = wall()
+                self.now = r.time
+                if speed:
+                    due = start + (r.time - first) / speed
+                    now = wall()
+                    if due - now > SPIN:
+                        time.sleep(due - now - SPIN)
+                    while wall() < due:  # spin for an accurate send time
+                        pass
+                    self.lateness.observe(wall() - due)
+                target.deliver(r)
+                self.replayed += 1
+        finally:
+            self.running = False
+            target.close()
+
+    def stop(self):
+        self.running = False
+
+class _Station:
+    __slots__ = ("sock", "sequence", "lastCon")
+
+    def __init__(self, sock, now):
+        self.sock     = sock
+        self.sequence = 0
+        self.lastCon  = now
+
+class UDPTarget:
+    """Sends the replayed packets to the server at `address`, on `wire`."""
+
+    def __init__(self, address, wire=packet.DEFAULT_CHANNEL, keepAlive=KEEPALIVE):
+        self.address   = address
+        self.wire      = wire
+        self.keepAlive = keepAlive
+        self.stations  = {}  # station id -> _Station
+
+    def deliver(self, record):
+        s = self.stations.get(record.station)
+        if s is None:
+            sock = socket.socket(socket.AF_INET6 if ':' in self.address[0] else socket.AF_INET,
+                    socket.SOCK_DGRAM)
+            s = self.stations[record.station] = _Station(sock, record.time)
+            sock.sendto(packet.packCommand(packet.CON, self.wire), self.address)
+            sock.sendto(packet.packId(record.station, s.sequence), self.address)
+        elif record.time - s.lastCon >= self.keepAlive:
+            s.lastCon = record.time
+            s.sock.sendto(packet.packCommand(packet.CON, self.wire), self.address)
+        s.sequence += 1
+        s.sock.sendto(packet.packData(record.station, s.sequence, record.code), self.address)
+
+    def close(self):
+        for s in self.stations.values():
+            s.sock.sendto(packet.packCommand(packet.DIS), self.address)
+            s.sock.close()
+        self.stations = {}
+
+class ReaderTarget:
+    """
+    Decodes each station with a Reader; `callback(station)` returns the
+    Reader callback for a station (e.g. a `TextBatcher`). With `detect` on,
+    each Reader is put behind a `CodeDetector`. The Readers have no flusher
+    thread: they are flushed on recorded time.
+    """
+
+    def __init__(self, callback, wpm=20, codeType=config.CodeType.american, detect=False):
+        self.callback = callback
+        self.wpm      = wpm
+        self.codeType = codeType
+        self.detect   = detect
+        self.readers  = {}  # station -> (Reader or CodeDetector, Reader, time of the last packet)
+
+    def deliver(self, record):
+        entry = self.readers.get(record.station)
+        if entry is None:
+            reader = morse.Reader(self.wpm, 0, self.codeType, self.callback(record.station),
+                    flushTimer=False)
+            decoder = codedetect.CodeDetector(reader) if self.detect else reader
+        else:
+            decoder, reader, last = entry
+            if record.time - last - sendingTime(record.code) > IDLEDOTS * reader.truDot / 1000.0:
+                decoder.flush()
+        self.readers[record.station] = (decoder, reader, record.time)
+        decoder.decode(record.code)
+
+    def close(self):
+        for decoder, reader, last in self.readers.values():
+            decoder.flush()
+        self.readers = {}
@@ -0,0 +1,129 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+retime.py
+
+Re-times a received code stream to another speed, e.g. to play a 30 wpm
+station at 15 wpm for students.
+
+A `Retimer` decodes the packets of one station with a `Reader` (once, however
+many speeds are offered) and hands each decoded character to its variants.
+Each variant re-encodes the characters with a `Sender` at its own speed and
+paces the packets out through a `TextSender`, so the listener receives code
+as if it had been sent at that speed.
+
+The Reader starts at `sourceWpm` and follows the speed it detects
+(`d_wpm`, from the dot lengths), so the dot/dash and spacing decisions suit
+the actual sender; the first characters may be misread if `sourceWpm` is far
+off. Word spaces are kept; a long mark ('_', e.g. the circuit
+latched closed at the end of a transmission) is sent as a latch (+1) and
+unlatched (+2) before the next character. Characters the Reader could not
+recognize ('[...]') are dropped.
+
+Slowing a station down makes the output longer than the input, so each
+variant holds at most `maxBacklog` characters; characters arriving beyond
+that are dropped and counted. Latches and unlatches are never dropped.
+"""
+
+from pykob import config, morse
+from pykob.morse import WORDSPACING
+from pykob.textsender import TextSender
+
+MAXBACKLOG = 200   # characters a variant may hold before dropping
+TRACKING   = 0.15  # relative difference of the detected speed that retunes the Reader
+
+class Variant:
+    def __init__(self, send, wpm, cwpm, codeType, spacing, maxBacklog, scheduler):
+        self.output     = TextSender(send, wpm, cwpm, codeType, spacing, scheduler=scheduler)
+        self.maxBacklog = maxBacklog
+        self.latched    = False  # True after a latch has been sent
+        self.dropped    = 0      # characters dropped because of the backlog
+
+    def put(self, text):
+        if self.output.pending() >= self.maxBacklog:
+            self.dropped += len(text)
+            return
+        self.output.write(text)
+
+    def latch(self, text=''):
+        """Send `text` and a latch, unless latched; never dropped, so `latched` matches the listeners."""
+        if not self.latched:
+            self.latched = True
+            self.output.write(text + '+')
+
+    def unlatch(self):
+        if self.latched:
+            self.latched = False
+            self.output.write('~')
+
+    def setSpeed(self, wpm, cwpm=0):
+        self.output.setSpeed(wpm, cwpm)
+
+class Retimer:
+    """
+    Decodes one station's code and re-sends it at the speeds of its variants.
+    With `flushTimer` off the Reader starts no flusher threads and `flush`
+    must be called when the station goes idle (e.g. from a relay's sweep).
+    """
+
+    def __init__(self, sourceWpm=20, codeType=config.CodeType.american, flushTimer=True):
+        self.codeType = codeType
+        self.reader   = morse.Reader(sourceWpm, 0, codeType, self.character, flushTimer=flushTimer)
+        self.variants = []
+        self.unknown  = 0  # characters not recognized (dropped)
+
+    def addVariant(self, send, wpm, cwpm=0, spacing=config.Spacing.char,
+            maxBacklog=MAXBACKLOG, scheduler=None):
+        """Re-send the code at `wpm` to `send(code, char)`; return the variant."""
+        variant = Variant(send, wpm, cwpm, self.codeType, spacing, maxBacklog, scheduler)
+        self.variants.append(variant)
+        return variant
+
+    def removeVariant(self, variant):
+        variant.output.cancel()
+        self.variants.remove(variant)
+
+    def decode(self, code):
+        """Decode the code elements of one received packet."""
+        reader = self.reader
+        reader.decode(code)
+        if abs(reader.d_wpm - reader.wpm) > TRACKING * reader.wpm:
+            reader.setWPM(max(1, int(round(reader.d_wpm))))
+
+    def flush(self):
+        self.reader.flush()
+
+    def character(self, char, spacing):
+        """Reader callback: pass a decoded character to the variants."""
+        if char.startswith('['):
+            self.unknown += 1
+            return
+        text = ' ' if spacing >= WORDSPACING else ''
+        for variant in self.variants:
+            if char == '_':
+                variant.latch(text)
+            else:
+                variant.unlatch()
+                variant.put(text + char)
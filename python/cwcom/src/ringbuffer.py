@@ -0,0 +1,251 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+ringbuffer.py
+
+Single-producer/single-consumer ring buffer of fixed-size packet records in
+`multiprocessing.shared_memory`.
+
+Layout of the shared block:
+
+    head   (8 bytes, offset 0)  - records written; written by the producer only
+    closed (8 bytes, offset 8)  - set by the producer when it is done
+    tail   (8 bytes, offset 32) - records read; written by the consumer only
+    slots  (offset 64)          - `capacity` records of RECORD_SIZE bytes
+
+A record is a 32-byte header (payload length, sender port and address, and
+the flowinfo and scope id of an IPv6 address) followed by room for SIZE_DATA_PACKET bytes, so a 496-byte DAT packet from
+`c/cwprotocol.h` is copied once into its slot and then read in place through a
+memoryview, e.g. by `packet.unpackData`.
+
+Each counter has a single writer, so no lock is needed: the producer fills a
+slot before it advances `head`, and the consumer releases a slot (advances
+`tail`) only after it is done with it. The counters are aligned 8-byte stores,
+which relies on the ordered stores of x86 (TSO): there is no fence Python
+can issue, so on other architectures (e.g. the ARM of a Raspberry Pi) a
+RingBuffer cannot be created (ORDERED is False) and the relay carries the
+packets through a pipe instead.
+"""
+
+import platform
+import socket
+import struct
+import sys
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+
+from pykob.packet import SIZE_DATA_PACKET
+
+HEADER        = struct.Struct("<HH16sII")  # payload length (| IPV6), port, address, flowinfo, scope id
+HEADER_SIZE   = 32                         # record header, padded
+RECORD_SIZE   = HEADER_SIZE + SIZE_DATA_PACKET
+COUNTER       = struct.Struct("<Q")
+CONTROL_SIZE  = 64
+HEAD          = 0
+CLOSED        = 8
+TAIL          = 32
+IPV6          = 0x8000                     # flag in the length field
+POLL          = 0.0005                     # seconds between checks of an empty ring
+CACHESIZE     = 4096                       # headers remembered by each end
+ORDERED       = platform.machine().lower() in ("x86_64", "amd64", "i386", "i486", "i586", "i686", "x86")
+
+
+class RingBuffer:
+    """
+    A ring of `capacity` records. Create it in the producer (`create=True`)
+    and open it by `name` in the consumer (`create=False`); a RingBuffer passed
+    to a child process is reopened there by name.
+
+    The per-record work is kept to a dictionary lookup at each end: the
+    producer caches the encoded header of each (address, length) and copies a
+    run of records with one slice assignment; the consumer caches the decoded
+    address of each header.
+    """
+
+    def __init__(self, name=None, capacity=4096, create=True):
+        if not ORDERED:
+            raise RuntimeError("RingBuffer needs x86 store ordering, not {}.".format(platform.machine()))
+        if create:
+            size = CONTROL_SIZE + capacity * RECORD_SIZE
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+            self.shm.buf[:CONTROL_SIZE] = bytes(CONTROL_SIZE)
+        else:
+            self.shm = _attach(name)
+        self.name     = self.shm.name
+        self.capacity = capacity
+        self.owner    = create
+        self.buf      = self.shm.buf
+        self.head     = COUNTER.unpack_from(self.buf, HEAD)[0]  # producer's copy
+        self.tail     = COUNTER.unpack_from(self.buf, TAIL)[0]  # consumer's copy
+        self.views    = []  # views returned by the last `get`, released by the next
+        self.encoded  = {}  # (address, length) -> header
+        self.decoded  = {}  # header -> (address, length)
+
+    def __getstate__(self):
+        return {"name": self.name, "capacity": self.capacity}
+
+    def __setstate__(self, state):
+        self.__init__(state["name"], state["capacity"], create=False)
+
+    def __len__(self):
+        return COUNTER.unpack_from(self.buf, HEAD)[0] - COUNTER.unpack_from(self.buf, TAIL)[0]
+
+    def _header(self, addr, size):
+        if size > SIZE_DATA_PACKET:
+            raise ValueError("Record of {} bytes does not fit a {} byte slot.".format(size, SIZE_DATA_PACKET))
+        host, port = (addr[0], addr[1]) if addr else ('0.0.0.0', 0)
+        if ':' in host:
+            flowinfo, scope = (addr[2], addr[3]) if len(addr) > 3 else (0, 0)
+            header = HEADER.pack(size | IPV6, port, socket.inet_pton(socket.AF_INET6, host), flowinfo, scope)
+        else:
+            header = HEADER.pack(size, port, socket.inet_aton(host), 0, 0)
+        header = header.ljust(HEADER_SIZE, b'\0')
+        if len(self.encoded) >= CACHESIZE:
+            self.encoded.clear()
+        self.encoded[(addr, size)] = header
+        return header
+
+    def _copy(self, first, parts):
+        """Copy the records `parts` (header, data, padding, ...) to slots `first`..."""
+        index = first % self.capacity
+        count = len(parts) // 3
+        split = min(count, self.capacity - index) * 3  # records before the end of the ring
+        offset = CONTROL_SIZE + index * RECORD_SIZE
+        run = b''.join(parts[:split])
+        self.buf[offset:offset + len(run)] = run
+        if split < len(parts):
+            run = b''.join(parts[split:])
+            self.buf[CONTROL_SIZE:CONTROL_SIZE + len(run)] = run
+
+    def put(self, data, addr=None):
+        """Copy one packet into the ring. Return False if the ring is full."""
+        return self.putMany(((addr, data),)) == 1
+
+    def putMany(self, batch):
+        """
+        Put (address, packet) tuples and publish them together; return how
+        many fit.
+        """
+        room = self.capacity - (self.head - COUNTER.unpack_from(self.buf, TAIL)[0])
+        if room <= 0 or not batch:
+            return 0
+        if room < len(batch):
+            batch = batch[:room]
+        encoded = self.encoded
+        parts = []
+        for addr, data in batch:
+            size = len(data)
+            header = encoded.get((addr, size)) or self._header(addr, size)
+            parts += (header, data, _padding[size])
+        self._copy(self.head, parts)
+        self.head += len(batch)
+        COUNTER.pack_into(self.buf, HEAD, self.head)
+        return len(batch)
+
+    def _decode(self, header):
+        size, port, raw, flowinfo, scope = HEADER.unpack_from(header)
+        if size & IPV6:
+            addr = (socket.inet_ntop(socket.AF_INET6, raw), port, flowinfo, scope)
+        else:
+            addr = (socket.inet_ntoa(raw[:4]), port)
+        if len(self.decoded) >= CACHESIZE:
+            self.decoded.clear()
+        entry = self.decoded[header] = (addr, size & ~IPV6)
+        return entry
+
+    def _release(self):
+        for view in self.views:
+            view.release()
+        self.views = []
+
+    def get(self, timeout=None):
+        """
+        Return a list of (address, memoryview) for the records queued, [] if
+        none arrived within `timeout` seconds (None waits forever), or None if
+        the producer has closed the ring and it is empty. The views are valid
+        until the next call to `get`, which releases them and their slots.
+        """
+        if self.views:
+            self.tail += len(self.views)
+            self._release()
+            COUNTER.pack_into(self.buf, TAIL, self.tail)
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            head = COUNTER.unpack_from(self.buf, HEAD)[0]
+            if head > self.tail:
+                break
+            if COUNTER.unpack_from(self.buf, CLOSED)[0]:
+                return None
+            if end is not None and time.monotonic() >= end:
+                return []
+            time.sleep(POLL)
+        count = min(head - self.tail, self.capacity)
+        index = self.tail % self.capacity
+        first = min(count, self.capacity - index)  # records before the end of the ring
+        offsets = [*range(CONTROL_SIZE + index * RECORD_SIZE, CONTROL_SIZE + (index + first) * RECORD_SIZE, RECORD_SIZE),
+                *range(CONTROL_SIZE, CONTROL_SIZE + (count - first) * RECORD_SIZE, RECORD_SIZE)]
+        buf = self.buf
+        decoded = self.decoded
+        records = []
+        views = []
+        for offset in offsets:
+            header = bytes(buf[offset:offset + HEADER.size])
+            addr, size = decoded.get(header) or self._decode(header)
+            view = buf[offset + HEADER_SIZE:offset + HEADER_SIZE + size]
+            views.append(view)
+            records.append((addr, view))
+        self.views = views
+        return records
+
+    def finish(self):
+        """Tell the consumer that no more records will be put (producer)."""
+        COUNTER.pack_into(self.buf, CLOSED, 1)
+
+    def close(self):
+        self._release()
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+_padding = [bytes(SIZE_DATA_PACKET - n) for n in range(SIZE_DATA_PACKET + 1)]  # fills a slot
+
+def _attach(name):
+    """Open an existing block without handing it to this process's resource tracker."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    shm = shared_memory.SharedMemory(name)
+    child = (multiprocessing.parent_process() is not None
+            or getattr(multiprocessing.current_process(), "_inheriting", False))  # spawn
+    if not child:
+        # an unrelated process has its own tracker, which would unlink the
+        # block when this process exits; children share the creator's tracker
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
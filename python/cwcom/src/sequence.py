@@ -0,0 +1,116 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+sequence.py
+
+Tracks the `sequence` field of the packets received from one station.
+
+Every ID and DAT packet a station sends takes the next number from its
+`tx_sequence` counter (`c/cwprotocol.c`), and latch/unlatch packets are sent
+several times with the same number. A `SequenceTracker` classifies each
+received number as the next one, a gap (packets lost), a late packet that fills
+an earlier gap (reordered), or a duplicate, and keeps loss statistics.
+
+When a gap is seen, the Reader set as `reader` is flushed before the packet is
+decoded, so the code before and after the missing packet is not merged into
+one character. A `Transmitter` given a tracker (`tracker`) follows its
+rolling `lossRate` to adapt the number of latch copies it sends.
+"""
+
+from collections import namedtuple
+
+NEXT       = 0  # the expected sequence number
+GAP        = 1  # later than expected: the packets in between are missing
+REORDERED  = 2  # an earlier missing packet arriving late
+DUPLICATE  = 3  # a number already received (e.g. a repeated latch packet)
+RESTART    = 4  # the first packet, or the station restarted its counter
+
+MISSINGWINDOW = 64    # numbers remembered to recognize late packets; an older one is a restart
+RESTARTJUMP   = 1000  # a jump forward this large is taken as a restart
+ALPHA         = 0.01  # weight of each expected packet in the rolling loss rate
+
+LossStats = namedtuple("LossStats", "received lost reordered duplicates gaps lossRate")
+
+class SequenceTracker:
+    def __init__(self, reader=None, alpha=ALPHA):
+        self.reader     = reader  # Reader to flush when a gap is seen
+        self.alpha      = alpha
+        self.expected   = None    # next sequence number expected
+        self.missing    = set()   # recent numbers skipped by a gap
+        self.received   = 0       # packets received (not counting duplicates)
+        self.lost       = 0       # packets missing (less those that arrived late)
+        self.reordered  = 0
+        self.duplicates = 0
+        self.gaps       = 0
+        self.lossRate   = 0.0     # rolling fraction of expected packets missing
+
+    def update(self, sequence):
+        """Classify the sequence number of a received packet and return the class."""
+        expected = self.expected
+        if (expected is None or sequence > expected + RESTARTJUMP
+                or sequence < expected - MISSINGWINDOW):
+            self.expected = sequence + 1
+            self.missing.clear()
+            self.received += 1
+            return RESTART
+        if sequence == expected:
+            self.expected = sequence + 1
+            self.received += 1
+            self.lossRate -= self.alpha * self.lossRate
+            return NEXT
+        if sequence > expected:
+            skipped = sequence - expected
+            self.expected = sequence + 1
+            self.received += 1
+            self.lost += skipped
+            self.gaps += 1
+            keep = (1.0 - self.alpha) ** skipped  # `skipped` lost, then one received
+            self.lossRate = (1.0 - self.alpha) * (self.lossRate * keep + 1.0 - keep)
+            missing = self.missing
+            missing.update(range(max(expected, sequence - MISSINGWINDOW), sequence))
+            if len(missing) > MISSINGWINDOW:
+                limit = sequence - MISSINGWINDOW
+                self.missing = {n for n in missing if n >= limit}
+            if self.reader is not None:
+                self.reader.flush()
+            return GAP
+        if sequence in self.missing:
+            self.missing.discard(sequence)
+            self.received += 1
+            self.lost -= 1
+            self.reordered += 1
+            self.lossRate = max(0.0, self.lossRate - self.alpha)
+            return REORDERED
+        self.duplicates += 1
+        return DUPLICATE
+
+    def stats(self):
+        return LossStats(self.received, self.lost, self.reordered, self.duplicates,
+                self.gaps, self.lossRate)
+
+    def lossFraction(self):
+        """Return the fraction of the packets sent since the first one that were lost."""
+        total = self.received + self.lost
+        return self.lost / total if total else 0.0
@@ -0,0 +1,176 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+sessions.py
+
+Bounded per-station state for long-running relays and monitors.
+
+A `SessionRegistry` keeps one `Session` per key (a station address or id) in
+least-recently-used order. A session that has not been seen for `ttl` seconds,
+or the oldest one once `capacity` is reached, is evicted: its Reader is
+flushed first, so the last character it was holding is still delivered.
+Because the order is also the order of last activity, an expiry sweep only
+looks at the sessions it evicts.
+
+Station ids (the 128-byte `id` field of a DAT packet, decoded afresh from
+every ID packet) are interned while a session uses them, so each distinct id
+is held once however many packets carry it.
+"""
+
+import sys
+from collections import OrderedDict
+
+CAPACITY = 10000  # sessions kept before the least recently used is evicted
+TTL      = 60.0   # seconds without activity before a session is evicted
+
+class Session:
+    __slots__ = ("key", "wire", "id", "lastSeen", "sequence", "reader")
+
+    def __init__(self, key, wire, now):
+        self.key      = key   # address or id the registry knows the station by
+        self.wire     = wire
+        self.id       = ''    # station id from the ID packet (interned)
+        self.lastSeen = now
+        self.sequence = None  # SequenceTracker, if the packets are tracked
+        self.reader   = None  # Reader if the station is decoded
+
+class SessionRegistry:
+    """
+    Sessions keyed by station address or id, bounded by `capacity` and `ttl`.
+    `onEvict(session)` is called for every session removed by `expire` or by
+    the capacity limit (not by `remove`), after its Reader has been flushed.
+    """
+
+    def __init__(self, capacity=CAPACITY, ttl=TTL, onEvict=None):
+        self.capacity = capacity
+        self.ttl      = ttl
+        self.onEvict  = onEvict
+        self.sessions = OrderedDict()  # key -> Session, least recently seen first
+        self.ids      = {}             # station id -> [interned id, sessions using it]
+        self.evicted  = 0              # sessions evicted since creation
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, key):
+        return key in self.sessions
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def get(self, key):
+        """Return the session for `key` (or None) without refreshing it."""
+        return self.sessions.get(key)
+
+    def touch(self, key, now):
+        """Return the session for `key` (or None), marking it active at `now`."""
+        session = self.sessions.get(key)
+        if session is not None:
+            session.lastSeen = now
+            self.sessions.move_to_end(key)
+        return session
+
+    def add(self, key, wire, now):
+        """Create (or replace) the session for `key` and return it."""
+        if key in self.sessions:
+            self.remove(key)
+        while len(self.sessions) >= self.capacity:
+            self._evict(next(iter(self.sessions)))
+        session = self.sessions[key] = Session(key, wire, now)
+        return session
+
+    def remove(self, key):
+        """Remove and return the session for `key` (or None), flushing its Reader."""
+        session = self.sessions.pop(key, None)
+        if session is not None:
+            self._release(session)
+        return session
+
+    def setId(self, session, id):
+        """Set the station id of `session`, interning it."""
+        if id == session.id:
+            return
+        self._unintern(session.id)
+        entry = self.ids.get(id)
+        if entry is None:
+            entry = self.ids[id] = [id, 0]
+        entry[1] += 1
+        session.id = entry[0]
+
+    def expire(self, now):
+        """Evict the sessions idle for more than `ttl` seconds; return how many."""
+        count = 0
+        limit = now - self.ttl
+        for key, session in self.sessions.items():
+            if session.lastSeen >= limit:
+                break
+            count += 1
+        for i in range(count):
+            self._evict(next(iter(self.sessions)))
+        return count
+
+    def footprint(self):
+        """
+        Return an estimate in bytes of the memory held by the registry: the
+        tables, the sessions, their sequence trackers, interned ids and
+        Readers (shallow).
+        """
+        size = sys.getsizeof(self.sessions) + sys.getsizeof(self.ids)
+        for entry in self.ids.values():
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[0])
+        for session in self.sessions.values():
+            size += sys.getsizeof(session)
+            if session.sequence is not None:
+                size += _shallowSize(session.sequence) + sys.getsizeof(session.sequence.missing)
+            if session.reader is not None:
+                size += _shallowSize(session.reader)
+        return size
+
+    def _evict(self, key):
+        session = self.sessions.pop(key)
+        self._release(session)
+        self.evicted += 1
+        if self.onEvict:
+            self.onEvict(session)
+
+    def _release(self, session):
+        if session.reader is not None:
+            session.reader.flush()
+        self._unintern(session.id)
+
+    def _unintern(self, id):
+        entry = self.ids.get(id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.ids[id]
+
+def _shallowSize(obj):
+    size = sys.getsizeof(obj)
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+        size += sum(sys.getsizeof(v) for v in attributes.values())
+    return size
@@ -0,0 +1,192 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+sounder.py
+
+Drives a sounder from received code.
+
+A `Sounder` plays the code elements of each received packet as energize (mark)
+and de-energize (space) commands on a dedicated thread, at the times the
+elements call for. Packets are played one after the other; a packet that
+arrives after the previous one has finished starts `delay` seconds after its
+arrival. Spaces are played for at most `MAXSPACE` ms, so a long idle period
+before a packet does not hold up its playing.
+
+A +1 element leaves the sounder energized (the circuit is latched closed) and
++2 releases it, as in the README; otherwise the circuit opens at the end of
+each packet. While the circuit is latched, spaces neither open it nor take any
+time: the space before the +2 of an unlatch packet `(-n, +2)` is the key-down
+time, which has already been played.
+
+Commands that would not change the sounder's state (e.g. the space that starts
+every packet while the circuit is already open) are coalesced and never reach
+the backend. When the sounder has been left energized for `powerSave` seconds
+(`config.sounder_power_save`, 0 to disable) it is de-energized to save power.
+
+The latency from the arrival of each packet to its first actuation is kept in
+a histogram (`latency`, in seconds).
+
+Backends set the sounder line: `SerialBackend` uses the RTS line of the KOB
+serial interface (pyserial); `MemoryBackend` records the commands instead.
+"""
+
+import time
+from collections import deque
+from threading import Condition, Thread
+
+from pykob import config
+from pykob.metrics import Histogram
+
+MAXSPACE = 3000  # longest space played (ms)
+
+class SerialBackend:
+    """The sounder on the RTS line of a serial port (`serial.Serial` or a port name)."""
+
+    def __init__(self, port=None):
+        if port is None or isinstance(port, str):
+            import serial  # optional dependency
+            port = serial.Serial(port or config.serial_port)
+        self.port = port
+
+    def set(self, energized):
+        self.port.rts = energized
+
+    def close(self):
+        self.port.close()
+
+class MemoryBackend:
+    """Records (time, energized) for each command, for tests and measurements."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.events = []
+
+    def set(self, energized):
+        self.events.append((self.clock(), energized))
+
+    def close(self):
+        pass
+
+class Sounder:
+    def __init__(self, backend=None, powerSave=None, delay=0.0, clock=time.monotonic):
+        self.backend   = backend if backend is not None else SerialBackend()
+        self.powerSave = config.sounder_power_save if powerSave is None else powerSave
+        self.delay     = delay      # seconds between the arrival of a packet and its playing
+        self.clock     = clock
+        self.cond      = Condition()
+        self.actions   = deque()    # (time, energized, arrival time or None) to play
+        self.queued    = None       # state after the last queued action
+        self.latched   = False      # True after a queued +1 until the circuit is released
+        self.playEnd   = 0.0        # time the queued code ends
+        self.energized = None       # state of the sounder line (None until first set)
+        self.changed   = 0.0        # time of the last change of the line
+        self.commands  = 0          # commands sent to the backend
+        self.coalesced = 0          # commands dropped because they changed nothing
+        self.saved     = 0          # times the sounder was de-energized to save power
+        self.latency   = Histogram()
+        self.running   = True
+        self.thread    = Thread(target=self._run, name="Sounder", daemon=True)
+        self.thread.start()
+
+    def play(self, code, arrival=None):
+        """Queue the code elements of one received packet."""
+        now = self.clock()
+        arrival = now if arrival is None else arrival
+        with self.cond:
+            t = max(arrival + self.delay, self.playEnd, now)
+            first = arrival  # marks the packet's first actuation, for the latency
+            for e in code:
+                if e < 0:
+                    if not self.latched:
+                        first = self._queue(t, False, first)
+                        t += min(-e, MAXSPACE) / 1000.0
+                elif e == 1:
+                    first = self._queue(t, True, first)  # latch the circuit closed
+                    self.latched = True
+                elif e == 2:
+                    first = self._queue(t, False, first)  # unlatch
+                    self.latched = False
+                else:
+                    self.latched = False
+                    first = self._queue(t, True, first)
+                    t += e / 1000.0
+                    first = self._queue(t, False, first)
+            self.playEnd = t
+            self.cond.notify()
+
+    def energize(self, energized):
+        """Set the sounder now (e.g. from the local key), coalescing redundant commands."""
+        with self.cond:
+            self._set(energized, self.clock())
+            self.queued = energized
+
+    def _queue(self, t, energized, arrival):
+        """Queue a change of state; return `arrival` if it was coalesced, else None."""
+        if energized == self.queued:
+            self.coalesced += 1
+            return arrival
+        self.queued = energized
+        self.actions.append((t, energized, arrival))
+        return None
+
+    def _set(self, energized, now):
+        if energized == self.energized:
+            self.coalesced += 1
+            return
+        self.energized = energized
+        self.changed = now
+        self.commands += 1
+        self.backend.set(energized)
+
+    def _run(self):
+        with self.cond:
+            while self.running:
+                now = self.clock()
+                if self.actions:
+                    t, energized, arrival = self.actions[0]
+                    if t > now:
+                        self.cond.wait(t - now)
+                        continue
+                    self.actions.popleft()
+                    self._set(energized, now)
+                    if arrival is not None:
+                        self.latency.observe(now - arrival)
+                elif self.energized and self.powerSave > 0:
+                    due = self.changed + self.powerSave
+                    if due > now:
+                        self.cond.wait(due - now)
+                        continue
+                    self._set(False, now)
+                    self.queued = False
+                    self.saved += 1
+                else:
+                    self.cond.wait()
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+        self.backend.close()
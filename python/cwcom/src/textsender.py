@@ -0,0 +1,204 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+textsender.py
+
+Sends typed or piped text to a wire in real time.
+
+A `TextSender` accepts text at any time (`write`) and keeps up to `lookahead`
+characters encoded ahead by a `Sender`, so each packet is ready before it is
+due. A packet is due when the code of the previous one has been played out:
+the packets of a session are spaced by the total length of their code
+elements, which is what a receiving Reader and sounder expect.
+
+All the sessions share one `Scheduler` thread, which waits for the earliest
+deadline of any session, hands the due packet to the session's `send(code,
+char)` function (e.g. `Transmitter.send`) and tops up its lookahead. The
+session's lock is not held while `send` runs, so writing to a session is not
+held up by a slow send; `send` should still return promptly, as the next
+deadlines of every session wait for it.
+
+The speed can be changed while text is being sent (`setSpeed`): the characters
+already encoded ahead but not sent are encoded again at the new speed, and the
+spacing carried over from the last packet sent is kept.
+"""
+
+import heapq
+import time
+from collections import deque
+from threading import Condition, Thread
+
+from pykob import config, morse
+
+LOOKAHEAD = 8  # characters encoded ahead of the one being played
+
+class Scheduler:
+    """
+    Runs the sessions' deadlines on one thread. The thread is started by the
+    first `schedule` call.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock   = clock
+        self.cond    = Condition()
+        self.queue   = []     # (deadline, order, session, token)
+        self.order   = 0      # tie breaker for equal deadlines
+        self.thread  = None
+        self.running = False
+
+    def schedule(self, session, deadline, token):
+        with self.cond:
+            self.order += 1
+            heapq.heappush(self.queue, (deadline, self.order, session, token))
+            if self.thread is None:
+                self.running = True
+                self.thread = Thread(target=self._run, name="Sender-Scheduler", daemon=True)
+                self.thread.start()
+            elif self.queue[0][1] == self.order:  # the new deadline is the earliest
+                self.cond.notify()
+
+    def _run(self):
+        with self.cond:
+            while self.running:
+                if not self.queue:
+                    self.cond.wait()
+                    continue
+                deadline, order, session, token = self.queue[0]
+                delay = deadline - self.clock()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                heapq.heappop(self.queue)
+                if token != session.token:
+                    continue  # rescheduled since
+                self.cond.release()
+                try:
+                    session._fire(deadline)
+                finally:
+                    self.cond.acquire()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+_scheduler = None
+
+def defaultScheduler():
+    """Return the Scheduler shared by sessions created without one."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = Scheduler()
+    return _scheduler
+
+class TextSender:
+    def __init__(self, send, wpm, cwpm=0, codeType=config.CodeType.american,
+            spacing=config.Spacing.char, lookahead=LOOKAHEAD, scheduler=None):
+        self.send      = send         # function called with (code, char) when a packet is due
+        self.lookahead = lookahead
+        self.scheduler = scheduler or defaultScheduler()
+        self.sender    = morse.Sender(wpm, cwpm, codeType, spacing)
+        self.cond      = Condition()
+        self.text      = deque()      # characters not encoded yet
+        self.ready     = deque()      # (code, char, space before encoding) encoded ahead
+        self.due       = None         # time the next packet is due (None when idle)
+        self.token     = 0            # identifies the current schedule entry
+        self.sent      = 0            # characters sent
+        self.sending   = False        # True while `send` is called (outside the lock)
+
+    def write(self, text):
+        """Queue `text` for sending and return at once."""
+        with self.cond:
+            self.text.extend(text)
+            self._encodeAhead()
+            if self.due is None and self.ready:
+                self.due = self.scheduler.clock()
+                self._schedule()
+
+    def setSpeed(self, wpm, cwpm=0):
+        """Change the speed, re-encoding the characters encoded ahead."""
+        with self.cond:
+            if self.ready:
+                self.sender.space = self.ready[0][2]
+                self.text.extendleft(reversed([c for code, c, space in self.ready]))
+                self.ready.clear()
+            self.sender.setSpeed(wpm, cwpm)
+            self._encodeAhead()
+
+    def pending(self):
+        """Return the number of characters written but not sent."""
+        with self.cond:
+            return len(self.text) + len(self.ready)
+
+    def drain(self, timeout=None):
+        """Wait until every character written has been sent; return True if so."""
+        with self.cond:
+            return self.cond.wait_for(
+                    lambda: not self.text and not self.ready and not self.sending, timeout)
+
+    def cancel(self):
+        """Drop the text not sent yet."""
+        with self.cond:
+            self.text.clear()
+            self.ready.clear()
+            self.due = None
+            self.token += 1
+            self.cond.notify_all()
+
+    def _encodeAhead(self):
+        sender = self.sender
+        while len(self.ready) < self.lookahead and self.text:
+            c = self.text.popleft()
+            space = sender.space
+            self.ready.append((sender.encode(c), c, space))
+
+    def _schedule(self):
+        self.token += 1
+        self.scheduler.schedule(self, self.due, self.token)
+
+    def _fire(self, deadline):
+        with self.cond:
+            code = ()
+            while self.ready and not code:  # characters without code (spaces) take no packet
+                code, c, space = self.ready.popleft()
+                self.sent += 1
+            self._encodeAhead()
+            if code:
+                self.due = deadline + sum(abs(e) for e in code) / 1000.0
+                self._schedule()  # runs on this thread, so not before the send below
+                self.sending = True
+            else:
+                self.due = None
+                self.cond.notify_all()
+                return
+        try:
+            self.send(code, c)  # without the lock, so a slow send does not hold up `write`
+        finally:
+            with self.cond:
+                self.sending = False
+                self.cond.notify_all()
@@ -0,0 +1,376 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+transcript.py
+
+Provides an incremental full-text index over decoded wire transcripts.
+
+Words are collected from the `Reader` callback output, one recorder per wire
+and station:
+
+    index = TranscriptIndex()
+    reader = morse.Reader(callback=index.recorder(wire, station))
+
+Every word becomes an occurrence (time, wire, station, word). Occurrences are
+stored column-wise in typed arrays and each distinct word has a posting list of
+occurrence numbers, so a query is a dictionary lookup followed by a walk of one
+posting list.
+"""
+
+import sys
+import time
+from array import array
+from operator import itemgetter
+from threading import Lock
+from pykob.morse import WORDSPACING
+
+FILE_MAGIC = b'CWTX'
+FILE_VERSION = 1
+
+def _writeVarint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def _readVarint(data, pos):
+    n = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+def _writeStrings(buf, strings):
+    _writeVarint(buf, len(strings))
+    for s in strings:
+        b = s.encode('utf-8')
+        _writeVarint(buf, len(b))
+        buf += b
+
+def _readStrings(data, pos):
+    n, pos = _readVarint(data, pos)
+    strings = []
+    for i in range(n):
+        size, pos = _readVarint(data, pos)
+        strings.append(data[pos:pos + size].decode('utf-8'))
+        pos += size
+    return strings, pos
+
+def _bisect(occs, times, t, right=False):
+    """
+    Return where time `t` goes in `occs`, occurrences in time order: before
+    the occurrences at `t` (as `bisect_left`), or after them with `right`.
+    """
+    lo = 0
+    hi = len(occs)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        u = times[occs[mid]]
+        if u < t or (right and u == t):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def _writeArray(buf, a):
+    if sys.byteorder != 'little':
+        a = array(a.typecode, a)
+        a.byteswap()
+    _writeVarint(buf, len(a))
+    buf += a.tobytes()
+
+def _readArray(data, pos, typecode):
+    n, pos = _readVarint(data, pos)
+    a = array(typecode)
+    size = n * a.itemsize
+    a.frombytes(data[pos:pos + size])
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a, pos + size
+
+
+class TranscriptRecorder:
+    """
+    `Reader` callback that assembles decoded characters into words and adds
+    them to a `TranscriptIndex`.
+
+    A word ends when the spacing before the next character is at least
+    `WORDSPACING`, at a circuit closure ('_'), or at an unrecognized code. The
+    word in progress is added when `flush` is called.
+    """
+
+    def __init__(self, index, wire, station, clock=time.time):
+        self.index   = index    # the TranscriptIndex the words go to
+        self.wire    = wire     # wire (channel) number
+        self.station = station  # station id
+        self.clock   = clock    # function returning the current time (seconds)
+        self.word    = ''       # characters of the word in progress
+        self.start   = 0.0      # time the first character of the word was received
+
+    def __call__(self, char, spacing):
+        if spacing >= WORDSPACING or char == '_' or char.startswith('['):
+            self.flush()
+            if char == '_' or char.startswith('['):
+                return
+        if not self.word:
+            self.start = self.clock()
+        self.word += char
+
+    def flush(self):
+        if self.word:
+            self.index.add(self.wire, self.station, self.start, self.word)
+            self.word = ''
+
+
+class TranscriptIndex:
+    """
+    Inverted index of decoded words keyed by wire, station and time.
+
+    Occurrences are numbered in the order they are added, which need not be
+    time order (e.g. the words of several stations arriving interleaved);
+    their timestamps are kept as given. The posting lists and the timeline
+    hold occurrences in time order (equal times in the order added), so time
+    ranges are found by bisection; an occurrence added in time order is
+    appended, a late one is inserted. Time ranges include `start` and
+    exclude `end`.
+    """
+
+    def __init__(self):
+        self.lock     = Lock()
+        self.terms    = []          # term id -> word
+        self.termIds  = {}          # word -> term id
+        self.stations = []          # station number -> station id
+        self.stationNos = {}        # station id -> station number
+        self.times    = array('d')  # occurrence -> time (seconds)
+        self.wires    = array('H')  # occurrence -> wire number
+        self.owners   = array('I')  # occurrence -> station number
+        self.words    = array('I')  # occurrence -> term id
+        self.prevs    = array('l')  # occurrence -> previous occurrence on the same wire and station (-1 if none)
+        self.nexts    = array('l')  # occurrence -> next occurrence on the same wire and station (-1 if none)
+        self.postings = []          # term id -> array of occurrences, in time order
+        self.timeline = array('I')  # all the occurrences, in time order
+        self.last     = {}          # (wire, station number) -> latest occurrence
+
+    def __len__(self):
+        return len(self.times)
+
+    def recorder(self, wire, station, clock=time.time):
+        """Return a `Reader` callback that records into this index."""
+        return TranscriptRecorder(self, wire, station, clock)
+
+    def _insert(self, occs, occ, timestamp):
+        if not occs or self.times[occs[-1]] <= timestamp:
+            occs.append(occ)
+        else:
+            occs.insert(_bisect(occs, self.times, timestamp, right=True), occ)
+
+    def add(self, wire, station, timestamp, word):
+        """Add one word sent by `station` on `wire` at `timestamp`."""
+        word = word.upper()
+        with self.lock:
+            termId = self.termIds.get(word)
+            if termId is None:
+                termId = len(self.terms)
+                self.terms.append(word)
+                self.termIds[word] = termId
+                self.postings.append(array('I'))
+            stationNo = self.stationNos.get(station)
+            if stationNo is None:
+                stationNo = len(self.stations)
+                self.stations.append(station)
+                self.stationNos[station] = stationNo
+            occ = len(self.times)
+            key = (wire, stationNo)
+            prev = self.last.get(key, -1)
+            self.times.append(timestamp)
+            self.wires.append(wire)
+            self.owners.append(stationNo)
+            self.words.append(termId)
+            self.prevs.append(prev)
+            self.nexts.append(-1)
+            if prev >= 0:
+                self.nexts[prev] = occ
+            self._insert(self.postings[termId], occ, timestamp)
+            self._insert(self.timeline, occ, timestamp)
+            self.last[key] = occ
+
+    def _phrase(self, occ, termIds, k):
+        """
+        Return the first occurrence of the phrase `termIds` whose word `k` is
+        `occ`, or -1 if the words around `occ` are not the phrase.
+        """
+        first = occ
+        for termId in reversed(termIds[:k]):
+            first = self.prevs[first]
+            if first < 0 or self.words[first] != termId:
+                return -1
+        last = occ
+        for termId in termIds[k + 1:]:
+            last = self.nexts[last]
+            if last < 0 or self.words[last] != termId:
+                return -1
+        return first
+
+    def search(self, text, wire=None, station=None, start=None, end=None):
+        """
+        Find the occurrences of a word or phrase.
+
+        Return a list of (time, wire, station, phrase) tuples in time order,
+        the time being that of the first word. The phrase matches only words
+        sent consecutively by the same station on the same wire. `wire`,
+        `station`, `start` and `end` restrict the result. The candidates are
+        the occurrences of the rarest word of the phrase.
+        """
+        query = text.upper().split()
+        if not query:
+            return []
+        with self.lock:
+            termIds = [self.termIds.get(w) for w in query]
+            if None in termIds:
+                return []
+            stationNo = None
+            if station is not None:
+                stationNo = self.stationNos.get(station)
+                if stationNo is None:
+                    return []
+            k = min(range(len(termIds)), key=lambda i: len(self.postings[termIds[i]]))
+            postings = self.postings[termIds[k]]
+            times = self.times
+            lo = 0
+            hi = len(postings)
+            if k == 0:  # the candidates' times are the hits' times
+                if start is not None:
+                    lo = _bisect(postings, times, start)
+                if end is not None:
+                    hi = _bisect(postings, times, end)
+            phrase = ' '.join(query)
+            hits = []
+            for i in range(lo, hi):
+                occ = postings[i]
+                if wire is not None and self.wires[occ] != wire:
+                    continue
+                if stationNo is not None and self.owners[occ] != stationNo:
+                    continue
+                first = self._phrase(occ, termIds, k)
+                if first < 0:
+                    continue
+                t = times[first]
+                if (start is not None and t < start) or (end is not None and t >= end):
+                    continue
+                hits.append((t, self.wires[occ], self.stations[self.owners[occ]], phrase))
+        if k:
+            hits.sort(key=itemgetter(0))
+        return hits
+
+    def count(self, word):
+        """Return the number of occurrences of a single word."""
+        with self.lock:
+            termId = self.termIds.get(word.upper())
+            return 0 if termId is None else len(self.postings[termId])
+
+    def wordsBetween(self, start, end, wire=None, station=None):
+        """Return the transcript from `start` to `end` as a list of (time, wire, station, word) tuples."""
+        with self.lock:
+            lo = _bisect(self.timeline, self.times, start)
+            hi = _bisect(self.timeline, self.times, end)
+            result = []
+            for occ in self.timeline[lo:hi]:
+                if wire is not None and self.wires[occ] != wire:
+                    continue
+                st = self.stations[self.owners[occ]]
+                if station is not None and st != station:
+                    continue
+                result.append((self.times[occ], self.wires[occ], st, self.terms[self.words[occ]]))
+        return result
+
+    def save(self, path):
+        """
+        Write the index to `path`.
+
+        The file holds the string tables, the occurrence columns as raw
+        little-endian arrays, and the posting lists as varint-encoded gaps
+        between successive occurrence numbers. The time order of the posting
+        lists, the timeline and the next links are rebuilt by `load`.
+        """
+        with self.lock:
+            buf = bytearray(FILE_MAGIC)
+            _writeVarint(buf, FILE_VERSION)
+            _writeStrings(buf, self.terms)
+            _writeStrings(buf, self.stations)
+            _writeArray(buf, self.times)
+            _writeArray(buf, self.wires)
+            _writeArray(buf, self.owners)
+            _writeArray(buf, self.words)
+            _writeArray(buf, array('q', self.prevs))
+            for posting in self.postings:
+                _writeVarint(buf, len(posting))
+                prev = 0
+                for occ in sorted(posting):  # gaps must be positive; `load` puts them in time order
+                    _writeVarint(buf, occ - prev)
+                    prev = occ
+        with open(path, 'wb') as f:
+            f.write(buf)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by `save`."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != FILE_MAGIC:
+            raise ValueError("'{}' is not a transcript index file.".format(path))
+        version, pos = _readVarint(data, 4)
+        if version != FILE_VERSION:
+            raise ValueError("Transcript index version {} is not supported.".format(version))
+        index = cls()
+        index.terms, pos = _readStrings(data, pos)
+        index.termIds = {w: i for i, w in enumerate(index.terms)}
+        index.stations, pos = _readStrings(data, pos)
+        index.stationNos = {s: i for i, s in enumerate(index.stations)}
+        index.times, pos = _readArray(data, pos, 'd')
+        index.wires, pos = _readArray(data, pos, 'H')
+        index.owners, pos = _readArray(data, pos, 'I')
+        index.words, pos = _readArray(data, pos, 'I')
+        prevs, pos = _readArray(data, pos, 'q')
+        index.prevs = array('l', prevs)
+        for i in range(len(index.terms)):
+            n, pos = _readVarint(data, pos)
+            posting = []
+            occ = 0
+            for j in range(n):
+                delta, pos = _readVarint(data, pos)
+                occ += delta
+                posting.append(occ)
+            index.postings.append(array('I', sorted(posting, key=index.times.__getitem__)))
+        index.timeline = array('I', sorted(range(len(index.times)), key=index.times.__getitem__))
+        index.nexts = array('l', [-1]) * len(index.times)
+        for occ in range(len(index.times)):
+            index.last[(index.wires[occ], index.owners[occ])] = occ
+            if index.prevs[occ] >= 0:
+                index.nexts[index.prevs[occ]] = occ
+        return index
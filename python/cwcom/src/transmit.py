@@ -0,0 +1,154 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+transmit.py
+
+Builds DAT packets for transmission.
+
+Normally each character goes out in its own packet. A `Transmitter` can
+optionally coalesce several characters into one packet, up to SIZE_CODE code
+elements and within a latency budget. A receiver (including `Reader.decode`)
+just sees a longer sequence of marks and spaces, so coalesced packets stay
+compatible with the standard format.
+
+Latch (+1) and unlatch (+2) packets are sent several times because a lost one
+leaves every sounder on the wire in the wrong state. The number of copies can
+be fixed or adapted to the measured packet loss.
+"""
+
+import math
+import time
+from threading import Lock, Timer
+
+from pykob import packet
+
+LATCHCOPIES    = 5      # copies of each latch/unlatch packet (as in `c/cwprotocol.c`)
+MINLATCHCOPIES = 1
+MAXLATCHCOPIES = 10
+LATCHTARGET    = 1e-6   # acceptable chance of losing every copy of a latch packet
+
+def latchCopies(loss, target=LATCHTARGET, minCopies=MINLATCHCOPIES, maxCopies=MAXLATCHCOPIES):
+    """
+    Return the number of copies of a latch packet needed so that all of them
+    are lost with a probability of at most `target`, given the packet loss
+    rate `loss` (0..1).
+    """
+    if loss <= 0.0:
+        return minCopies
+    if loss >= 1.0:
+        return maxCopies
+    n = math.ceil(math.log(target) / math.log(loss))
+    return max(minCopies, min(maxCopies, n))
+
+class Transmitter:
+    """
+    Packetizes code sequences from `Sender.encode` and hands each packet to
+    `send(bytes)`.
+
+    With `coalesce` off, every call to `send` produces one packet. With it on,
+    code is held until SIZE_CODE elements would be exceeded or `latency` seconds
+    have passed since the first held element; held code is then sent by a
+    Timer thread. `flush` sends held code at once.
+
+    Latch and unlatch sequences ((-n, +1) and (-n, +2)) are never coalesced.
+    They are sent `latchCopies` times; with `adaptive` on the copy count follows
+    the loss rate set by `setLoss`, or, if a `sequence.SequenceTracker` is
+    given as `tracker` (e.g. the one of a station received on the same wire),
+    its `lossRate` when each latch packet is sent.
+    """
+
+    def __init__(self, id, send, coalesce=False, latency=0.25, latchCopies=LATCHCOPIES,
+            adaptive=False, tracker=None):
+        self.id          = id           # station id
+        self.sendPacket  = send         # function that transmits one packet (bytes)
+        self.coalesce    = coalesce     # True to combine characters into one packet
+        self.latency     = latency      # maximum time (seconds) code is held
+        self.latchCopies = latchCopies  # copies of each latch/unlatch packet
+        self.adaptive    = adaptive     # True to adapt latchCopies to the loss rate
+        self.tracker     = tracker      # SequenceTracker whose loss rate is followed (adaptive)
+        self.sequence    = 0            # sequence number of the last packet sent
+        self.lock        = Lock()
+        self.held        = ()           # code elements waiting to be sent
+        self.status      = ''           # characters carried by the held code
+        self.flusher     = None         # Timer that sends the held code
+        self.generation  = 0            # number of the held code the flusher belongs to
+
+    def setLoss(self, loss):
+        """Set the measured packet loss rate (0..1) used when `adaptive` is on."""
+        if self.adaptive:
+            self.latchCopies = latchCopies(loss)
+
+    def send(self, code, char=''):
+        """Send (or hold) the code elements for one character."""
+        if not code:
+            return
+        latch = code[-1] == 1 or code[-1] == 2
+        with self.lock:
+            if latch or not self.coalesce:
+                self._flush()
+                if latch and self.tracker is not None:
+                    self.setLoss(self.tracker.lossRate)
+                self._transmit(code, char, self.latchCopies if latch else 1)
+                return
+            if len(self.held) + len(code) > packet.SIZE_CODE:
+                self._flush()
+            if not self.held:
+                self._startFlusher()
+            self.held += code
+            self.status += char
+            if len(self.held) == packet.SIZE_CODE:
+                self._flush()
+
+    def flush(self):
+        """Send any held code now."""
+        with self.lock:
+            self._flush()
+
+    def _expire(self, generation):
+        with self.lock:
+            if generation == self.generation:  # still the code the Timer was started for
+                self._flush()
+
+    def _startFlusher(self):
+        self.generation += 1
+        self.flusher = Timer(self.latency, self._expire, (self.generation,))
+        self.flusher.setName("Transmitter-Flusher")
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def _flush(self):
+        if self.flusher:
+            self.flusher.cancel()
+            self.flusher = None
+        if self.held:
+            self._transmit(self.held, self.status, 1)
+            self.held = ()
+            self.status = ''
+
+    def _transmit(self, code, status, copies):
+        self.sequence += 1
+        p = packet.packData(self.id, self.sequence, code, status or '?')
+        for i in range(copies):
+            self.sendPacket(p)
@@ -0,0 +1,199 @@
+"""
+MIT License
+
+Copyright (c) 2020 PyKOB - MorseKOB in Python
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+"""
+tuning.py
+
+Grid search over `morse.ReaderParams` to tune the decoder for a set of fists.
+
+Every parameter set decodes all labeled samples (recordings with a '# text:'
+label, see `recording.py`, or synthetic traffic from `fist.py`); the character
+error rate and the decode throughput are reported per parameter set. Parameter
+sets are spread over a process pool.
+
+    python3 -m pykob.tuning -t 25 -g minDashLen=1.3,1.5,1.7 -g minCharSpace=2.4,2.7 wire103.txt
+"""
+
+import argparse
+import itertools
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from pykob import config, morse, recording
+
+Sample = namedtuple("Sample", "name wpm codeType packets text")
+Result = namedtuple("Result", "params cer errors chars packets seconds")
+
+class OfflineReader(morse.Reader):
+    """
+    Reader that collects the decoded text instead of calling a callback, and
+    that never starts a flusher thread (the whole stream is available up
+    front, so `flush` is called once at the end).
+    """
+
+    def __init__(self, wpm, codeType, params):
+        morse.Reader.__init__(self, wpm, 0, codeType, self.collect, params, flushTimer=False)
+        self.text = []
+
+    def collect(self, char, spacing):
+        if spacing >= morse.WORDSPACING and self.text:
+            self.text.append(' ')
+        self.text.append(char)
+
+def normalize(text):
+    return ' '.join(text.upper().split())
+
+def editDistance(a, b):
+    """Return the Levenshtein distance between the strings `a` and `b`."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                    previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def decodeSample(params, sample):
+    """Return (text, seconds): the decoded text of `sample` and the decode time."""
+    reader = OfflineReader(sample.wpm, sample.codeType, params)
+    decode = reader.decode
+    t = time.perf_counter()
+    for codeSeq in sample.packets:
+        decode(codeSeq)
+    reader.flush()
+    return ''.join(reader.text), time.perf_counter() - t
+
+def loadSample(path, wpm, codeType):
+    """Return a `Sample` for a labeled recording."""
+    text = recording.readLabel(path)
+    if text is None:
+        raise ValueError("Recording '{}' has no '{}' label.".format(path, recording.LABEL_PREFIX))
+    packets = [r.code for r in recording.readRecording(path)]
+    return Sample(path, wpm, codeType, packets, text)
+
+def syntheticSample(text, fistName, wpm, codeType, repeat=1, seed=None):
+    """Return a `Sample` of `text` sent with one of the fists in `fist.py`."""
+    from pykob import fist
+    generator = fist.TrafficGenerator(wpm, 0, codeType, fist=getattr(fist, fistName.upper()), seed=seed)
+    traffic = generator.generate(text, repeat)
+    return Sample("{}@{}".format(fistName, wpm), wpm, codeType,
+            list(generator.stream(traffic)), traffic.text)
+
+def grid(**ranges):
+    """
+    Return the `ReaderParams` for every combination of the given values, e.g.
+    grid(minDashLen=(1.3, 1.5), alpha=(0.3, 0.5)). Parameters that are not
+    given keep their default value.
+    """
+    names = list(ranges)
+    return [morse.DEFAULT_PARAMS._replace(**dict(zip(names, values)))
+            for values in itertools.product(*(ranges[n] for n in names))]
+
+_samples = None  # the samples, set in each worker process
+
+def _init(samples):
+    global _samples
+    _samples = samples
+
+def _evaluate(params):
+    errors = chars = packets = 0
+    seconds = 0.0
+    for sample in _samples:
+        text, t = decodeSample(params, sample)
+        ref = normalize(sample.text)
+        errors += editDistance(ref, normalize(text))
+        chars += len(ref)
+        packets += len(sample.packets)
+        seconds += t
+    return Result(params, errors / max(chars, 1), errors, chars, packets, seconds)
+
+def evaluate(paramsList, samples, jobs=None):
+    """
+    Decode every sample with every parameter set, using `jobs` worker processes
+    (all cores if None, in this process if 1). Return the `Result`s, best
+    (lowest character error rate, then fastest) first.
+    """
+    if jobs == 1:
+        _init(samples)
+        results = [_evaluate(p) for p in paramsList]
+    else:
+        with ProcessPoolExecutor(jobs, initializer=_init, initargs=(samples,)) as pool:
+            results = list(pool.map(_evaluate, paramsList))
+    results.sort(key=lambda r: (r.cer, r.seconds / max(r.packets, 1)))
+    return results
+
+def report(results, top=None):
+    changed = lambda p: ", ".join("{}={}".format(k, v) for k, v in p._asdict().items()
+            if v != getattr(morse.DEFAULT_PARAMS, k)) or "defaults"
+    for r in results[:top]:
+        print("CER {:6.2%}  {:8.0f} packets/s  {}".format(r.cer,
+                r.packets / r.seconds if r.seconds else 0.0, changed(r.params)))
+
+def parseRange(s):
+    name, _, values = s.partition('=')
+    if name not in morse.ReaderParams._fields:
+        raise argparse.ArgumentTypeError("'{}' is not a Reader parameter ({}).".format(
+                name, ", ".join(morse.ReaderParams._fields)))
+    return name, [float(v) for v in values.split(',')]
+
+def codeType(s):
+    """The `config.CodeType` named by a --type value (A|AMERICAN|I|INTERNATIONAL)."""
+    s = s.upper()
+    if s == "A" or s == "AMERICAN":
+        return config.CodeType.american
+    if s == "I" or s == "INTERNATIONAL":
+        return config.CodeType.international
+    raise argparse.ArgumentTypeError("'{}' is not a code type (AMERICAN|INTERNATIONAL).".format(s))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the Reader decoding thresholds.",
+            parents=[config.text_speed_override, config.code_type_override])
+    parser.add_argument("recordings", nargs='*', help="Labeled recordings to decode.")
+    parser.add_argument("-g", "--grid", action='append', type=parseRange, default=[],
+            metavar="name=v1,v2,...", help="Values to try for one Reader parameter.")
+    parser.add_argument("--synthetic", metavar="text",
+            help="Also decode this text sent with the fist given by --fist.")
+    parser.add_argument("--fist", default="bug", help="MACHINE|BUG|STRAIGHT_KEY|HAM_FIST")
+    parser.add_argument("--repeat", type=int, default=10, help="Repetitions of the synthetic text.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes.")
+    parser.add_argument("--top", type=int, default=10, help="Number of results to show.")
+    args = parser.parse_args(argv)
+    try:
+        code = codeType(args.code_type)  # the user's configuration is left alone
+    except argparse.ArgumentTypeError as ex:
+        parser.error(str(ex))
+    samples = [loadSample(p, args.text_speed, code) for p in args.recordings]
+    if args.synthetic:
+        samples.append(syntheticSample(args.synthetic, args.fist, args.text_speed,
+                code, args.repeat, seed=0))
+    if not samples:
+        parser.error("no recordings and no --synthetic text to decode")
+    report(evaluate(grid(**dict(args.grid)), samples, args.jobs), args.top)
+
+if __name__ == "__main__":
+    main()
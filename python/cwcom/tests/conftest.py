@@ -0,0 +1,18 @@
+"""
+Makes the modules in `src` importable as the `pykob` package when it is not
+installed, so the tests run against this tree.
+"""
+
+import importlib.util
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+try:
+    import pykob  # noqa: F401
+except ImportError:
+    spec = importlib.util.spec_from_file_location("pykob", os.path.join(SRC, "__init__.py"),
+            submodule_search_locations=[SRC])
+    sys.modules["pykob"] = module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
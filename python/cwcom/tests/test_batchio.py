@@ -0,0 +1,77 @@
+import socket
+
+import pytest
+
+from pykob import batchio
+
+BACKENDS = [batchio.SimpleIO]
+if batchio._libc is not None:
+    BACKENDS.append(batchio.MMsgIO)
+
+@pytest.fixture
+def sockets():
+    opened = []
+
+    def open():
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(('127.0.0.1', 0))
+        s.settimeout(1.0)
+        opened.append(s)
+        return s
+
+    yield open
+    for s in opened:
+        s.close()
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def testHostNames(backend, sockets):
+    receiver = sockets()
+    io = backend(sockets())
+    io.fanout(b'fan', [('localhost', receiver.getsockname()[1])])
+    io.send([(b'one', ('localhost', receiver.getsockname()[1]))])
+    assert receiver.recv(16) == b'fan'
+    assert receiver.recv(16) == b'one'
+    assert io.errors == 0
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def testFailedAddressDoesNotStopTheBatch(backend, sockets):
+    first, last = sockets(), sockets()
+    io = backend(sockets())
+    addresses = [first.getsockname(),
+                 ('255.255.255.255', 9),  # EACCES without SO_BROADCAST
+                 ('host.invalid', 9),     # does not resolve
+                 last.getsockname()]
+    io.fanout(b'fan', addresses)
+    io.send([(b'one', a) for a in addresses])
+    for s in (first, last):
+        assert s.recv(16) == b'fan'
+        assert s.recv(16) == b'one'
+    assert io.errors == 4
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def testFanoutSkipsTheSender(backend, sockets):
+    members = [sockets(), sockets(), sockets()]
+    addresses = [s.getsockname() for s in members]
+    io = backend(sockets())
+    for sender in addresses:
+        io.fanout(sender[1].to_bytes(2, 'big'), addresses, sender)
+    for s in members:
+        received = {int.from_bytes(s.recv(16), 'big') for i in range(2)}
+        assert received == {a[1] for a in addresses} - {s.getsockname()[1]}
+    assert io.errors == 0
+
+@pytest.mark.skipif(batchio._libc is None, reason="needs sendmmsg")
+def testMMsgFanoutKeptAcrossSenders(sockets):
+    addresses = [sockets().getsockname() for i in range(3)]
+    io = batchio.MMsgIO(sockets())
+    io.fanout(b'fan', addresses, addresses[0])
+    fan = io.fan
+    io.fanout(b'fan', addresses, addresses[1])
+    assert io.fan is fan
+
+@pytest.mark.skipif(batchio._libc is None, reason="needs sendmmsg")
+def testMMsgAddressCacheIsBounded(sockets, monkeypatch):
+    monkeypatch.setattr(batchio, "ADDRESSES", 4)
+    io = batchio.MMsgIO(sockets())
+    io.send([(b'x', ('127.0.0.1', port)) for port in range(40000, 40010)])
+    assert len(io.sockaddrs) <= 4
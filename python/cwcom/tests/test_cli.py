@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import cli
+
+GOOD = "0.500\tW1AW\t-460,60,-60,60\n"
+BAD  = "abc\tA\t-1,x\n"
+
+@pytest.fixture
+def badRecording(tmp_path):
+    path = tmp_path / "bad.txt"
+    path.write_text(GOOD + BAD)
+    return str(path)
+
+def testReadRecordsReportsLine(badRecording):
+    with pytest.raises(cli.RecordingError, match=r"bad\.txt:2: "):
+        list(cli.readRecords([badRecording]))
+
+def testDecodeParallelRaisesParseError(badRecording):
+    with pytest.raises(cli.RecordingError, match=r"bad\.txt:2: "):
+        list(cli.decodeParallel(cli.readRecords([badRecording]), 2))
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def testDecodeReportsParseError(badRecording, jobs, capsys):
+    assert cli.main(["decode", "-j", jobs, badRecording]) == 1
+    assert "bad.txt:2: " in capsys.readouterr().err
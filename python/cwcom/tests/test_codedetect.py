@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import codedetect, codetable, config, morse
+
+TEXT = "CQ CQ DE W1AW THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG 123456789 "
+
+def send(decoder, text, codeType, wpm=20):
+    sender = morse.Sender(wpm, codeType=codeType)
+    for c in text:
+        code = sender.encode(c)
+        if code:
+            decoder.decode(code)
+
+def detect(codeType, readAs):
+    chars = []
+    reader = morse.Reader(20, 0, readAs, lambda c, spacing: chars.append(c), flushTimer=False)
+    detector = codedetect.CodeDetector(reader)
+    send(detector, TEXT * 2, codeType)
+    detector.flush()
+    return detector, ''.join(chars)
+
+@pytest.mark.parametrize("codeType, readAs, table", [
+    (config.CodeType.international, config.CodeType.american, codetable.INTERNATIONAL),
+    (config.CodeType.american, config.CodeType.international, codetable.AMERICAN)])
+def testSwitchesToTheSentCode(codeType, readAs, table):
+    detector, text = detect(codeType, readAs)
+    assert detector.table.id == table
+    assert detector.switches == 1
+    assert text.endswith(TEXT.replace(' ', '').rstrip())
+
+def testStaysWithTheSentCode():
+    detector, text = detect(config.CodeType.american, config.CodeType.american)
+    assert detector.switches == 0
+
+def testFlusherThreadFlushSeenByDetector():
+    """The characters flushed by the Reader's own flusher thread are counted as evidence."""
+    reader = morse.Reader(40, callback=lambda c, spacing: None)
+    detector = codedetect.CodeDetector(reader)
+    send(detector, "PARIS", config.CodeType.american, 40)
+    time.sleep(25 * reader.truDot / 1000.0)  # longer than the flusher's 20 dots
+    assert len(detector.evidence) == 5
@@ -0,0 +1,36 @@
+import threading
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import codetable
+
+def testLookup():
+    registry = codetable.registry
+    assert registry.lookup('.-', codetable.AMERICAN) == 'A'
+    assert registry.lookup('........', codetable.AMERICAN) == ''
+    assert registry.lookupAll('.-.-.-')[codetable.INTERNATIONAL] == '.'
+
+def testLookupDuringLoad():
+    registry = codetable.Registry()
+    registry.add("a", [('A', '.-'), ('N', '-.')])
+    pairs = [("c{}".format(i), "".join('.-'[int(b)] for b in "{:b}".format(i))) for i in range(2, 20000)]
+    misses = []
+    stop = threading.Event()
+
+    def decode():
+        while not stop.is_set():
+            if registry.lookup('.-', 0) != 'A':
+                misses.append(1)
+
+    t = threading.Thread(target=decode)
+    t.start()
+    try:
+        for i in range(8):
+            table = registry.add("t{}".format(i), pairs)
+            assert registry.lookup('-.', table.id) == 'c2'  # a new id is covered at once
+    finally:
+        stop.set()
+        t.join()
+    assert not misses
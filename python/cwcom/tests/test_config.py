@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import config
+
+def testSetterInvalidatesSnapshot():
+    old = config.text_speed
+    try:
+        config.set_text_speed(str(old + 1))
+        assert config.snapshot().text_speed == old + 1
+    finally:
+        config.set_text_speed(str(old))
+    assert config.snapshot().text_speed == old
+
+def testSetterDuringBuildInvalidatesSnapshot(monkeypatch):
+    """A set_* that runs while a snapshot is built from the old values must not leave it current."""
+    old = config.text_speed
+    build = config.ConfigSnapshot
+
+    setter = threading.Thread(target=config.set_text_speed, args=(str(old + 1),))
+
+    def buildWithSetter(*values):
+        setter.start()
+        setter.join(0.2)  # finishes now, or waits for the snapshot lock
+        return build(*values)
+    buildWithSetter._fields = build._fields
+
+    config.set_text_speed(str(old))
+    monkeypatch.setattr(config, "ConfigSnapshot", buildWithSetter)
+    try:
+        config.snapshot()  # built from the old value
+        monkeypatch.setattr(config, "ConfigSnapshot", build)
+        setter.join()  # the set_* call has returned
+        assert config.snapshot().text_speed == old + 1
+    finally:
+        config.set_text_speed(str(old))
+
+def testUnsavedValueSurvivesFileChange(monkeypatch):
+    config.read_config()
+    old = config.text_speed
+    monkeypatch.setattr(config, "RELOAD_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(config, "_config_file_times", lambda: ("changed",))
+    try:
+        config.set_text_speed(str(old + 1))  # not saved
+        assert config.snapshot().text_speed == old + 1
+        assert config.text_speed == old + 1
+    finally:
+        monkeypatch.undo()
+        config.read_config()
+
+def testUnreadableFileKeepsSnapshot(monkeypatch):
+    config.read_config()
+    current = config.snapshot()
+
+    def broken():
+        raise ValueError("NOT-A-TYPE")
+
+    monkeypatch.setattr(config, "RELOAD_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(config, "_config_file_times", lambda: ("changed",))
+    monkeypatch.setattr(config, "read_config", broken)
+    assert config.snapshot() is current
+    assert config.snapshot() is current  # not retried for the same files
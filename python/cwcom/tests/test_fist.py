@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import fist, morse
+
+def testWordSpaceAfterBreak():
+    generator = fist.TrafficGenerator(20, fist=fist.Fist(breakRate=1.0))
+    packets, chars = generator.encode("E T")
+    assert chars == ['E', ' _', '', ' T']
+    sender = morse.Sender(20)
+    assert packets[3][0] == -sender.wordSpace
@@ -0,0 +1,63 @@
+import functools
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import metrics, morse
+
+def decodeWords(text, instrument):
+    words = []
+    reader = morse.Reader(20, callback=morse.TextBatcher(words.append))
+    if instrument:
+        metrics.instrumentReader(reader, metrics.Metrics())
+    sender = morse.Sender(20)
+    for c in text:
+        code = sender.encode(c)
+        if code:
+            reader.decode(code)
+    reader.flush()
+    return words
+
+def testInstrumentedReaderFlushesBatcher():
+    assert decodeWords("CQ DE W1AW", instrument=True) == decodeWords("CQ DE W1AW", instrument=False)
+    assert decodeWords("CQ DE W1AW", instrument=True) == ["CQ", "DE", "W1AW"]
+
+def testUninstrumentRestoresCallback():
+    batcher = morse.TextBatcher(print)
+    reader = morse.Reader(20, callback=batcher)
+    metrics.instrumentReader(reader, metrics.Metrics())
+    metrics.uninstrument(reader)
+    assert reader.callback is batcher
+
+def testInstrumentedCallbackDelegatesAttributes():
+    batcher = morse.TextBatcher(print, lineLength=40)
+    reader = morse.Reader(20, callback=batcher)
+    m = metrics.Metrics()
+    metrics.instrumentReader(reader, m, wire=103, station="W1AW")
+    assert reader.callback.lineLength == 40
+    assert reader.callback.endWord == batcher.endWord
+    reader.callback('E', 0)
+    reader.callback('[.-.-]', 0)
+    assert batcher.word == ['E', '[.-.-]']
+    text = m.prometheus()
+    assert 'cwcom_reader_characters_total{wire="103",station="W1AW"} 1' in text
+    assert 'cwcom_reader_unrecognized_total{wire="103",station="W1AW"} 1' in text
+
+def testUninstrumentLeavesOtherWrappersAlone():
+    chars = []
+
+    @functools.wraps(chars.append)
+    def callback(char, spacing):
+        chars.append(char)
+
+    reader = morse.Reader(20, callback=callback)
+    flush = reader.flush
+    reader.flush = functools.wraps(flush)(lambda: flush())
+    patched = reader.flush
+    metrics.uninstrument(reader)  # never instrumented
+    assert reader.callback is callback and reader.flush is patched
+    metrics.instrumentReader(reader, metrics.Metrics())
+    metrics.uninstrument(reader)
+    assert reader.callback is callback and reader.flush is patched
+    assert 'decode' not in reader.__dict__
@@ -0,0 +1,13 @@
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import morse
+
+def testReaderWithoutFlushTimer():
+    chars = []
+    reader = morse.Reader(20, callback=lambda c, spacing: chars.append(c), flushTimer=False)
+    reader.decode(morse.Sender(20).encode('E'))
+    assert reader.flusher is None
+    reader.flush()
+    assert chars == ['E']
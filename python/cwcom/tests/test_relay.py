@@ -0,0 +1,42 @@
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import morse, packet, relay, ringbuffer
+
+def testRingFallsBackToPipeWithoutOrderedStores(monkeypatch):
+    monkeypatch.setattr(ringbuffer, "ORDERED", False)
+    r = relay.ShardedRelay('127.0.0.1', 0, 2, transport=relay.RingTransport)
+    try:
+        assert all(isinstance(t, relay.PipeTransport) for t in r.transports)
+    finally:
+        for t in r.transports:
+            t.close()
+            t.dispose()
+        r.sock.close()
+
+def decodeTo(chars):
+    def decoder(wire, station):
+        return lambda c, spacing: chars.append(c)
+    return decoder
+
+def testWorkerFlushesIdleReaders():
+    chars = []
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        worker = relay.WireWorker(sock, decodeTo(chars))
+        addr = ('127.0.0.1', 9)
+        now = time.monotonic()
+        worker.handle(addr, packet.packCommand(packet.CON, 5), now)
+        worker.handle(addr, packet.packData("W1AW", 1, morse.Sender(20).encode('E')), now)
+        reader = worker.stations.get(addr).reader
+        assert reader.flusher is None and chars == []
+        worker.sweep(now + 0.5)  # less than 20 dots
+        assert chars == []
+        worker.sweep(now + 2.0)
+        assert chars == ['E'] and not worker.unflushed
+    finally:
+        sock.close()
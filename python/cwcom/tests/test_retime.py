@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import retime, textsender
+
+def testLatchSurvivesFullBacklog():
+    scheduler = textsender.Scheduler()
+    sent = []
+    retimer = retime.Retimer(flushTimer=False)
+    variant = retimer.addVariant(lambda code, char: sent.append(char), 60, maxBacklog=0,
+            scheduler=scheduler)
+    try:
+        retimer.character('A', 0)
+        retimer.character('_', 0)
+        retimer.character('B', 0)
+        assert variant.output.drain(5.0)
+    finally:
+        scheduler.stop()
+    assert sent == ['+', '~']
+    assert not variant.latched
+    assert variant.dropped == 2
@@ -0,0 +1,28 @@
+import pytest
+
+from pykob import ringbuffer
+
+@pytest.fixture
+def ring():
+    if not ringbuffer.ORDERED:
+        pytest.skip("the ring needs x86 store ordering")
+    ring = ringbuffer.RingBuffer(capacity=8)
+    yield ring
+    ring.close()
+
+def testAddressesRoundTrip(ring):
+    v4 = ('127.0.0.1', 7890)
+    v6 = ('fe80::1', 7890, 5, 2)
+    assert ring.putMany([(v4, b'a'), (v6, b'bb')]) == 2
+    records = ring.get(0)
+    assert [(addr, bytes(data)) for addr, data in records] == [(v4, b'a'), (v6, b'bb')]
+
+def testFullRingDrops(ring):
+    batch = [(('127.0.0.1', 1), bytes([i])) for i in range(10)]
+    assert ring.putMany(batch) == 8
+    assert [bytes(data) for addr, data in ring.get(0)] == [bytes([i]) for i in range(8)]
+
+def testRefusedWithoutOrderedStores(monkeypatch):
+    monkeypatch.setattr(ringbuffer, "ORDERED", False)
+    with pytest.raises(RuntimeError):
+        ringbuffer.RingBuffer(capacity=8)
@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import sounder
+
+def testUnlatchDoesNotDelayNextCharacter():
+    backend = sounder.MemoryBackend()
+    s = sounder.Sounder(backend, powerSave=0)
+    try:
+        start = time.monotonic()
+        s.play((-100, +1))      # latch the circuit closed
+        s.play((-3000, +2))     # key-down for 3 s, then the key is opened
+        s.play((-50, +60))      # E
+        time.sleep(0.5)
+        events = [(round(t - start, 1), energized) for t, energized in backend.events]
+        assert [energized for t, energized in events] == [False, True, False, True, False]
+        assert events[-1][0] < 0.5  # not 3 s later
+    finally:
+        s.close()
+
+def testLongIdleSpaceIsCapped():
+    s = sounder.Sounder(sounder.MemoryBackend(), powerSave=0)
+    try:
+        start = time.monotonic()
+        s.play((-60000, +60))
+        assert s.playEnd - start < (sounder.MAXSPACE + 60) / 1000.0 + 0.5
+    finally:
+        s.close()
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import config, morse
+
+if not morse.useSpeedups(True):
+    pytest.skip("the compiled core is not built (see build_speedups.py)", allow_module_level=True)
+
+TEXT = "QST DE W1AW HR BULLETIN NR 1 THE QUICK BROWN FOX 1234567890 AR, 73."
+CODE_TYPES = (config.CodeType.american, config.CodeType.international)
+SPACINGS = (config.Spacing.none, config.Spacing.char, config.Spacing.word)
+SPEEDS = ((20, 0), (20, 10), (5, 0), (35, 18))  # (wpm, cwpm); cwpm < wpm is Farnsworth
+STATE = ("codeBuf", "spaceBuf", "markBuf", "nChars", "latched", "mark", "space",
+         "d_wpm", "d_dotLen", "d_truDot")
+
+class Reader(morse.Reader):
+    def __init__(self, wpm, cwpm, codeType):
+        self.output = []
+        morse.Reader.__init__(self, wpm, cwpm, codeType, lambda c, s: self.output.append((c, s)),
+                flushTimer=False)
+
+@pytest.fixture(autouse=True)
+def restoreSpeedups():
+    yield
+    morse.useSpeedups(True)
+
+def encodeAll(wpm, cwpm, codeType, spacing, compiled):
+    morse.useSpeedups(compiled)
+    sender = morse.Sender(wpm, cwpm, codeType, spacing)
+    return [sender.encode(c) for c in TEXT]
+
+def decodeAll(stream, wpm, cwpm, codeType, compiled):
+    """The Reader's output and state after each packet of `stream`."""
+    morse.useSpeedups(compiled)
+    reader = Reader(wpm, cwpm, codeType)
+    states = []
+    for codeSeq in stream:
+        reader.decode(codeSeq)
+        states.append(tuple(getattr(reader, name) for name in STATE) + (reader.output,))
+        reader.output = []
+    reader.flush()
+    states.append(reader.output)
+    return states
+
+@pytest.mark.parametrize("codeType", CODE_TYPES)
+@pytest.mark.parametrize("spacing", SPACINGS)
+@pytest.mark.parametrize("wpm, cwpm", SPEEDS)
+def testEncodeMatchesPython(codeType, spacing, wpm, cwpm):
+    assert encodeAll(wpm, cwpm, codeType, spacing, True) == encodeAll(wpm, cwpm, codeType, spacing, False)
+
+@pytest.mark.parametrize("codeType", CODE_TYPES)
+@pytest.mark.parametrize("spacing", SPACINGS)
+@pytest.mark.parametrize("wpm, cwpm", SPEEDS)
+def testDecodeMatchesPython(codeType, spacing, wpm, cwpm):
+    stream = [code for code in encodeAll(wpm, cwpm, codeType, spacing, False) if code]
+    python = decodeAll(stream, wpm, cwpm, codeType, False)
+    assert decodeAll(stream, wpm, cwpm, codeType, True) == python
+    assert "".join(c for out in python[:-1] for c, s in out[-1]) != ""
+
+@pytest.mark.parametrize("codeType", CODE_TYPES)
+def testRandomElementsMatchPython(codeType):
+    rnd = random.Random(0)
+    stream = []
+    for i in range(300):
+        seq = []
+        for j in range(rnd.randint(0, 51)):
+            r = rnd.random()
+            if r < 0.05:
+                seq.append(rnd.choice((1, 2, 0)))  # latches and zeros
+            elif r < 0.1:
+                seq.append(rnd.choice((-1, 1)) * rnd.randint(3000, 100000))
+            else:
+                seq.append((-1) ** j * rnd.randint(3, 600))
+        stream.append(tuple(seq))
+    assert decodeAll(stream, 20, 0, codeType, True) == decodeAll(stream, 20, 0, codeType, False)
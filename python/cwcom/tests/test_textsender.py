@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import textsender
+
+def testSlowSendDoesNotHoldTheSession():
+    scheduler = textsender.Scheduler()
+    started = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def send(code, c):
+        started.set()
+        release.wait(5)
+        sent.append(c)
+
+    s = textsender.TextSender(send, 40, scheduler=scheduler)
+    try:
+        s.write("E")
+        assert started.wait(5)
+        done = threading.Event()
+
+        def writer():
+            s.write("T")
+            s.pending()
+            done.set()
+
+        threading.Thread(target=writer, daemon=True).start()
+        assert done.wait(1)  # not blocked by the send in progress
+        assert not s.drain(0.05)  # the send has not returned yet
+        release.set()
+        assert s.drain(5)
+        assert sent == ['E', 'T']
+    finally:
+        release.set()
+        scheduler.stop()
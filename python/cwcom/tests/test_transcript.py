@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+
+from pykob import transcript
+
+def interleaved():
+    """Two stations whose words arrive slightly out of time order."""
+    index = transcript.TranscriptIndex()
+    for t, station, word in [(1.0, "A", "CQ"), (3.0, "A", "CQ"), (2.0, "B", "QRZ"),
+                             (4.0, "A", "DE"), (3.5, "B", "DE"), (5.0, "A", "W1AW"),
+                             (4.5, "B", "K2X")]:
+        index.add(103, station, t, word)
+    return index
+
+def testKeepsTimestamps():
+    index = interleaved()
+    assert [w[0] for w in index.wordsBetween(0, 10)] == [1.0, 2.0, 3.0, 3.5, 4.0, 4.5, 5.0]
+    assert index.search("QRZ") == [(2.0, 103, "B", "QRZ")]
+    assert index.search("DE") == [(3.5, 103, "B", "DE"), (4.0, 103, "A", "DE")]
+
+def testRangesExcludeEnd():
+    index = interleaved()
+    assert [w[3] for w in index.wordsBetween(2.0, 3.5)] == ["QRZ", "CQ"]
+    assert [h[0] for h in index.search("DE", start=3.5, end=4.0)] == [3.5]
+
+def testPhraseFromRarestWord():
+    index = interleaved()
+    assert index.search("CQ DE W1AW") == [(3.0, 103, "A", "CQ DE W1AW")]
+    assert index.search("QRZ DE K2X", station="B") == [(2.0, 103, "B", "QRZ DE K2X")]
+    assert index.search("CQ DE W1AW", start=3.5) == []
+    assert index.search("CQ DE", end=3.0) == []
+    assert index.search("DE W1AW", station="B") == []
+
+def testSaveLoad(tmp_path):
+    index = interleaved()
+    path = str(tmp_path / "index.cwtx")
+    index.save(path)
+    loaded = transcript.TranscriptIndex.load(path)
+    assert loaded.wordsBetween(0, 10) == index.wordsBetween(0, 10)
+    assert loaded.search("CQ DE W1AW") == index.search("CQ DE W1AW")
+    loaded.add(103, "A", 6.0, "K")
+    assert loaded.search("W1AW K") == [(5.0, 103, "A", "W1AW K")]
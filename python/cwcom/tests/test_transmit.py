@@ -0,0 +1,48 @@
+from pykob import packet, sequence, transmit
+
+class FakeTimer:
+    """A Timer that fires only when the test says so, even after `cancel`."""
+
+    started = []
+
+    def __init__(self, interval, function, args=()):
+        self.function = function
+        self.args = args
+        self.daemon = False
+
+    def setName(self, name):
+        pass
+
+    def start(self):
+        FakeTimer.started.append(self)
+
+    def cancel(self):
+        pass
+
+    def fire(self):
+        self.function(*self.args)
+
+def testLateFlusherLeavesNewerCodeHeld(monkeypatch):
+    monkeypatch.setattr(transmit, "Timer", FakeTimer)
+    FakeTimer.started = []
+    sent = []
+    t = transmit.Transmitter("W1AW", sent.append, coalesce=True)
+    t.send((-100, 60), 'E')
+    t.flush()
+    t.send((-100, 180), 'T')
+    first, second = FakeTimer.started
+    first.fire()  # fired before it was cancelled, ran after the flush
+    assert [packet.unpackData(p).code for p in sent] == [(-100, 60)]
+    second.fire()
+    assert [packet.unpackData(p).code for p in sent] == [(-100, 60), (-100, 180)]
+
+def testLatchCopiesFollowTracker():
+    tracker = sequence.SequenceTracker()
+    for n in (1, 2, 4, 5, 7, 8, 10):
+        tracker.update(n)
+    assert tracker.lossRate > 0
+    sent = []
+    t = transmit.Transmitter("W1AW", sent.append, adaptive=True, tracker=tracker)
+    t.send((-100, 1))
+    assert len(sent) == transmit.latchCopies(tracker.lossRate)
+    assert len(sent) > transmit.MINLATCHCOPIES
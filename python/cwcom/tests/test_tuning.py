@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("pykob.log", reason="needs PyKOB's log module")
+pytest.importorskip("numpy", reason="the synthetic sample needs numpy")
+
+from pykob import config, tuning
+
+def testCodeTypeArgumentLeavesConfigAlone(capsys):
+    before = config.code_type
+    other = "I" if before == config.CodeType.american else "A"
+    tuning.main(["-T", other, "--synthetic", "PARIS", "--repeat", "1", "-j", "1"])
+    assert config.code_type == before
+    assert "CER" in capsys.readouterr().out
+
+def testBadCodeType():
+    with pytest.raises(SystemExit):
+        tuning.main(["-T", "klingon", "--synthetic", "PARIS", "-j", "1"])